@@ -0,0 +1,128 @@
+"""
+Benchmark slyp runs over a generated tree of python files.
+
+Each variant is a set of extra CLI args, given as 'label=args'. For example, to
+compare dispatch of one file per task against automatic chunking:
+
+    python scripts/benchmark.py --files 20000 \\
+        --variant 'per-file=--chunk-size 1' --variant 'auto='
+
+To compare the kinds of worker on the same corpus (with '--jobs', as a run on a
+machine with few cpus may not use workers at all):
+
+    python scripts/benchmark.py --variant 'process=-j 4 --executor process' \\
+        --variant 'thread=-j 4 --executor thread' \\
+        --variant 'interpreter=-j 4 --executor interpreter'
+
+Use '--src' to run against another checkout of slyp (e.g. a git worktree), and
+'--label' to tag its results.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_TEMPLATE = '''\
+import os
+
+
+def func_{n}(x, y=None):
+    """A generated function."""
+    if x is None:
+        return y
+    values = [x, y, {n}]
+    return {{"total": sum(v for v in values if v), "name": "func_{n}"}}
+
+
+class Class{n}:
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def method(self):
+        return os.path.join(str(self.value), "{n}")
+'''
+# a fraction of files have something to report, as in a typical codebase
+_LINT_LINE = 'MESSAGE = "unnecessary " "concat"\n'
+_LINT_EVERY = 10
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=1,
+        help="repetitions of the template per file, to control file size",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--variant",
+        action="append",
+        metavar="LABEL=ARGS",
+        help="a labelled set of extra args to run slyp with (repeatable)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="run with the cache (warmed up first), rather than with --no-cache",
+    )
+    parser.add_argument("--src", help="the 'src' dir of the slyp to benchmark")
+    parser.add_argument("--label", default="", help="a prefix for result labels")
+    args = parser.parse_args()
+
+    variants = [v.partition("=")[::2] for v in (args.variant or ["default="])]
+
+    env = dict(os.environ)
+    if args.src:
+        env["PYTHONPATH"] = os.path.abspath(args.src)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        total_bytes = generate_tree(tmpdir, args.files, args.copies)
+        print(
+            f"{args.files} files, {total_bytes / 1024:.0f} KiB, "
+            f"{os.cpu_count()} cpus, best of {args.repeat}"
+        )
+        for label, variant_args in variants:
+            argv = [sys.executable, "-m", "slyp", "--only", "lint"]
+            if not args.cache:
+                argv.append("--no-cache")
+            argv.extend(shlex.split(variant_args))
+            if args.cache:
+                subprocess.run(argv, cwd=tmpdir, env=env, capture_output=True)
+            times = [time_run(argv, tmpdir, env) for _ in range(max(args.repeat, 1))]
+            print(
+                f"  {args.label}{label}: best {min(times):.3f}s, "
+                f"median {statistics.median(times):.3f}s"
+            )
+
+
+def generate_tree(root: str, count: int, copies: int) -> int:
+    total = 0
+    for n in range(count):
+        subdir = os.path.join(root, f"pkg{n // 500}")
+        os.makedirs(subdir, exist_ok=True)
+        content = "".join(_TEMPLATE.format(n=f"{n}_{i}") for i in range(copies))
+        if n % _LINT_EVERY == 0:
+            content += _LINT_LINE
+        with open(os.path.join(subdir, f"mod{n}.py"), "w") as fp:
+            fp.write(content)
+        total += len(content)
+    return total
+
+
+def time_run(argv: list[str], cwd: str, env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(argv, cwd=cwd, env=env, capture_output=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark the cost of checking each file over a long run in one process.
+
+A worker process checks many files in turn, so the time to check a file must not
+depend on how many files were checked before it. This checks a stream of distinct
+in-memory files (each with errors to report) and prints the time per file for
+each window of the run. The last window should be no slower than the first:
+
+    python scripts/benchmark_checker_state.py --files 100000
+
+Use '--src' to run against another checkout of slyp (e.g. a git worktree).
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+_TEMPLATE = """\
+def func_{n}(x):
+    if x:
+        return "{n} " "a"
+    else:
+        return "{n} " "a"
+
+
+MESSAGE_{n} = "unnecessary " + "concat"
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument(
+        "--windows", type=int, default=10, help="the number of windows to report"
+    )
+    parser.add_argument("--src", help="the 'src' dir of the slyp to benchmark")
+    args = parser.parse_args()
+
+    if args.src:
+        sys.path.insert(0, args.src)
+    from slyp.checkers import check_file, make_check_plan
+    from slyp.hashable_file import InMemoryFile
+
+    enabled_codes = {"all"}
+    plan = make_check_plan(set(), enabled_codes)
+    window_size = max(args.files // args.windows, 1)
+
+    print(f"{args.files} files, ms per file in each window of {window_size}")
+    window_times = []
+    window_start = time.perf_counter()
+    for n in range(args.files):
+        file_obj = InMemoryFile.from_content(
+            f"pkg{n // 500}/mod{n}.py", _TEMPLATE.format(n=n).encode()
+        )
+        result = check_file(
+            file_obj, disabled_codes=set(), enabled_codes=enabled_codes, plan=plan
+        )
+        assert not result.success
+        if (n + 1) % window_size == 0:
+            elapsed = time.perf_counter() - window_start
+            window_times.append(elapsed * 1000 / window_size)
+            print(f"  files {n + 2 - window_size}-{n + 1}: {window_times[-1]:.3f}")
+            window_start = time.perf_counter()
+
+    if window_times:
+        print(f"last/first window: {window_times[-1] / window_times[0]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
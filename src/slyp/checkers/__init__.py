@@ -1,51 +1,122 @@
 from __future__ import annotations
 
+import dataclasses
 import re
 
 from slyp.codes import CODE_MAP
+from slyp.diff_ranges import LineRanges, in_ranges
 from slyp.hashable_file import HashableFile
 from slyp.result import Message, Result
 
+from .abstract import _VISITOR_TYPES as _AST_VISITOR_TYPES
 from .abstract import run_ast_checkers
+from .abstract._base import ErrorRecordingVisitor
+from .concrete import _VISITOR_TYPES as _CST_VISITOR_TYPES
 from .concrete import run_cst_checkers
+from .concrete._base import ErrorCollectingVisitor
 
 _DISALBE_RE = re.compile(rb"#\s*slyp:\s*disable=(.*)")
 
 
+@dataclasses.dataclass(frozen=True)
+class CheckPlan:
+    """
+    The checkers which need to run under a given set of enabled and disabled codes.
+
+    Visitors which cannot produce any enabled code are left out, and a parse is only
+    done for an engine (CST or AST) if it has visitors to run.
+    ``check_syntax`` requests an AST parse with no visitors, so that unparsable
+    files are still reported when no other checks run.
+    """
+
+    cst_visitors: tuple[type[ErrorCollectingVisitor], ...]
+    ast_visitors: tuple[type[ErrorRecordingVisitor], ...]
+    check_syntax: bool
+
+
+def make_check_plan(disabled_codes: set[str], enabled_codes: set[str]) -> CheckPlan:
+    def _can_report(codes: frozenset[str]) -> bool:
+        return any(not _disabled(code, disabled_codes, enabled_codes) for code in codes)
+
+    cst_visitors = tuple(v for v in _CST_VISITOR_TYPES if _can_report(v.CODES))
+    ast_visitors = tuple(v for v in _AST_VISITOR_TYPES if _can_report(v.CODES))
+    return CheckPlan(
+        cst_visitors=cst_visitors,
+        ast_visitors=ast_visitors,
+        check_syntax=(
+            not (cst_visitors or ast_visitors) and _can_report(frozenset({"X001"}))
+        ),
+    )
+
+
 def check_file(
     file_obj: HashableFile,
     *,
     disabled_codes: set[str],
     enabled_codes: set[str],
+    plan: CheckPlan | None = None,
+    line_ranges: LineRanges | None = None,
 ) -> Result:
+    errors = find_errors(
+        file_obj,
+        disabled_codes=disabled_codes,
+        enabled_codes=enabled_codes,
+        plan=plan,
+        line_ranges=line_ranges,
+    )
+
+    messages = [
+        Message(f"{file_obj.filename}:{lineno}: {CODE_MAP[code]}")
+        for lineno, code in errors
+    ]
+
+    if errors:
+        return Result(messages=messages, success=False)
+    else:
+        return Result(messages=messages, success=True)
 
-    try:
-        cst_errors = run_cst_checkers(file_obj)
-    except RecursionError:
-        cst_errors = {(0, "X002")}
 
-    ast_errors = run_ast_checkers(file_obj)
+def find_errors(
+    file_obj: HashableFile,
+    *,
+    disabled_codes: set[str],
+    enabled_codes: set[str],
+    plan: CheckPlan | None = None,
+    line_ranges: LineRanges | None = None,
+) -> list[tuple[int, str]]:
+    """
+    Find the errors in a file, as sorted ``(lineno, code)`` pairs.
+
+    This is the data behind ``check_file``, for callers which present errors in
+    some format other than messages.
+    """
+    if plan is None:
+        plan = make_check_plan(disabled_codes, enabled_codes)
+
+    cst_errors: set[tuple[int, str]] = set()
+    if plan.cst_visitors:
+        try:
+            cst_errors = run_cst_checkers(file_obj, plan.cst_visitors)
+        except RecursionError:
+            cst_errors = {(0, "X002")}
+
+    ast_errors: set[tuple[int, str]] = set()
+    if plan.ast_visitors or plan.check_syntax:
+        ast_errors = run_ast_checkers(file_obj, plan.ast_visitors)
+
     errors = sorted(cst_errors | ast_errors)
 
     lines = file_obj.binary_content.splitlines()
 
-    filtered_errors = sorted(
+    return sorted(
         (lineno, code)
         for lineno, code in errors
         if not _disabled(code, disabled_codes, enabled_codes)
         and not _exempt(lines, lineno - 1, code)
+        # internal errors have no position (line 0), and are always reported
+        and (line_ranges is None or lineno == 0 or in_ranges(line_ranges, lineno))
     )
 
-    messages = [
-        Message(f"{file_obj.filename}:{lineno}: {CODE_MAP[code]}")
-        for lineno, code in filtered_errors
-    ]
-
-    if filtered_errors:
-        return Result(messages=messages, success=False)
-    else:
-        return Result(messages=messages, success=True)
-
 
 def _disabled(code: str, disabled_codes: set[str], enabled_codes: set[str]) -> bool:
     cdef = CODE_MAP[code]
@@ -84,12 +155,3 @@ def _exempt(lines: list[bytes], lineno: int, code: str) -> bool:
         return disabled_codes == b"all" or code.encode() in disabled_codes.split(b",")
 
     return False
-
-
-def _clear_errors() -> None:
-    # testsuite hook for resetting errors for clean reporting
-    from .abstract import _clear_visitor_errors as clear_cst_errors
-    from .concrete import _clear_visitor_errors as clear_ast_errors
-
-    clear_cst_errors()
-    clear_ast_errors()
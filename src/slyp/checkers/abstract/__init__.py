@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import ast
 import typing as t
 
 from slyp.hashable_file import HashableFile
@@ -8,28 +7,33 @@ from slyp.hashable_file import HashableFile
 from ._base import ErrorRecordingVisitor
 from .matching_branches import FindEquivalentBranchesVisitor
 
-_VISITORS: t.Sequence[ErrorRecordingVisitor] = [
-    FindEquivalentBranchesVisitor(),
-]
+# visitors are created for each file, so that no state is shared between files
+_VISITOR_TYPES: tuple[type[ErrorRecordingVisitor], ...] = (
+    FindEquivalentBranchesVisitor,
+)
 
 
-def run_ast_checkers(file_obj: HashableFile) -> set[tuple[int, str]]:
+def run_ast_checkers(
+    file_obj: HashableFile,
+    visitor_types: t.Collection[type[ErrorRecordingVisitor]] | None = None,
+) -> set[tuple[int, str]]:
+    """
+    Run AST checkers on a file.
+
+    If ``visitor_types`` is given, only visitors of those types are run. When it is
+    empty, the file is only parsed (to check for syntax errors).
+    """
     try:
-        tree = ast.parse(file_obj.binary_content, filename=file_obj.filename)
+        tree = file_obj.ast_tree
     except SyntaxError:
         return {(0, "X001")}
 
-    for visitor in _VISITORS:
+    errors: set[tuple[int, str]] = set()
+    for visitor_type in _VISITOR_TYPES:
+        if visitor_types is not None and visitor_type not in visitor_types:
+            continue
+        visitor = visitor_type()
         visitor.filename = file_obj.filename
         visitor.visit(tree)
-    return {
-        (lineno, code)
-        for visitor in _VISITORS
-        for (lineno, error_filename, code) in visitor.errors
-        if error_filename == file_obj.filename
-    }
-
-
-def _clear_visitor_errors() -> None:
-    for visitor in _VISITORS:
-        visitor.errors = set()
+        errors.update((lineno, code) for (lineno, _, code) in visitor.errors)
+    return errors
@@ -1,7 +1,13 @@
+from __future__ import annotations
+
 import ast
+import typing as t
 
 
 class ErrorRecordingVisitor(ast.NodeVisitor):
+    # the codes which this visitor is capable of reporting
+    CODES: t.ClassVar[frozenset[str]] = frozenset()
+
     def __init__(self) -> None:
         super().__init__()
         self.filename: str = "<unset>"
@@ -151,6 +151,8 @@ def result_to_code(result: CompareResult) -> str:
 
 
 class FindEquivalentBranchesVisitor(ErrorRecordingVisitor):
+    CODES = frozenset({"W200", "W201", "W202", "W203"})
+
     # open questions:
     #
     # add support for for-else?
@@ -1,34 +1,47 @@
 from __future__ import annotations
 
+import typing as t
+
 import libcst
 
 from slyp.hashable_file import HashableFile
+from slyp.prescreen import may_apply
 
 from ._base import ErrorCollectingVisitor
 from .str_concat import StrConcatErrorCollector
 
-_VISITORS: list[ErrorCollectingVisitor] = [
-    StrConcatErrorCollector(),
-]
-
-
-def run_cst_checkers(file_obj: HashableFile) -> set[tuple[int, str]]:
+# visitors are created for each file, so that no state is shared between files
+_VISITOR_TYPES: tuple[type[ErrorCollectingVisitor], ...] = (StrConcatErrorCollector,)
+
+
+def run_cst_checkers(
+    file_obj: HashableFile,
+    visitor_types: t.Collection[type[ErrorCollectingVisitor]] | None = None,
+) -> set[tuple[int, str]]:
+    """
+    Run CST checkers on a file.
+
+    If ``visitor_types`` is given, only visitors of those types are run.
+    Visitors which the prescreen shows cannot report errors on the file are skipped,
+    and if none remain the file is not parsed.
+    """
+    selected_types = [
+        v
+        for v in _VISITOR_TYPES
+        if (visitor_types is None or v in visitor_types)
+        and may_apply(file_obj, v.PRESCREEN_HINTS)
+    ]
+    if not selected_types:
+        return set()
+    # reuse the parse shared with the fixer, if there is one
     try:
-        tree = libcst.parse_module(file_obj.binary_content)
+        wrapper = file_obj.cst
     except (libcst.ParserSyntaxError, libcst.CSTValidationError):
         return {(0, "X001")}
-    wrapper = libcst.MetadataWrapper(tree)
-    for visitor in _VISITORS:
+    errors: set[tuple[int, str]] = set()
+    for visitor_type in selected_types:
+        visitor = visitor_type()
         visitor.filename = file_obj.filename
         wrapper.visit(visitor)
-    return {
-        (lineno, code)
-        for visitor in _VISITORS
-        for (lineno, error_filename, code) in visitor.errors
-        if error_filename == file_obj.filename
-    }
-
-
-def _clear_visitor_errors() -> None:
-    for visitor in _VISITORS:
-        visitor.errors = set()
+        errors.update((lineno, code) for (lineno, _, code) in visitor.errors)
+    return errors
@@ -1,7 +1,19 @@
+from __future__ import annotations
+
+import typing as t
+
 import libcst
 
+from slyp import prescreen
+
 
 class ErrorCollectingVisitor(libcst.CSTVisitor):
+    # the codes which this visitor is capable of reporting
+    CODES: t.ClassVar[frozenset[str]] = frozenset()
+    # prescreen hints, at least one of which is needed for this visitor to report
+    # any errors on a file
+    PRESCREEN_HINTS: t.ClassVar[frozenset[str]] = prescreen.ALL_HINTS
+
     def __init__(self) -> None:
         super().__init__()
         self.filename: str = "<unset>"
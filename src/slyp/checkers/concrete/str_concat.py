@@ -3,6 +3,8 @@ from __future__ import annotations
 import libcst
 import libcst.matchers
 
+from slyp import prescreen
+
 from ._base import ErrorCollectingVisitor
 
 # SimpleWhitespace defines whitespace as seen between tokens in most contexts
@@ -14,6 +16,8 @@ SIMPLE_WHITESPACE_NO_NEWLINE_MATCHER = libcst.matchers.SimpleWhitespace(
 
 class StrConcatErrorCollector(ErrorCollectingVisitor):
     METADATA_DEPENDENCIES = (libcst.metadata.PositionProvider,)
+    CODES = frozenset({"E100", "E101"})
+    PRESCREEN_HINTS = frozenset({prescreen.STRING_CONCAT, prescreen.STRING_PLUS})
 
     def visit_ConcatenatedString(self, node: libcst.ConcatenatedString) -> None:
         # check for 'unnecessary string concat' situations
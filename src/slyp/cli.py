@@ -1,14 +1,42 @@
 from __future__ import annotations
 
 import argparse
+import io
+import os
+import signal
 import sys
 import textwrap
+import typing as t
 
+from slyp import daemon
 from slyp.codes import CODE_MAP
-from slyp.driver import driver_main
+
+if t.TYPE_CHECKING:
+    import multiprocessing.pool
+
+    from slyp.file_cache import ResultCache
 
 
 def main() -> None:
+    argv = sys.argv[1:]
+    if argv[:1] == ["daemon"]:
+        sys.exit(daemon_main(argv[1:]))
+    if argv[:1] == ["lsp"]:
+        sys.exit(lsp_main(argv[1:]))
+
+    args = parse_args(argv)
+    exit_code = None
+    if args.daemon:
+        exit_code = run_via_daemon(argv, send_stdin=args.files == ["-"])
+    # if the daemon could not be reached, run in-process instead
+    if exit_code is None:
+        exit_code = run(args)
+
+    if exit_code:
+        sys.exit(exit_code)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="slyp is a linter and fixer for Python code",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -34,6 +62,56 @@ def main() -> None:
     parser.add_argument(
         "--use-git-ls", action="store_true", help="find python files from git-ls-files"
     )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help=(
+            "Check the content staged in git's index, rather than the working "
+            "tree, e.g. in a pre-commit hook. Fixes are applied to the index, and "
+            "to files in the working tree which have no unstaged changes."
+        ),
+    )
+    parser.add_argument(
+        "--patch",
+        action="store_true",
+        help="With --staged, print fixes as a patch, rather than applying them.",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help=(
+            "A pattern (in .gitignore syntax) for files and directories to skip "
+            "when finding files to check. Replaces the default patterns, which "
+            "skip build outputs and virtualenvs (e.g. 'build/', 'venv/'). "
+            "Can be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--extend-exclude",
+        action="append",
+        metavar="PATTERN",
+        help="Like --exclude, but adds to the default patterns. Can be repeated.",
+    )
+    parser.add_argument(
+        "--discovery-threads",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Find files to check using N threads, which list directories (or "
+            "check files found by git) ahead of time. This helps on network "
+            "filesystems, where each listing or stat waits on the server."
+        ),
+    )
+    parser.add_argument(
+        "--diff-base",
+        metavar="REF",
+        help=(
+            "Only fix and lint lines which have changed relative to a git ref. "
+            "Files without changes are skipped."
+        ),
+    )
     parser.add_argument(
         "--only",
         choices=("fix", "lint"),
@@ -52,36 +130,337 @@ def main() -> None:
         ),
         default="",
     )
+    parser.add_argument(
+        "--fixpoint",
+        help=(
+            "Repeat fixing of each file until its output is stable, "
+            "rather than fixing once"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--max-fix-passes",
+        help="The maximum number of fixing passes under --fixpoint (default: 10)",
+        type=int,
+        default=10,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="N",
+        help=(
+            "The number of processes to use. With 1, files are processed without "
+            "starting any worker processes. "
+            "(default: chosen based on the number and size of files)"
+        ),
+    )
+    parser.add_argument(
+        "--executor",
+        choices=("process", "thread", "interpreter"),
+        help=(
+            "Process files in worker processes, threads, or subinterpreters "
+            "(default: threads if python is running without the GIL, "
+            "otherwise processes)"
+        ),
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        metavar="N",
+        help=(
+            "The number of files to send to a worker process at a time "
+            "(default: chosen based on the number and size of files)"
+        ),
+    )
+    parser.add_argument(
+        "--read-ahead",
+        type=int,
+        metavar="N",
+        help=(
+            "Read up to N files ahead of processing, in background threads, so "
+            "that waiting on slow (e.g. network) filesystems overlaps with "
+            "processing. Files are then read by the main process, rather than by "
+            "workers."
+        ),
+    )
+    parser.add_argument(
+        "--file-timeout",
+        type=float,
+        metavar="SECONDS",
+        help=(
+            "Stop processing any file which takes longer than this, and report it "
+            "as having timed out (X003)"
+        ),
+    )
+    parser.add_argument(
+        "--max-tasks-per-worker",
+        type=int,
+        metavar="N",
+        help="Replace each worker process after it has been sent N chunks of files",
+    )
+    parser.add_argument(
+        "--max-worker-memory",
+        type=int,
+        metavar="MB",
+        help=(
+            "Replace any worker process which is using more than this much memory "
+            "(in MiB) when it is sent its next chunk of files"
+        ),
+    )
+    parser.add_argument(
+        "--ordered",
+        help=(
+            "Print results in the order that files were found, rather than as each "
+            "file is completed, so that output is the same from run to run."
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--watch",
+        help=(
+            "After processing, keep running and process files again whenever they "
+            "change. Stop with Ctrl-C."
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "--no-cache",
-        help="Disable caching of results in the '.slyp_cache' directory.",
+        help=(
+            "Disable caching of results (and of how long each file took to "
+            "process) in the '.slyp_cache' directory."
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--daemon",
+        help=(
+            "Run in a background 'slyp daemon' process for this directory, "
+            "starting it if it is not running."
+        ),
         action="store_true",
     )
     parser.add_argument("files", nargs="*", help="default: all python files")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     args.verbosity -= args.quiet
 
     if args.list:
         list_codes()
-        sys.exit(0)
+        parser.exit(0)
 
     if args.use_git_ls and args.files:
         parser.error("--use-git-ls requires no filenames as arguments")
 
+    if args.patch and not args.staged:
+        parser.error("--patch requires --staged")
+    if args.staged:
+        for option, value in (
+            ("--use-git-ls", args.use_git_ls),
+            ("--diff-base", args.diff_base is not None),
+            ("--watch", args.watch),
+            ("--daemon", args.daemon),
+            ("stdin", "-" in args.files),
+        ):
+            if value:
+                parser.error(f"--staged cannot be used with {option}")
+
+    if args.max_fix_passes < 1:
+        parser.error("--max-fix-passes must be at least 1")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.read_ahead is not None and args.read_ahead < 1:
+        parser.error("--read-ahead must be at least 1")
+    if args.discovery_threads < 1:
+        parser.error("--discovery-threads must be at least 1")
+    if args.file_timeout is not None and args.file_timeout <= 0:
+        parser.error("--file-timeout must be positive")
+    if args.max_tasks_per_worker is not None and args.max_tasks_per_worker < 1:
+        parser.error("--max-tasks-per-worker must be at least 1")
+    if args.max_worker_memory is not None and args.max_worker_memory < 1:
+        parser.error("--max-worker-memory must be at least 1")
+
     if "-" in args.files:
         if len(args.files) > 1:
             parser.error("stdin can only be used with one file at a time")
         if args.only is None:
             parser.error("stdin mode requires '--only' to be set")
+        if args.diff_base is not None:
+            parser.error("--diff-base cannot be used with stdin")
+        if args.watch:
+            parser.error("--watch cannot be used with stdin")
+
+    if args.watch and args.diff_base is not None:
+        parser.error("--watch cannot be used with --diff-base")
+    if args.watch and args.daemon:
+        parser.error("--watch cannot be used with --daemon")
+    if args.watch and args.ordered:
+        parser.error("--watch cannot be used with --ordered")
+    if args.executor in ("thread", "interpreter"):
+        # these workers share one process, and cannot be interrupted or replaced
+        for option, value in (
+            ("--file-timeout", args.file_timeout),
+            ("--max-tasks-per-worker", args.max_tasks_per_worker),
+            ("--max-worker-memory", args.max_worker_memory),
+        ):
+            if value is not None:
+                parser.error(
+                    f"{option} cannot be used with '--executor {args.executor}'"
+                )
+    # the daemon's workers are shared between runs, and outlive any one run's options
+    if args.daemon and args.executor is not None:
+        parser.error("--executor cannot be used with --daemon")
+    if args.daemon and args.max_tasks_per_worker is not None:
+        parser.error("--max-tasks-per-worker cannot be used with --daemon")
+    if args.daemon and args.max_worker_memory is not None:
+        parser.error("--max-worker-memory cannot be used with --daemon")
 
-    success = driver_main(args)
+    return args
+
+
+def run(
+    args: argparse.Namespace,
+    *,
+    process_pool: multiprocessing.pool.Pool | None = None,
+    result_cache: ResultCache | None = None,
+) -> int:
+    """Run slyp with parsed args, returning the exit code."""
+    # imported here, so that a client of the daemon never imports the checkers and
+    # fixers (or libcst)
+    from slyp.driver import driver_main
+
+    success = driver_main(args, process_pool=process_pool, result_cache=result_cache)
 
     if not success:
-        sys.exit(1)
+        return 1
 
     if args.verbosity:
         print("ok", file=sys.stderr)
+    return 0
+
+
+def daemon_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="slyp daemon",
+        description=(
+            "Run a slyp server for the current directory, used by 'slyp --daemon'. "
+            "It is normally started on demand, and stops when idle."
+        ),
+    )
+    parser.add_argument(
+        "--stop", action="store_true", help="stop the running daemon, if any"
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=daemon.DEFAULT_IDLE_TIMEOUT,
+        metavar="SECONDS",
+        help="stop after this many seconds without any requests (default: 1800)",
+    )
+    args = parser.parse_args(argv)
+
+    if not daemon.is_supported():
+        parser.error("the daemon requires support for unix sockets")
+
+    socket_path = daemon.socket_path_for(os.getcwd())
+    if args.stop:
+        daemon.stop(socket_path)
+    else:
+        # exit normally on SIGTERM, so that the socket and workers are cleaned up
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        daemon.serve(socket_path, _run_argv, idle_timeout=args.idle_timeout)
+    return 0
+
+
+def lsp_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="slyp lsp",
+        description=(
+            "Run a language server over stdio, which publishes lint results as "
+            "diagnostics and offers fixes as document formatting."
+        ),
+    )
+    parser.add_argument(
+        "--disable",
+        help="Disable error and warning codes (comma delimited)",
+        default="",
+    )
+    parser.add_argument(
+        "--enable",
+        help=(
+            "Enable error and warning codes which are otherwise disabled "
+            "(comma delimited, overrides --disable)"
+        ),
+        default="",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        metavar="SECONDS",
+        help=(
+            "how long to wait after an edit before checking a document "
+            "(default: 0.3)"
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    from slyp.driver import resolve_codes
+    from slyp.lsp import DEFAULT_DEBOUNCE_DELAY, LanguageServer
+
+    disabled_codes, enabled_codes = resolve_codes(args.disable, args.enable)
+    server = LanguageServer(
+        sys.stdin.buffer,
+        sys.stdout.buffer,
+        disabled_codes=disabled_codes,
+        enabled_codes=enabled_codes,
+        debounce_delay=(
+            DEFAULT_DEBOUNCE_DELAY if args.debounce is None else args.debounce
+        ),
+    )
+    return server.serve()
+
+
+def run_via_daemon(argv: list[str], *, send_stdin: bool) -> int | None:
+    """
+    Run slyp in the daemon for the current directory, starting it if needed.
+
+    Output is written to stdout and stderr as though slyp had run in-process.
+    Returns the exit code, or None if the daemon could not be used.
+    """
+    if not daemon.is_supported():
+        return None
+    stdin = sys.stdin.buffer.read() if send_stdin else None
+    response = daemon.request(
+        daemon.socket_path_for(os.getcwd()), argv, stdin=stdin, spawn=True
+    )
+    if response is None:
+        # stdin has been read, so a run in-process needs to be given what was read
+        if stdin is not None:
+            sys.stdin = io.TextIOWrapper(io.BytesIO(stdin))
+        return None
+
+    sys.stdout.buffer.write(response.stdout)
+    sys.stdout.flush()
+    sys.stderr.buffer.write(response.stderr)
+    sys.stderr.flush()
+    return response.exit_code
+
+
+def _run_argv(
+    argv: list[str],
+    process_pool: multiprocessing.pool.Pool,
+    result_cache: ResultCache,
+) -> int:
+    # the daemon's handler for requests
+    args = parse_args(argv)
+    return run(
+        args,
+        process_pool=process_pool,
+        # '--no-cache' applies to the daemon's cache of results, as to any other
+        result_cache=None if args.no_cache else result_cache,
+    )
 
 
 def list_codes() -> None:
@@ -38,6 +38,12 @@ ALL_CODES: list[CodeDef] = [
         "# see chardet",
         hidden=True,
     ),
+    CodeDef(
+        "X003",
+        "timed out while processing file",
+        "# see --file-timeout",
+        hidden=True,
+    ),
     # errors & warnings, grouped by topic numerically
     # string concat
     CodeDef("E100", "unnecessary string concat", 'x = "foo " "bar"'),
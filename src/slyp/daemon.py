@@ -0,0 +1,415 @@
+"""
+A long-lived server process for slyp, and a client for it.
+
+Running ``slyp`` many times in quick succession (e.g. from editors and git hooks)
+spends most of its time on startup. ``slyp daemon`` serves runs of slyp for one
+directory over a unix socket, keeping its imports, a worker pool, and an in-memory
+result cache alive between runs.
+
+Each connection carries one request: the client sends a JSON document and closes
+its side of the connection for writing, and the server responds with a JSON
+document containing the captured output and exit code of the run.
+"""
+
+from __future__ import annotations
+
+import base64
+import contextlib
+import dataclasses
+import hashlib
+import io
+import json
+import os
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import typing as t
+
+if t.TYPE_CHECKING:
+    import multiprocessing.pool
+
+    from slyp.file_cache import ResultCache
+
+    RequestHandler = t.Callable[
+        [list[str], multiprocessing.pool.Pool, ResultCache], int
+    ]
+
+PROTOCOL_VERSION: int = 2
+DEFAULT_IDLE_TIMEOUT: float = 1800.0
+# how long a client waits for a daemon which it started to begin listening
+SPAWN_TIMEOUT: float = 5.0
+# how long the server waits for a client to finish sending its request
+_REQUEST_TIMEOUT: float = 10.0
+
+
+@dataclasses.dataclass
+class Response:
+    stdout: bytes
+    stderr: bytes
+    exit_code: int
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def socket_path_for(directory: str) -> str:
+    """
+    Get the socket path for the daemon serving a directory.
+
+    Daemons are specific to a directory and to an installation of slyp, so that
+    a daemon is never asked to run with paths or code other than its own.
+    Sockets are kept in a directory which only the current user may use, so that
+    no other user can listen in their place.
+    """
+    key = hashlib.sha256()
+    for part in (
+        os.path.realpath(directory),
+        sys.executable,
+        os.path.dirname(os.path.abspath(__file__)),
+        str(PROTOCOL_VERSION),
+    ):
+        key.update(part.encode("utf-8", errors="surrogateescape") + b"\0")
+    # the path is kept short, as socket paths have a small maximum length
+    return os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+        f"slyp-{os.getuid()}",
+        f"{key.hexdigest()[:16]}.sock",
+    )
+
+
+def serve(
+    socket_path: str,
+    handler: RequestHandler,
+    *,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+) -> None:
+    """
+    Serve requests on a socket until stopped, interrupted, or idle for
+    ``idle_timeout`` seconds.
+
+    Requests are handled one at a time, each using the whole worker pool.
+    If another daemon is already serving on the socket, return immediately.
+    """
+    # imported here, as the client side of this module must be fast to import
+    import multiprocessing.pool
+
+    from slyp.driver import is_gil_enabled, prepare_worker_start, warm_up
+    from slyp.file_cache import ResultCache
+
+    socket_dir = os.path.dirname(socket_path)
+    if not _make_private_directory(socket_dir):
+        print(
+            f"slyp: not serving, as {socket_dir} is not private to the current user",
+            file=sys.stderr,
+        )
+        return
+    server = _bind(socket_path)
+    if server is None:
+        return
+    socket_inode = os.stat(socket_path).st_ino
+
+    if is_gil_enabled():
+        prepare_worker_start()
+        process_pool = multiprocessing.pool.Pool(initializer=_init_worker)
+    else:
+        # without the GIL, threads run in parallel, and are cheaper than processes
+        process_pool = multiprocessing.pool.ThreadPool(initializer=warm_up)
+    result_cache = ResultCache()
+    server.settimeout(idle_timeout)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            with conn:
+                if not _handle(conn, handler, process_pool, result_cache):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        # a newer daemon may have replaced a socket which seemed stale
+        with contextlib.suppress(OSError):
+            if os.stat(socket_path).st_ino == socket_inode:
+                os.unlink(socket_path)
+        process_pool.terminate()
+        process_pool.join()
+
+
+def request(
+    socket_path: str,
+    argv: list[str],
+    *,
+    stdin: bytes | None = None,
+    spawn: bool = False,
+) -> Response | None:
+    """
+    Ask the daemon listening on a socket to run slyp with the given CLI args.
+
+    If ``spawn`` is set, a daemon is started if none is running.
+    Returns None if no daemon could be reached, or if it failed to handle the
+    request.
+    """
+    conn = _connect(socket_path)
+    if conn is None and spawn and _make_private_directory(os.path.dirname(socket_path)):
+        _spawn()
+        deadline = time.monotonic() + SPAWN_TIMEOUT
+        while conn is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+            conn = _connect(socket_path)
+    if conn is None:
+        return None
+
+    response = _exchange(
+        conn,
+        {
+            "command": "run",
+            "cwd": os.getcwd(),
+            "argv": argv,
+            "stdin": None if stdin is None else _encode(stdin),
+            # git's environment (e.g. 'GIT_INDEX_FILE' in a hook) chooses the repo
+            # and index which git commands run by slyp will read
+            "git_env": {
+                name: value
+                for name, value in os.environ.items()
+                if name.startswith("GIT_")
+            },
+            "stdout": [sys.stdout.encoding, sys.stdout.errors],
+            "stderr": [sys.stderr.encoding, sys.stderr.errors],
+        },
+    )
+    if response is None or "error" in response:
+        return None
+    return Response(
+        stdout=_decode(response["stdout"]),
+        stderr=_decode(response["stderr"]),
+        exit_code=response["exit_code"],
+    )
+
+
+def stop(socket_path: str) -> bool:
+    """Stop the daemon listening on a socket. Returns False if there was none."""
+    conn = _connect(socket_path)
+    if conn is None:
+        return False
+    return _exchange(conn, {"command": "stop"}) is not None
+
+
+def _handle(
+    conn: socket.socket,
+    handler: RequestHandler,
+    process_pool: multiprocessing.pool.Pool,
+    result_cache: ResultCache,
+) -> bool:
+    # handle one request, returning False if the server should stop
+    conn.settimeout(_REQUEST_TIMEOUT)
+    try:
+        req: dict[str, t.Any] = json.loads(_recv_all(conn))
+    except (OSError, ValueError):
+        return True
+    stop_requested: bool = req.get("command") == "stop"
+
+    if req.get("version") != PROTOCOL_VERSION:
+        response: dict[str, t.Any] = {"error": "protocol version mismatch"}
+    elif stop_requested:
+        response = {}
+    elif req.get("cwd") != os.getcwd():
+        response = {"error": "daemon serves a different directory"}
+    else:
+        response = _run(req, handler, process_pool, result_cache)
+
+    with contextlib.suppress(OSError):
+        conn.sendall(json.dumps(response).encode())
+    return not stop_requested
+
+
+def _run(
+    req: dict[str, t.Any],
+    handler: RequestHandler,
+    process_pool: multiprocessing.pool.Pool,
+    result_cache: ResultCache,
+) -> dict[str, t.Any]:
+    stdin = b"" if req["stdin"] is None else _decode(req["stdin"])
+    stdout, stderr = io.BytesIO(), io.BytesIO()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(
+            _redirect_stdio(stdin, (stdout, *req["stdout"]), (stderr, *req["stderr"]))
+        )
+        stack.enter_context(_git_environment(req["git_env"]))
+        try:
+            exit_code = handler(req["argv"], process_pool, result_cache)
+        except SystemExit as e:
+            # mirror the interpreter's handling of exit codes
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except Exception:
+            return {"error": traceback.format_exc()}
+    return {
+        "stdout": _encode(stdout.getvalue()),
+        "stderr": _encode(stderr.getvalue()),
+        "exit_code": exit_code,
+    }
+
+
+@contextlib.contextmanager
+def _redirect_stdio(
+    stdin: bytes,
+    stdout: tuple[io.BytesIO, str, str],
+    stderr: tuple[io.BytesIO, str, str],
+) -> t.Iterator[None]:
+    # output is encoded as the client's streams would have encoded it
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin = io.TextIOWrapper(io.BytesIO(stdin))
+    sys.stdout, sys.stderr = (
+        io.TextIOWrapper(buf, encoding=encoding, errors=errors, write_through=True)
+        for buf, encoding, errors in (stdout, stderr)
+    )
+    try:
+        yield
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+            # detach, so that discarding the wrapper does not close the buffer
+            stream.detach()
+        sys.stdin, sys.stdout, sys.stderr = saved
+
+
+@contextlib.contextmanager
+def _git_environment(git_env: dict[str, str]) -> t.Iterator[None]:
+    # git commands see the client's 'GIT_*' variables, rather than the daemon's
+    saved = {
+        name: value for name, value in os.environ.items() if name.startswith("GIT_")
+    }
+    for name in saved:
+        del os.environ[name]
+    os.environ.update(git_env)
+    try:
+        yield
+    finally:
+        for name in git_env:
+            os.environ.pop(name, None)
+        os.environ.update(saved)
+
+
+def _init_worker() -> None:
+    from slyp.driver import warm_up
+
+    # the daemon handles signals, and terminates the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    warm_up()
+
+
+def _bind(socket_path: str) -> socket.socket | None:
+    if os.path.exists(socket_path):
+        conn = _connect(socket_path)
+        if conn is not None:
+            conn.close()
+            return None
+        # a stale socket, left by a daemon which did not exit cleanly
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # only the current user may connect
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    except OSError:
+        # another daemon started at the same time, and won
+        server.close()
+        return None
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    return server
+
+
+def _make_private_directory(path: str) -> bool:
+    # create a directory for sockets, returning whether only the current user may
+    # use it; a directory made by another user could hold a socket which they own
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return False
+    return _is_private(path, stat.S_ISDIR)
+
+
+def _is_private(path: str, is_type: t.Callable[[int], bool]) -> bool:
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return is_type(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def _connect(socket_path: str) -> socket.socket | None:
+    # the request carries the client's environment, and the response is trusted,
+    # so never talk to a socket which another user could have put in place
+    if not (
+        _is_private(os.path.dirname(socket_path), stat.S_ISDIR)
+        and _is_private(socket_path, stat.S_ISSOCK)
+    ):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError:
+        conn.close()
+        return None
+    return conn
+
+
+def _spawn() -> None:
+    subprocess.Popen(
+        [sys.executable, "-m", "slyp", "daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _exchange(conn: socket.socket, req: dict[str, t.Any]) -> dict[str, t.Any] | None:
+    with conn:
+        try:
+            conn.sendall(json.dumps({"version": PROTOCOL_VERSION, **req}).encode())
+            conn.shutdown(socket.SHUT_WR)
+            data = _recv_all(conn)
+        except OSError:
+            return None
+    try:
+        response: dict[str, t.Any] = json.loads(data)
+    except ValueError:
+        # the daemon exited without responding
+        return None
+    return response
+
+
+def _recv_all(conn: socket.socket) -> bytes:
+    chunks = []
+    while chunk := conn.recv(65536):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _decode(data: str) -> bytes:
+    return base64.b64decode(data)
@@ -0,0 +1,139 @@
+"""
+Line ranges of files changed against a git ref, for use with ``--diff-base``.
+
+Ranges are 1-indexed, and half-open: ``(start, end)`` covers ``start <= line < end``.
+"""
+
+from __future__ import annotations
+
+import codecs
+import difflib
+import os
+import re
+import subprocess
+
+LineRanges = list[tuple[int, int]]
+
+_HUNK_HEADER_RE = re.compile(rb"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+def changed_line_ranges(ref: str) -> dict[str, LineRanges]:
+    """
+    Find the lines of each file which were added or changed relative to a git ref.
+
+    Paths are relative to the current directory. Files with no added or changed
+    lines (e.g. only deletions) are omitted. Untracked files (which are not
+    ignored) are new, so all of their lines are changed.
+    """
+    diff_proc = subprocess.run(
+        [
+            "git",
+            "diff",
+            "--relative",
+            "--no-color",
+            "--no-ext-diff",
+            "--diff-filter=d",
+            "--unified=0",
+            # the paths are read with these prefixes, whatever the user's config
+            "--src-prefix=a/",
+            "--dst-prefix=b/",
+            ref,
+            "--",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    ranges = _parse_diff(diff_proc.stdout)
+
+    untracked_proc = subprocess.run(
+        ["git", "ls-files", "--others", "--exclude-standard", "-z"],
+        check=True,
+        capture_output=True,
+    )
+    for path in untracked_proc.stdout.split(b"\0"):
+        if not path:
+            continue
+        filename = os.fsdecode(path)
+        try:
+            with open(filename, "rb") as fp:
+                content = fp.read()
+        except OSError:
+            continue
+        if content:
+            # the last line may not end with a newline
+            line_count = content.count(b"\n") + (not content.endswith(b"\n"))
+            ranges[filename] = [(1, line_count + 1)]
+    return ranges
+
+
+def _parse_diff(diff: bytes) -> dict[str, LineRanges]:
+    ranges: dict[str, LineRanges] = {}
+    current: LineRanges | None = None
+    # lines within a hunk are only content, even if they look like a header (e.g.
+    # an added line of '++ x'); a hunk runs until the next 'diff --git' line
+    in_hunk = False
+    after_old_path = False
+    # content may contain a lone '\r', which 'splitlines' would split on
+    for line in diff.split(b"\n"):
+        if in_hunk and line[:1] in (b"+", b"-", b" ", b"\\"):
+            continue
+        in_hunk = False
+        if after_old_path and line.startswith(b"+++ "):
+            current = ranges.setdefault(_unquote_path(line[4:]), [])
+        elif current is not None and (match := _HUNK_HEADER_RE.match(line)):
+            start = int(match.group(1))
+            count = 1 if match.group(2) is None else int(match.group(2))
+            if count:
+                current.append((start, start + count))
+            in_hunk = True
+        after_old_path = line.startswith(b"--- ")
+    return {path: file_ranges for path, file_ranges in ranges.items() if file_ranges}
+
+
+def _unquote_path(raw: bytes) -> str:
+    # git quotes paths containing unusual characters C-style, and prefixes
+    # the path with 'b/'
+    # a path containing a space is ended by a tab instead (as in 'diff -u')
+    if raw.endswith(b"\t"):
+        raw = raw[:-1]
+    if raw.startswith(b'"') and raw.endswith(b'"'):
+        raw = codecs.escape_decode(raw[1:-1])[0]
+    return raw[2:].decode("utf-8", errors="surrogateescape")
+
+
+def in_ranges(ranges: LineRanges, lineno: int) -> bool:
+    return any(start <= lineno < end for start, end in ranges)
+
+
+def remap_line_ranges(ranges: LineRanges, old: bytes, new: bytes) -> LineRanges:
+    """
+    Map ranges for ``old`` content onto ``new`` content.
+
+    Lines which are unchanged keep their membership, and any lines which differ
+    between the two versions are added. This is used after fixing, which only
+    changes lines within the original ranges.
+    """
+    new_ranges: LineRanges = []
+    matcher = difflib.SequenceMatcher(
+        None, old.splitlines(), new.splitlines(), autojunk=False
+    )
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            offset = new_start - old_start
+            for start, end in ranges:
+                start, end = max(start - 1, old_start), min(end - 1, old_end)
+                if start < end:
+                    new_ranges.append((start + offset + 1, end + offset + 1))
+        elif new_start < new_end:
+            new_ranges.append((new_start + 1, new_end + 1))
+    return _merge(new_ranges)
+
+
+def _merge(ranges: LineRanges) -> LineRanges:
+    merged: LineRanges = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,384 @@
+"""
+Finding python files to check, when none are given.
+
+Directories are walked with ``os.scandir``, and any which are excluded are pruned
+before they are entered. Exclusions come from patterns (``--exclude`` and
+``--extend-exclude``) and from ``.gitignore`` files, both in gitignore syntax;
+``git`` itself is never run.
+
+As with ``glob``, hidden files and directories (whose names start with '.') are
+never checked. Symlinked directories are followed, unless they lead back to a
+directory which is already being walked.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import dataclasses
+import os
+import re
+import threading
+import time
+import typing as t
+
+# directories which hold build outputs and installed or vendored packages, rather
+# than source to check
+DEFAULT_EXCLUDES: tuple[str, ...] = (
+    "__pycache__/",
+    "__pypackages__/",
+    "_build/",
+    "buck-out/",
+    "build/",
+    "dist/",
+    "node_modules/",
+    "venv/",
+)
+
+
+class PathMatcher:
+    """
+    Match paths against a list of patterns, in gitignore syntax.
+
+    Paths are relative to the directory which the patterns belong to, use '/' as
+    the separator, and end with '/' for directories. As in a ``.gitignore`` file,
+    later patterns take precedence, and a pattern starting with '!' re-includes
+    paths matched by earlier ones.
+    Consecutive patterns of the same kind are compiled into a single regex.
+    """
+
+    def __init__(self, patterns: t.Iterable[str]) -> None:
+        # groups of (negated, regex), last first
+        self._groups: list[tuple[bool, re.Pattern[str]]] = []
+        group: list[str] = []
+        group_negated = False
+        for pattern in patterns:
+            pattern = pattern.rstrip("\r\n")
+            # trailing spaces are ignored, and a leading '#' is a comment
+            if not pattern.strip() or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:]
+            if group and negated != group_negated:
+                self._add_group(group_negated, group)
+                group = []
+            group_negated = negated
+            group.append(_translate(pattern.rstrip(" ")))
+        if group:
+            self._add_group(group_negated, group)
+        self._groups.reverse()
+
+    def _add_group(self, negated: bool, regexes: list[str]) -> None:
+        self._groups.append((negated, re.compile("|".join(regexes))))
+
+    def __bool__(self) -> bool:
+        return bool(self._groups)
+
+    def match(self, path: str) -> bool | None:
+        """
+        Get whether or not a path is excluded, or None if no pattern matches it.
+        """
+        for negated, regex in self._groups:
+            if regex.match(path):
+                return not negated
+        return None
+
+    def excludes(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Check whether a path, or any directory above it, is excluded.
+
+        This is for paths which are not found by walking, where excluded
+        directories are never entered.
+        """
+        parts = path.split("/")
+        for i in range(1, len(parts) + 1):
+            prefix = "/".join(parts[:i])
+            if i < len(parts) or is_dir:
+                prefix += "/"
+            if self.match(prefix):
+                return True
+        return False
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore pattern into a regex, for use by 'PathMatcher'."""
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # a pattern with a '/' (other than at the end) is relative to its directory,
+    # otherwise it matches at any depth
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            parts.append("/.*")
+            i += 3
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1 : end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    # directories are given with a trailing '/', but the pattern must match a whole
+    # name before it (so 'gen/*' does not match 'gen/')
+    suffix = "(?<!/)/" if dir_only else "(?<!/)/?"
+    return f"(?:{prefix}{''.join(parts)}{suffix}\\Z)"
+
+
+@dataclasses.dataclass
+class DiscoveryStats:
+    """Counts of the work done to find files, for verbose output."""
+
+    files: int = 0
+    directories: int = 0
+    # files and directories skipped by '--exclude' or '.gitignore'
+    excluded: int = 0
+    # the total time spent listing directories (or checking files), in seconds
+    scan_seconds: float = 0.0
+    # the time from the start of discovery until the last scan finished
+    elapsed: float = 0.0
+
+    def describe(self) -> str:
+        description = f"found {self.files} files in {self.elapsed:.3f}s"
+        if self.directories:
+            description += (
+                f", walking {self.directories} directories "
+                f"({self.scan_seconds:.3f}s spent scanning)"
+            )
+        return f"{description}, {self.excluded} excluded"
+
+
+def normalize_path(filename: str) -> str:
+    """
+    Normalize a path to be relative to the current directory, as the paths of
+    changed files (and of files in git's index) are. Both './a.py' and an absolute
+    path to 'a.py' become 'a.py'.
+    """
+    return os.path.relpath(os.path.abspath(filename))
+
+
+# the most directories which may be scanned ahead of the walk, per thread
+_SCAN_AHEAD_PER_THREAD = 16
+
+# a '.gitignore' file, with the directory it is in (relative to the root of the
+# walk, ending in '/')
+_Ignore = tuple[str, PathMatcher]
+# a directory to scan: its path, its path relative to the root of the walk (ending
+# in '/' unless it is the root), its real path, the real paths of the directories
+# above it in the walk, and the ignore files which apply
+_ScanArgs = tuple[str, str, str, frozenset[str], tuple[_Ignore, ...]]
+
+
+@dataclasses.dataclass
+class _Listing:
+    files: list[str]
+    subdirs: list[_ScanArgs]
+    excluded: int
+    seconds: float
+    finished_at: float
+    # scans of the subdirs, when scanning ahead in threads, or the subdirs not yet
+    # started, if too many directories were already scanned ahead
+    children: list[concurrent.futures.Future[_Listing] | _ScanArgs] = dataclasses.field(
+        default_factory=list
+    )
+
+
+def walk_py_files(
+    root: str = ".",
+    *,
+    exclude: PathMatcher | None = None,
+    use_gitignore: bool = True,
+    threads: int = 1,
+    stats: DiscoveryStats | None = None,
+) -> t.Iterator[str]:
+    """
+    Find the python files under ``root``, in sorted order within each directory.
+
+    Paths are yielded relative to ``root`` (if it is '.', with no leading './').
+    With more than one thread, directories are listed ahead of time in a pool of
+    threads, with each directory's subdirectories listed as soon as it has been,
+    up to a bounded number of directories ahead of the walk.
+    The order of files is the same either way.
+
+    :param exclude: patterns for paths (relative to ``root``) to skip
+    :param use_gitignore: whether or not to skip paths ignored by '.gitignore'
+        files, in ``root`` or below it
+    :param stats: counters to update, as the walk goes
+    """
+    stats = DiscoveryStats() if stats is None else stats
+    start = time.perf_counter()
+    root_args: _ScanArgs = (root, "", os.path.realpath(root), frozenset(), ())
+
+    def _scan(args: _ScanArgs) -> _Listing:
+        return _scan_directory(*args, exclude=exclude, use_gitignore=use_gitignore)
+
+    def _record(listing: _Listing) -> None:
+        stats.files += len(listing.files)
+        stats.directories += 1
+        stats.excluded += listing.excluded
+        stats.scan_seconds += listing.seconds
+        stats.elapsed = max(stats.elapsed, listing.finished_at - start)
+
+    if threads <= 1:
+        pending = [root_args]
+        while pending:
+            listing = _scan(pending.pop())
+            _record(listing)
+            yield from listing.files
+            pending.extend(reversed(listing.subdirs))
+        return
+
+    # the number of directories whose scans were started, but whose listings have
+    # not been walked yet; this bounds the paths held in memory
+    ahead = 0
+    max_ahead = threads * _SCAN_AHEAD_PER_THREAD
+    lock = threading.Lock()
+
+    def _try_start() -> bool:
+        nonlocal ahead
+        with lock:
+            if ahead >= max_ahead:
+                return False
+            ahead += 1
+            return True
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=threads, thread_name_prefix="slyp-discovery"
+    ) as executor:
+
+        def _scan_ahead(args: _ScanArgs) -> _Listing:
+            listing = _scan(args)
+            listing.children = [
+                executor.submit(_scan_ahead, subdir) if _try_start() else subdir
+                for subdir in listing.subdirs
+            ]
+            return listing
+
+        ahead = 1
+        scans: list[concurrent.futures.Future[_Listing] | _ScanArgs] = [
+            executor.submit(_scan_ahead, root_args)
+        ]
+        try:
+            while scans:
+                scan = scans.pop()
+                if isinstance(scan, tuple):
+                    # the walk has caught up with a directory which wasn't started
+                    with lock:
+                        ahead += 1
+                    scan = executor.submit(_scan_ahead, scan)
+                listing = scan.result()
+                with lock:
+                    ahead -= 1
+                _record(listing)
+                yield from listing.files
+                scans.extend(reversed(listing.children))
+                # start the next directories of the walk, as far as the bound allows
+                for i in range(len(scans) - 1, max(len(scans) - max_ahead, 0) - 1, -1):
+                    next_scan = scans[i]
+                    if isinstance(next_scan, tuple):
+                        if not _try_start():
+                            break
+                        scans[i] = executor.submit(_scan_ahead, next_scan)
+        finally:
+            # if the walk is abandoned, stop scanning
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _scan_directory(
+    dirpath: str,
+    relpath: str,
+    realpath: str,
+    walked: frozenset[str],
+    ignores: tuple[_Ignore, ...],
+    *,
+    exclude: PathMatcher | None,
+    use_gitignore: bool,
+) -> _Listing:
+    """List one directory, finding its python files and the subdirectories to walk."""
+    start = time.perf_counter()
+    try:
+        with os.scandir(dirpath) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        entries = []
+
+    if use_gitignore and any(entry.name == ".gitignore" for entry in entries):
+        try:
+            with open(os.path.join(dirpath, ".gitignore"), encoding="utf-8") as fp:
+                matcher = PathMatcher(fp)
+        except (OSError, UnicodeDecodeError):
+            matcher = PathMatcher(())
+        if matcher:
+            ignores = (*ignores, (relpath, matcher))
+
+    def _excluded(path: str) -> bool:
+        if exclude is not None and exclude.match(path):
+            return True
+        # deeper '.gitignore' files take precedence
+        for base, matcher in reversed(ignores):
+            if (excluded := matcher.match(path[len(base) :])) is not None:
+                return excluded
+        return False
+
+    files = []
+    subdirs: list[_ScanArgs] = []
+    excluded = 0
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        path = relpath + entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if is_dir:
+            if _excluded(path + "/"):
+                excluded += 1
+                continue
+            if entry.is_symlink():
+                subdir_realpath = os.path.realpath(entry.path)
+                # a link to a directory which is being walked would loop forever,
+                # whether it is above this one on disk, or was reached through
+                # other links
+                if subdir_realpath in walked or (realpath + os.sep).startswith(
+                    subdir_realpath + os.sep
+                ):
+                    continue
+            else:
+                subdir_realpath = os.path.join(realpath, entry.name)
+            subdirs.append(
+                (entry.path, path + "/", subdir_realpath, walked | {realpath}, ignores)
+            )
+        elif entry.name.endswith(".py"):
+            if _excluded(path):
+                excluded += 1
+            else:
+                files.append(path)
+
+    finished_at = time.perf_counter()
+    return _Listing(
+        files=files,
+        subdirs=subdirs,
+        excluded=excluded,
+        seconds=finished_at - start,
+        finished_at=finished_at,
+    )
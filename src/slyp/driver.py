@@ -1,50 +1,138 @@
 from __future__ import annotations
 
 import argparse
-import glob
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
 import hashlib
+import importlib
+import itertools
 import json
+import multiprocessing
 import multiprocessing.pool
 import os
+import queue
+import signal
 import stat
 import subprocess
 import sys
+import threading
 import time
 import typing as t
 
-from slyp.checkers import check_file
+from slyp.checkers import CheckPlan, check_file, find_errors, make_check_plan
 from slyp.codes import CODE_MAP
-from slyp.file_cache import PassingFileCache
+from slyp.diff_ranges import LineRanges, changed_line_ranges, remap_line_ranges
+from slyp.discovery import (
+    DEFAULT_EXCLUDES,
+    DiscoveryStats,
+    PathMatcher,
+    normalize_path,
+    walk_py_files,
+)
+from slyp.file_cache import PassingFileCache, ResultCache, TimingCache
 from slyp.fixer import fix_file
-from slyp.hashable_file import HashableFile
+from slyp.git_index import StagedFiles
+from slyp.hashable_file import HashableFile, InMemoryFile
+from slyp.output import OutputWriter, ReorderBuffer
+from slyp.prefetch import Prefetched, map_ahead, prefetch, read_file
 from slyp.result import Message, Result
+from slyp.watch import FileWatcher
 
 DEFAULT_DISABLED_CODES: set[str] = {"W201", "W202", "W203"}
 CONTRACT_VERSION: str = "1.6"
+# how often to check for changes to files under '--watch', in seconds
+WATCH_POLL_INTERVAL: float = 0.05
+# automatic chunking aims for this many chunks per worker, to balance the load
+_CHUNKS_PER_WORKER = 4
+_MAX_CHUNK_FILES = 64
+# with automatic '--jobs', the amount of source which justifies starting a worker
+_BYTES_PER_WORKER = 64 * 1024
+# with several discovery threads, how many files found by git to check ahead of
+# time, per thread
+_DISCOVERY_WINDOW_PER_THREAD = 16
+# with '--staged', how many files' content to read from git's index ahead of
+# processing them, unless '--read-ahead' is given
+_STAGED_READ_WINDOW = 64
+# files are discovered lazily, and ordered and chunked this many at a time
+_SCHEDULING_BATCH_FILES = 4096
+# the most files to have sent to each worker (for its share) without a result yet
+_IN_FLIGHT_FILES_PER_WORKER = 2 * _CHUNKS_PER_WORKER * _MAX_CHUNK_FILES
+# modules which workers need, imported by the forkserver (if used) so that workers
+# start with them already imported
+# 'libcst.native' is the parser, which libcst only imports on the first parse
+WORKER_PRELOAD_MODULES: tuple[str, ...] = ("libcst.native", "slyp.driver")
+# a small module which every fixer and checker has something to do on, used to warm
+# up workers (see 'warm_up')
+_WARM_UP_SOURCE = b"""\
+def f(x, y=None):
+    if (x) is None:
+        return x
+    if x:
+        return "a" "b"
+    else:
+        return "a" "b"
+    return [dict(a=y), "c" + "d"]
+"""
+
+
+def driver_main(
+    args: argparse.Namespace,
+    *,
+    process_pool: WorkerPool | None = None,
+    result_cache: ResultCache | None = None,
+) -> bool:
+    """
+    Run slyp as configured by parsed CLI args.
 
+    Long-lived callers may pass a ``process_pool`` to use (it is not closed), and a
+    ``result_cache`` which is consulted before processing any file.
+    """
+    disabled_codes, enabled_codes = resolve_codes(args.disable, args.enable)
+    # decide which checkers can produce enabled codes once, up front
+    check_plan = make_check_plan(disabled_codes, enabled_codes)
+
+    if args.files == ["-"]:
+        return process_stdin(args, disabled_codes, enabled_codes, check_plan)
+    elif args.watch:
+        return watch_process(args, disabled_codes, enabled_codes, check_plan)
+    else:
+        return parallel_process(
+            args,
+            disabled_codes,
+            enabled_codes,
+            check_plan,
+            process_pool=process_pool,
+            result_cache=result_cache,
+        )
 
-def driver_main(args: argparse.Namespace) -> bool:
+
+def resolve_codes(disable: str, enable: str) -> tuple[set[str], set[str]]:
+    """
+    Get the disabled and enabled codes from the values of '--disable' and
+    '--enable', in that order.
+    """
     # parse inputs from comma delimited lists
-    disabled_codes = {x for x in args.disable.split(",") if x != ""}
-    enabled_codes = {x for x in args.enable.split(",") if x != ""}
+    disabled_codes = {x for x in disable.split(",") if x != ""}
+    enabled_codes = {x for x in enable.split(",") if x != ""}
     # add default disables if "all" is not in --enable
     if "all" not in enabled_codes:
         disabled_codes = disabled_codes | DEFAULT_DISABLED_CODES
-
-    if args.files == ["-"]:
-        return process_stdin(args, disabled_codes, enabled_codes)
-    else:
-        return parallel_process(args, disabled_codes, enabled_codes)
+    return disabled_codes, enabled_codes
 
 
 def process_stdin(
-    args: argparse.Namespace, disabled_codes: set[str], enabled_codes: set[str]
+    args: argparse.Namespace,
+    disabled_codes: set[str],
+    enabled_codes: set[str],
+    check_plan: CheckPlan,
 ) -> bool:
     result = Result(success=True, messages=[])
     file_obj = HashableFile("-")
 
     if args.only == "fix":
-        result = fix_file(file_obj)
+        result = fix_file(file_obj, max_passes=_max_fix_passes(args))
         message_stream = sys.stderr
     elif args.only == "lint":
         result = result.join(
@@ -52,6 +140,7 @@ def process_stdin(
                 file_obj,
                 disabled_codes=disabled_codes,
                 enabled_codes=enabled_codes,
+                plan=check_plan,
             )
         )
         message_stream = sys.stdout
@@ -66,62 +155,1076 @@ def process_stdin(
 
 
 def parallel_process(
-    args: argparse.Namespace, disabled_codes: set[str], enabled_codes: set[str]
+    args: argparse.Namespace,
+    disabled_codes: set[str],
+    enabled_codes: set[str],
+    check_plan: CheckPlan,
+    *,
+    process_pool: WorkerPool | None = None,
+    result_cache: ResultCache | None = None,
 ) -> bool:
-    if not args.no_cache:
-        passing_cache: PassingFileCache | None = PassingFileCache(
-            contract_version=CONTRACT_VERSION,
-            config_id=compute_config_id(enabled_codes, disabled_codes),
+    passing_cache = _make_passing_cache(args, disabled_codes, enabled_codes)
+    config_id = compute_config_id(enabled_codes, disabled_codes)
+
+    if args.diff_base is not None:
+        changed_ranges: dict[str, LineRanges] | None = changed_line_ranges(
+            args.diff_base
         )
     else:
-        passing_cache = None
+        changed_ranges = None
+
+    config = _RunConfig(
+        only=args.only,
+        disabled_codes=disabled_codes,
+        enabled_codes=enabled_codes,
+        passing_cache=passing_cache,
+        check_plan=check_plan,
+        max_fix_passes=_max_fix_passes(args),
+        file_timeout=args.file_timeout,
+        max_worker_memory=_max_worker_memory(args),
+    )
+    timing_cache = (
+        None if args.no_cache else TimingCache(contract_version=CONTRACT_VERSION)
+    )
+    success = True
 
-    process_pool = multiprocessing.pool.Pool()
+    # files to add to the result cache once processed, with their cache keys
+    cacheable: dict[str, tuple[t.Hashable, HashableFile]] = {}
 
-    futures = {}
-    for filename in all_py_filenames(args.files, args.use_git_ls):
-        if args.verbosity >= 1:
-            print(f"slpy: processing {filename}", file=sys.stderr)
-        futures[filename] = process_pool.apply_async(
-            process_file,
-            (filename, args.only, disabled_codes, enabled_codes, passing_cache),
+    writer = OutputWriter(args.verbosity)
+    # with '--ordered', results are held until those of earlier files are written
+    # each result is paired with whether or not its file was processed in this run
+    reorder: ReorderBuffer[tuple[Result, bool]] | None = (
+        ReorderBuffer() if args.ordered else None
+    )
+    # the order in which files were found, for files being processed
+    positions: dict[str, collections.deque[int]] = collections.defaultdict(
+        collections.deque
+    )
+    # the number of processed files whose results have been written
+    written = 0
+    # git's ids for the content of unchanged files, with '--use-git-ls', so that
+    # cached results can be found without reading those files
+    blob_ids: dict[str, str] | None = (
+        {} if passing_cache is not None or result_cache is not None else None
+    )
+    # with '--staged', the files and content to process come from git's index, and
+    # fixes to that content are collected, to be applied (or printed) at the end
+    staged = StagedFiles() if args.staged else None
+    staged_fixes: dict[str, bytes] = {}
+
+    def _write(position: int, result: Result, processed: bool) -> None:
+        nonlocal written
+        released = (
+            [(result, processed)]
+            if reorder is None
+            else reorder.add(position, (result, processed))
+        )
+        for result, processed in released:
+            writer.write(result)
+            written += processed
+
+    def _discover() -> t.Iterator[_Task]:
+        nonlocal success
+        stats = DiscoveryStats()
+        filenames = (
+            all_py_filenames(
+                args.files,
+                args.use_git_ls,
+                changed_ranges,
+                exclude=exclude_matcher(args),
+                threads=args.discovery_threads,
+                stats=stats,
+                blob_ids=blob_ids,
+            )
+            if staged is None
+            else staged.find(args.files, exclude=exclude_matcher(args), stats=stats)
+        )
+        for position, filename in enumerate(filenames):
+            line_ranges = (
+                None
+                if changed_ranges is None
+                else changed_ranges[normalize_path(filename)]
+            )
+            if result_cache is not None:
+                blob_id = None if blob_ids is None else blob_ids.get(filename)
+                file_obj = HashableFile(filename, _blob_id=blob_id)
+                try:
+                    cache_key = result_cache.make_key(
+                        file_obj,
+                        config_id,
+                        args.only,
+                        _max_fix_passes(args),
+                        None if line_ranges is None else tuple(line_ranges),
+                    )
+                except OSError:
+                    # let processing report on unreadable files, as usual
+                    cache_key = None
+                cached_result = (
+                    None if cache_key is None else result_cache.get(cache_key)
+                )
+                if cached_result is not None:
+                    if args.verbosity >= 1:
+                        print(f"slpy: processing {filename}", file=sys.stderr)
+                    _write(position, cached_result, False)
+                    success = success and cached_result.success
+                    continue
+                if cache_key is not None:
+                    cacheable[filename] = (cache_key, file_obj)
+
+            if args.verbosity >= 1:
+                print(f"slpy: processing {filename}", file=sys.stderr)
+            if reorder is not None:
+                positions[filename].append(position)
+            yield filename, line_ranges
+        # files are found as they are processed, so this is only known at the end
+        if args.verbosity >= 1 and not args.files:
+            print(f"slyp: {stats.describe()}", file=sys.stderr)
+
+    def _handle(done: _Completed) -> None:
+        nonlocal success
+        position = 0
+        if reorder is not None:
+            # a file passed more than once is processed more than once
+            position = positions[done.filename].popleft()
+            if not positions[done.filename]:
+                del positions[done.filename]
+        _write(position, done.result, True)
+        success = success and done.result.success
+        if done.fixed_content is not None:
+            staged_fixes[done.filename] = done.fixed_content
+
+        if result_cache is not None and done.filename in cacheable:
+            cache_key, file_obj = cacheable.pop(done.filename)
+            # errors from slyp itself are not a result of the file's content
+            if not done.errored:
+                result_cache.add(cache_key, file_obj, done.result)
+        # timeouts are recorded too, so that those files are started first, but
+        # cache hits say nothing about how long the file takes to check
+        if timing_cache is not None and done.duration and not done.result.from_cache:
+            timing_cache.record(done.filename, done.duration)
+
+    def _finish_staged() -> None:
+        if staged is None:
+            return
+        writer.flush()
+        if staged_fixes and args.patch:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(staged.patch(staged_fixes))
+            sys.stdout.buffer.flush()
+        elif staged_fixes:
+            writer.write(Result(success=True, messages=staged.apply(staged_fixes)))
+            writer.flush()
+        staged.close()
+
+    # files are discovered lazily, and scheduled a batch at a time, so that runs
+    # over very large trees start work early and never hold every file at once
+    batches = _batched(_discover(), _SCHEDULING_BATCH_FILES)
+    first_batch = next(batches, [])
+    first_sizes = [_file_size(filename) for filename, _ in first_batch]
+    jobs = choose_jobs(args.jobs, first_sizes)
+    # small batches are cheaper to process than it is to start (or use) workers
+    if jobs == 1:
+        tasks = itertools.chain(first_batch, itertools.chain.from_iterable(batches))
+        for (task,), contents in _read_ahead(
+            ([task] for task in tasks), args.read_ahead, blob_ids, staged
+        ):
+            _handle(
+                _process_task(task, config, None if contents is None else contents[0])
+            )
+        writer.flush()
+        _finish_staged()
+        if timing_cache is not None:
+            timing_cache.save()
+        return success
+
+    completed: queue.Queue[_Completed] = queue.Queue()
+    owns_pool = process_pool is None
+    retired_chunks: multiprocessing.SimpleQueue[_RetiredChunk | None] | None = None
+    if process_pool is None:
+        # workers over the memory limit hand back their next chunk, and exit
+        if config.max_worker_memory is not None:
+            retired_chunks = multiprocessing.SimpleQueue()
+        process_pool = make_pool(
+            jobs,
+            config,
+            executor=choose_executor(args),
+            verbosity=args.verbosity,
+            max_tasks_per_worker=args.max_tasks_per_worker,
+            retired_chunks=retired_chunks,
+        )
+        # the config is sent to each worker once, by the initializer
+        chunk_config = None
+    else:
+        # a pool shared between runs has no config for this run, so it is sent
+        # along with every chunk instead
+        chunk_config = config
+
+    if retired_chunks is not None:
+        resubmitter = _start_resubmitter(
+            process_pool, completed, retired_chunks, args.verbosity
+        )
+    sized_batches = itertools.chain(
+        [(first_batch, first_sizes)],
+        ((batch, [_file_size(filename) for filename, _ in batch]) for batch in batches),
+    )
+    submissions = _read_ahead(
+        _schedule(sized_batches, jobs, args.chunk_size, timing_cache),
+        args.read_ahead,
+        blob_ids,
+        staged,
+    )
+
+    # only a bounded number of files are in flight (or have results waiting to be
+    # written) at once, and more are submitted as results are written, so neither
+    # the pool's queue of tasks, its pending results, nor the results held back by
+    # '--ordered' grow with the number of files
+    max_unwritten = jobs * _IN_FLIGHT_FILES_PER_WORKER
+    if reorder is not None:
+        # results wait on the first file of their batch, which may be submitted
+        # last, so there must be room for the whole batch
+        max_unwritten = max(max_unwritten, _SCHEDULING_BATCH_FILES)
+    submitted = 0
+    while True:
+        while submitted - written < max_unwritten and (
+            submission := next(submissions, None)
+        ):
+            chunk, chunk_contents = submission
+            _submit_chunk(process_pool, completed, chunk, chunk_config, chunk_contents)
+            submitted += len(chunk)
+        if submitted == written:
+            break
+        # output is written in batches, but never held while waiting on results
+        if completed.empty():
+            writer.flush()
+        # results are handled in order of completion, as soon as each one arrives
+        _handle(completed.get())
+    writer.flush()
+    _finish_staged()
+
+    if retired_chunks is not None:
+        retired_chunks.put(None)
+        resubmitter.join()
+        # the pool still waits on the results of retired chunks, which never come,
+        # but all results are in and the workers are idle
+        process_pool.terminate()
+    elif owns_pool:
+        process_pool.close()
+    if owns_pool:
+        process_pool.join()
+    if timing_cache is not None:
+        timing_cache.save()
+
+    return success
+
+
+def expected_costs(
+    filenames: list[str], sizes: list[int], timing_cache: TimingCache | None
+) -> list[float]:
+    """
+    Estimate how long each file will take to process, in arbitrary units.
+
+    Files use their time from the last run, if there was one. Otherwise, cost is
+    taken to be proportional to size, at the rate seen for the files with timings.
+    """
+    timings = [
+        None if timing_cache is None else timing_cache.get(filename)
+        for filename in filenames
+    ]
+    timed = [(size, seconds) for size, seconds in zip(sizes, timings) if seconds]
+    timed_bytes = sum(size for size, _ in timed)
+    timed_seconds = sum(seconds for _, seconds in timed)
+    seconds_per_byte = timed_seconds / timed_bytes if timed_bytes else 1.0
+    return [
+        size * seconds_per_byte if seconds is None else seconds
+        for size, seconds in zip(sizes, timings)
+    ]
+
+
+def _batched(tasks: t.Iterable[_Task], size: int) -> t.Iterator[list[_Task]]:
+    tasks = iter(tasks)
+    while batch := list(itertools.islice(tasks, size)):
+        yield batch
+
+
+def _schedule(
+    batches: t.Iterable[tuple[list[_Task], list[int]]],
+    jobs: int,
+    chunk_size: int | None,
+    timing_cache: TimingCache | None,
+) -> t.Iterator[list[_Task]]:
+    """
+    Order and chunk batches of tasks (with the sizes of their files), in turn.
+
+    Within each batch, the most expensive files are started first, so that no
+    worker is left with a large file to process at the end while the others sit
+    idle.
+    """
+    for tasks, sizes in batches:
+        costs = expected_costs([filename for filename, _ in tasks], sizes, timing_cache)
+        order = sorted(range(len(tasks)), key=costs.__getitem__, reverse=True)
+        yield from make_chunks(
+            [tasks[i] for i in order], jobs, chunk_size, sizes=[sizes[i] for i in order]
         )
-    process_pool.close()
 
-    success = True
 
-    while futures:
-        ready = set()
-        for filename, future in futures.items():
-            if future.ready():
-                ready.add(filename)
-        if not ready:
-            time.sleep(0.05)
-
-        for filename in ready:
-            future = futures.pop(filename)
-            try:
-                result = future.get()
-            except Exception as e:
-                result = Result(
-                    success=False,
-                    messages=[
-                        Message(f"slyp error on '{filename}': {e}"),
-                        Message(
-                            f"slyp error on '{filename}': {e.__traceback__}",
-                            verbosity=2,
-                        ),
-                    ],
+def _read_ahead(
+    chunks: t.Iterable[list[_Task]],
+    window: int | None,
+    blob_ids: dict[str, str] | None = None,
+    staged: StagedFiles | None = None,
+) -> t.Iterator[tuple[list[_Task], _ChunkContents]]:
+    """
+    Pair each chunk with what is known of its files: git's ids for them (from
+    ``blob_ids``), or their contents, read up to ``window`` files ahead. Otherwise,
+    workers read files themselves.
+
+    With ``staged``, every file's content is read from git's index instead.
+    """
+    if staged is not None:
+        chunks, read_chunks = itertools.tee(chunks)
+        files = staged.read(
+            (filename for chunk in read_chunks for filename, _ in chunk),
+            window or _STAGED_READ_WINDOW,
+        )
+        return ((chunk, [next(files) for _ in chunk]) for chunk in chunks)
+
+    if not blob_ids:
+        blob_ids = {}
+        if not window:
+            return ((chunk, None) for chunk in chunks)
+
+    if window:
+        chunks, read_chunks = itertools.tee(chunks)
+        # files with known ids may never need to be read at all
+        contents = prefetch(
+            (
+                filename
+                for chunk in read_chunks
+                for filename, _ in chunk
+                if filename not in blob_ids
+            ),
+            window,
+        )
+    else:
+        contents = itertools.repeat(None)
+    return (
+        (
+            chunk,
+            [
+                blob_ids[filename] if filename in blob_ids else next(contents)
+                for filename, _ in chunk
+            ],
+        )
+        for chunk in chunks
+    )
+
+
+def choose_executor(args: argparse.Namespace) -> str:
+    """
+    Decide which kind of worker to use: "process", "thread", or "interpreter".
+
+    An explicit ``--executor`` is used as-is. Otherwise, threads are used on
+    free-threaded builds of python with the GIL disabled, where they run in
+    parallel without the costs of starting processes and of sending files and
+    results between them. Processes are still used for the options which only
+    processes support. Subinterpreters are only used when asked for.
+    """
+    if args.executor is not None:
+        executor: str = args.executor
+        return executor
+    if (
+        args.file_timeout is not None
+        or args.max_tasks_per_worker is not None
+        or args.max_worker_memory is not None
+    ):
+        return "process"
+    return "process" if is_gil_enabled() else "thread"
+
+
+def is_gil_enabled() -> bool:
+    # only free-threaded builds (3.13+) can run without the GIL
+    is_enabled: t.Callable[[], bool] = getattr(sys, "_is_gil_enabled", lambda: True)
+    return is_enabled()
+
+
+def choose_jobs(jobs: int | None, sizes: list[int]) -> int:
+    """
+    Decide how many processes to use for files of the given sizes.
+
+    An explicit number of ``jobs`` is used as-is. Otherwise, each worker is only
+    started if there is enough work to pay for starting it: at least
+    ``_BYTES_PER_WORKER`` bytes of source. One job means processing in-process.
+    """
+    if jobs is not None:
+        return jobs
+    cpus = os.cpu_count() or 1
+    return max(1, min(cpus, len(sizes), sum(sizes) // _BYTES_PER_WORKER))
+
+
+def watch_process(
+    args: argparse.Namespace,
+    disabled_codes: set[str],
+    enabled_codes: set[str],
+    check_plan: CheckPlan,
+) -> bool:
+    """
+    Process files, and then keep processing them again whenever they change, until
+    interrupted.
+
+    The worker pool and cache are kept for the whole session, so each change only
+    costs the processing of the changed files.
+    Returns whether or not all files were passing at the time of interruption.
+    """
+    passing_cache = _make_passing_cache(args, disabled_codes, enabled_codes)
+    exclude = exclude_matcher(args)
+    watcher = FileWatcher(
+        lambda: all_py_filenames(
+            args.files,
+            args.use_git_ls,
+            exclude=exclude,
+            threads=args.discovery_threads,
+        )
+    )
+
+    config = _RunConfig(
+        only=args.only,
+        disabled_codes=disabled_codes,
+        enabled_codes=enabled_codes,
+        passing_cache=passing_cache,
+        check_plan=check_plan,
+        max_fix_passes=_max_fix_passes(args),
+        file_timeout=args.file_timeout,
+        max_worker_memory=_max_worker_memory(args),
+    )
+    retired_chunks: multiprocessing.SimpleQueue[_RetiredChunk | None] | None = (
+        None if config.max_worker_memory is None else multiprocessing.SimpleQueue()
+    )
+    process_pool = make_pool(
+        args.jobs,
+        config,
+        executor=choose_executor(args),
+        # the parent handles interruption, and terminates the workers itself
+        ignore_sigint=True,
+        verbosity=args.verbosity,
+        max_tasks_per_worker=args.max_tasks_per_worker,
+        retired_chunks=retired_chunks,
+    )
+
+    completed: queue.Queue[_Completed] = queue.Queue()
+    if retired_chunks is not None:
+        _start_resubmitter(process_pool, completed, retired_chunks, args.verbosity)
+    in_flight: set[str] = set()
+    failing: set[str] = set()
+    announced = False
+    try:
+        while True:
+            # files being processed are not polled, as they may be written by fixing
+            changed = watcher.poll(skip=in_flight)
+            for filename in changed:
+                if args.verbosity >= 1:
+                    print(f"slpy: processing {filename}", file=sys.stderr)
+            # the content is read here and handed to the workers, so that what is
+            # marked as seen is exactly what was processed
+            contents = {filename: read_file(filename) for filename in changed}
+            for chunk in make_chunks(
+                [(filename, None) for filename in changed],
+                args.jobs or os.cpu_count() or 1,
+                args.chunk_size,
+                sizes=[
+                    0 if known is None else len(known[0]) for known in contents.values()
+                ],
+            ):
+                _submit_chunk(
+                    process_pool,
+                    completed,
+                    chunk,
+                    contents=[contents[filename] for filename, _ in chunk],
+                )
+            in_flight.update(changed)
+            if not announced and args.verbosity >= 1:
+                print(
+                    f"slyp: watching {len(watcher.files)} files for changes",
+                    file=sys.stderr,
                 )
-            for message in result.messages:
-                if message.verbosity <= args.verbosity:
-                    print(message.message)
+                announced = True
 
-            success = success and result.success
+            # handle results as they arrive, until it is time to poll again
+            next_poll = time.monotonic() + WATCH_POLL_INTERVAL
+            while (timeout := next_poll - time.monotonic()) > 0:
+                try:
+                    done = completed.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                in_flight.discard(done.filename)
+                _print_messages(done.result, args.verbosity)
+                sys.stdout.flush()
+                # fixing may have changed the file, so its new content is what has
+                # been seen, not what was originally submitted
+                # but a later edit (made while the file was processed) has not
+                watcher.mark(done.filename, done.sha)
+                if done.result.success:
+                    failing.discard(done.filename)
+                else:
+                    failing.add(done.filename)
+    except KeyboardInterrupt:
+        process_pool.terminate()
 
     process_pool.join()
 
-    return result.success
+    # removed files can no longer be failing
+    return not (failing & watcher.files)
+
+
+def _max_worker_memory(args: argparse.Namespace) -> int | None:
+    if args.max_worker_memory is None:
+        return None
+    megabytes: int = args.max_worker_memory
+    return megabytes * 1024 * 1024
+
+
+def _make_passing_cache(
+    args: argparse.Namespace, disabled_codes: set[str], enabled_codes: set[str]
+) -> PassingFileCache | None:
+    if args.no_cache:
+        return None
+    return PassingFileCache(
+        contract_version=CONTRACT_VERSION,
+        config_id=compute_config_id(enabled_codes, disabled_codes),
+    )
+
+
+# a file to process, and the lines to limit processing to (if any)
+_Task = tuple[str, t.Optional[LineRanges]]
+# what is known of a file's content before it is processed: the content, its sha,
+# and its stat if it was read ahead of time, or git's id for it, or the file itself
+# (e.g. content from git's index, held in memory), or nothing
+_Known = t.Union[Prefetched, str, HashableFile, None]
+# what is known of the files in a chunk, if anything
+_ChunkContents = t.Optional[list[_Known]]
+# a chunk handed back by a worker which is over the memory limit
+_RetiredChunk = tuple[list[_Task], _ChunkContents]
+
+
+@dataclasses.dataclass(frozen=True)
+class _RunConfig:
+    """The options for processing files, which are the same for a whole run."""
+
+    only: str | None
+    disabled_codes: set[str]
+    enabled_codes: set[str]
+    passing_cache: PassingFileCache | None
+    check_plan: CheckPlan
+    max_fix_passes: int
+    # the longest that processing of any one file may take, in seconds
+    file_timeout: float | None = None
+    # the most memory which a worker may use before it is replaced, in bytes
+    max_worker_memory: int | None = None
+
+
+@dataclasses.dataclass
+class _Completed:
+    filename: str
+    result: Result
+    # whether slyp itself failed, rather than producing a result
+    errored: bool = False
+    # how long processing took, in seconds
+    duration: float = 0.0
+    # the fixed content of a file held in memory, if fixing changed it
+    fixed_content: bytes | None = None
+    # the sha of the content which was processed (or written, by fixing), if the
+    # file was read
+    sha: str | None = None
+
+
+class WorkerPool(t.Protocol):
+    """
+    The parts of the ``multiprocessing.pool.Pool`` interface which are used to run
+    work, whichever kind of worker runs it.
+    """
+
+    def apply_async(
+        self,
+        func: t.Callable[..., t.Any],
+        args: t.Iterable[t.Any] = ...,
+        kwds: t.Mapping[str, t.Any] = ...,
+        callback: t.Callable[[t.Any], object] | None = ...,
+        error_callback: t.Callable[[BaseException], object] | None = ...,
+    ) -> t.Any:
+        """Run ``func(*args, **kwds)`` on a worker, returning an ``AsyncResult``."""
+
+    def close(self) -> None:
+        """Stop accepting work, letting the workers finish what they have."""
+
+    def terminate(self) -> None:
+        """Stop the workers at once, abandoning any outstanding work."""
+
+    def join(self) -> None:
+        """Wait for the workers to exit, after ``close`` or ``terminate``."""
+
+
+class _ExecutorPool:
+    """
+    A ``WorkerPool`` which runs work on a ``concurrent.futures`` executor.
+
+    Callbacks are run when each future is done, in whichever thread completes it.
+    """
+
+    def __init__(self, executor: concurrent.futures.Executor) -> None:
+        self._executor = executor
+
+    def apply_async(
+        self,
+        func: t.Callable[..., t.Any],
+        args: t.Iterable[t.Any] = (),
+        kwds: t.Mapping[str, t.Any] | None = None,
+        callback: t.Callable[[t.Any], object] | None = None,
+        error_callback: t.Callable[[BaseException], object] | None = None,
+    ) -> concurrent.futures.Future[t.Any]:
+        future = self._executor.submit(func, *args, **(kwds or {}))
+
+        def _on_done(done: concurrent.futures.Future[t.Any]) -> None:
+            if done.cancelled():
+                return
+            error = done.exception()
+            if error is not None:
+                if error_callback is not None:
+                    error_callback(error)
+            elif callback is not None:
+                callback(done.result())
+
+        future.add_done_callback(_on_done)
+        return future
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def terminate(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def join(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+# the run config in a worker process, as set by the pool initializer
+_worker_config: _RunConfig | None = None
+# whether this process has run 'warm_up', which workers inherit under 'fork'
+_warmed_up = False
+# held while warming up, as thread workers may all start at once
+_warm_up_lock = threading.Lock()
+# where a worker which is over the memory limit hands back a chunk before it exits,
+# as set by the pool initializer
+_worker_retired_chunks: multiprocessing.SimpleQueue[_RetiredChunk | None] | None = None
+_worker_chunks_done = 0
+
+
+def make_pool(
+    processes: int | None,
+    config: _RunConfig | None,
+    *,
+    executor: str = "process",
+    ignore_sigint: bool = False,
+    verbosity: int = 0,
+    max_tasks_per_worker: int | None = None,
+    retired_chunks: multiprocessing.SimpleQueue[_RetiredChunk | None] | None = None,
+) -> WorkerPool:
+    """
+    Start a pool of workers which are warmed up (see ``warm_up``) before they are
+    given any files.
+
+    ``config`` is set as the workers' config for processing files, if given.
+    Each worker is replaced after ``max_tasks_per_worker`` chunks, if given.
+    A worker over the config's ``max_worker_memory`` puts the next chunk it is
+    given on ``retired_chunks`` unprocessed, and exits to be replaced; the caller
+    must submit those chunks again.
+
+    With the "thread" and "interpreter" executors, workers run in this process and
+    share its signal handling and memory, so ``ignore_sigint`` does not apply, and
+    worker replacement is not supported. If subinterpreters are unavailable, or
+    cannot import the parser, processes are used instead.
+    """
+    if executor != "process" and (
+        max_tasks_per_worker is not None or retired_chunks is not None
+    ):
+        raise ValueError(f"{executor} workers cannot be replaced")
+    if executor == "thread":
+        return multiprocessing.pool.ThreadPool(
+            processes=processes,
+            initializer=_init_worker,
+            initargs=(config, False, verbosity, time.time()),
+        )
+    if executor == "interpreter":
+        interpreter_pool = _make_interpreter_pool(processes, config, verbosity)
+        if interpreter_pool is not None:
+            return interpreter_pool
+        if verbosity >= 1:
+            print(
+                "slyp: subinterpreters cannot be used, using processes instead",
+                file=sys.stderr,
+            )
+
+    prepare_worker_start()
+    return multiprocessing.pool.Pool(
+        processes=processes,
+        initializer=_init_worker,
+        initargs=(config, ignore_sigint, verbosity, time.time(), retired_chunks),
+        maxtasksperchild=max_tasks_per_worker,
+    )
+
+
+def _make_interpreter_pool(
+    workers: int | None, config: _RunConfig | None, verbosity: int
+) -> _ExecutorPool | None:
+    # added in python 3.14
+    executor_class = getattr(concurrent.futures, "InterpreterPoolExecutor", None)
+    if executor_class is None:
+        return None
+
+    executor: concurrent.futures.Executor = executor_class(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(config, False, verbosity, time.time()),
+    )
+    # each interpreter imports slyp (and libcst) for itself, and extension modules
+    # may refuse to load in a subinterpreter, so check that one worker can start
+    try:
+        executor.submit(warm_up).result()
+    except Exception:
+        executor.shutdown(wait=False, cancel_futures=True)
+        return None
+    return _ExecutorPool(executor)
+
+
+def prepare_worker_start() -> None:
+    """
+    Prepare to start worker processes, so that as little as possible is repeated by
+    each worker.
+
+    Forked workers inherit the parent's state, so the parent warms up first.
+    Under 'forkserver', the server imports ``WORKER_PRELOAD_MODULES`` once, and
+    workers are forked from it. Under 'spawn', nothing can be shared, and each
+    worker warms up on its own.
+    """
+    start_method = multiprocessing.get_start_method()
+    if start_method == "fork":
+        warm_up()
+    elif start_method == "forkserver":
+        multiprocessing.set_forkserver_preload(list(WORKER_PRELOAD_MODULES))
+
+
+def warm_up() -> None:
+    """
+    Do the work which is otherwise done the first time that a file is processed.
+
+    This imports the parser, and runs the fixer and all checkers once on a small
+    module, to build whatever libcst builds and caches lazily. Repeated calls do
+    nothing.
+    """
+    global _warmed_up
+    with _warm_up_lock:
+        if _warmed_up:
+            return
+        for module in WORKER_PRELOAD_MODULES:
+            importlib.import_module(module)
+        # fixing rewrites the file, so work on an in-memory copy
+        file_obj = InMemoryFile.from_content("<slyp warm-up>", _WARM_UP_SOURCE)
+        fix_file(file_obj)
+        find_errors(
+            InMemoryFile.from_content("<slyp warm-up>", _WARM_UP_SOURCE),
+            disabled_codes=set(),
+            enabled_codes={"all"},
+        )
+        _warmed_up = True
+
+
+def _init_worker(
+    config: _RunConfig | None,
+    ignore_sigint: bool = False,
+    verbosity: int = 0,
+    pool_created_at: float = 0.0,
+    retired_chunks: multiprocessing.SimpleQueue[_RetiredChunk | None] | None = None,
+) -> None:
+    global _worker_config, _worker_retired_chunks, _worker_chunks_done
+    _worker_config = config
+    _worker_retired_chunks = retired_chunks
+    _worker_chunks_done = 0
+    if ignore_sigint:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    warm_up_start = time.time()
+    warm_up()
+    if verbosity >= 1:
+        ready = time.time()
+        current_thread = threading.current_thread()
+        worker = (
+            str(os.getpid())
+            if current_thread is threading.main_thread()
+            else current_thread.name
+        )
+        # written in one call, so that lines from several workers do not interleave
+        sys.stderr.write(
+            f"slyp: worker {worker} started in {ready - pool_created_at:.3f}s "
+            f"(warm-up {ready - warm_up_start:.3f}s)\n"
+        )
+        sys.stderr.flush()
+
+
+def make_chunks(
+    tasks: list[_Task],
+    workers: int,
+    chunk_size: int | None = None,
+    *,
+    sizes: list[int] | None = None,
+) -> list[list[_Task]]:
+    """
+    Split tasks into chunks, each of which is sent to a worker as a single task.
+
+    With a fixed ``chunk_size``, each chunk holds that many files. Otherwise, the
+    size adapts to the work to be done: chunks are limited by both file count and
+    total bytes, so that each worker receives several chunks of similar cost.
+    Small batches are not chunked at all, so that every worker gets a share.
+    ``sizes`` are the sizes of the files, if they are already known.
+    """
+    if chunk_size is not None:
+        return [tasks[i : i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    if sizes is None:
+        sizes = [_file_size(filename) for filename, _ in tasks]
+    target_chunks = workers * _CHUNKS_PER_WORKER
+    max_files = max(1, min(_MAX_CHUNK_FILES, len(tasks) // target_chunks))
+    max_bytes = sum(sizes) / target_chunks
+
+    chunks: list[list[_Task]] = []
+    chunk: list[_Task] = []
+    chunk_bytes = 0
+    for task, size in zip(tasks, sizes):
+        chunk.append(task)
+        chunk_bytes += size
+        if len(chunk) >= max_files or chunk_bytes >= max_bytes:
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _file_size(filename: str) -> int:
+    try:
+        return os.stat(filename).st_size
+    except OSError:
+        return 0
+
+
+def _submit_chunk(
+    process_pool: WorkerPool,
+    completed: queue.Queue[_Completed],
+    chunk: list[_Task],
+    config: _RunConfig | None = None,
+    contents: _ChunkContents = None,
+) -> None:
+    """
+    Submit a chunk of files for processing, putting the result for each file on
+    ``completed`` when done.
+
+    ``config`` must be given unless the pool's workers were initialized with one.
+    ``contents`` are sent along with the files, if they were read ahead of time.
+    """
+
+    # these run in the pool's result handling thread
+    def _callback(results: list[_Completed]) -> None:
+        for done in results:
+            completed.put(done)
+
+    def _error_callback(e: BaseException) -> None:
+        for filename, _ in chunk:
+            completed.put(
+                _Completed(filename, _error_result(filename, e), errored=True)
+            )
+
+    process_pool.apply_async(
+        process_chunk,
+        (chunk, config, contents),
+        callback=_callback,
+        error_callback=_error_callback,
+    )
+
+
+def _start_resubmitter(
+    process_pool: WorkerPool,
+    completed: queue.Queue[_Completed],
+    retired_chunks: multiprocessing.SimpleQueue[_RetiredChunk | None],
+    verbosity: int,
+) -> threading.Thread:
+    """
+    Start a thread which submits chunks handed back by retiring workers again,
+    until it gets None.
+    """
+
+    def _resubmit() -> None:
+        while (retired := retired_chunks.get()) is not None:
+            if verbosity >= 1:
+                print(
+                    "slyp: replacing a worker which exceeded the memory limit",
+                    file=sys.stderr,
+                )
+            chunk, contents = retired
+            _submit_chunk(process_pool, completed, chunk, contents=contents)
+
+    thread = threading.Thread(target=_resubmit, daemon=True)
+    thread.start()
+    return thread
+
+
+def process_chunk(
+    chunk: list[_Task],
+    config: _RunConfig | None = None,
+    contents: _ChunkContents = None,
+) -> list[_Completed]:
+    """
+    Process a chunk of files in a worker, using the worker's config by default.
+
+    Files are read by the worker, unless their ``contents`` are given (or git's
+    ids for them are, and a cached result is found).
+    """
+    global _worker_chunks_done
+    if config is None:
+        if _worker_config is None:
+            raise RuntimeError("worker was not initialized with a config")
+        config = _worker_config
+
+    # a worker is only replaced between chunks, when it holds no locks shared with
+    # other workers, and a new worker is never replaced before doing any work
+    if (
+        _worker_retired_chunks is not None
+        and config.max_worker_memory is not None
+        and _worker_chunks_done > 0
+        and (_memory_usage() or 0) > config.max_worker_memory
+    ):
+        _worker_retired_chunks.put((chunk, contents))
+        os._exit(0)
+
+    if contents is None:
+        contents = [None] * len(chunk)
+    results = [
+        _process_task(task, config, known) for task, known in zip(chunk, contents)
+    ]
+    _worker_chunks_done += 1
+    return results
+
+
+def _memory_usage() -> int | None:
+    """Get the resident memory of this process in bytes, if it can be found."""
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # elsewhere, only the peak is available, which is close enough to decide when
+    # to replace a worker
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _process_task(task: _Task, config: _RunConfig, known: _Known = None) -> _Completed:
+    filename, line_ranges = task
+    start = time.perf_counter()
+    # fixes to content held in memory are handed back, for the caller to apply
+    in_memory = known if isinstance(known, InMemoryFile) else None
+    original_content = None if in_memory is None else in_memory.binary_content
+    file_obj = _file_object(filename, known)
+    # an error on one file does not prevent processing of any others
+    try:
+        with _time_limit(config.file_timeout):
+            result = process_file(
+                filename,
+                config.only,
+                config.disabled_codes,
+                config.enabled_codes,
+                config.passing_cache,
+                config.check_plan,
+                config.max_fix_passes,
+                line_ranges,
+                file_obj,
+            )
+    except _FileTimeout:
+        timeout_message = Message(f"{filename}:0: {CODE_MAP['X003']}")
+        return _Completed(
+            filename,
+            Result(success=False, messages=[timeout_message]),
+            errored=True,
+            duration=time.perf_counter() - start,
+        )
+    except Exception as e:
+        return _Completed(filename, _error_result(filename, e), errored=True)
+    fixed_content = None
+    if in_memory is not None and in_memory.binary_content != original_content:
+        fixed_content = in_memory.binary_content
+    return _Completed(
+        filename,
+        result,
+        duration=time.perf_counter() - start,
+        fixed_content=fixed_content,
+        # a file found in the cache by its stat is not read, and the content now on
+        # disk may be newer than what was checked
+        sha=None if file_obj._binary_content is None else file_obj.sha,
+    )
+
+
+class _FileTimeout(BaseException):
+    # a BaseException, so that it is not caught by handling of errors in processing
+    pass
+
+
+@contextlib.contextmanager
+def _time_limit(seconds: float | None) -> t.Iterator[None]:
+    """
+    Raise ``_FileTimeout`` in the block if it runs for longer than ``seconds``.
+
+    This uses SIGALRM, so the limit only applies in the main thread on platforms
+    which have it. Native code (e.g. the parser) is only interrupted once it
+    returns to python.
+    """
+    if (
+        seconds is None
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def _on_alarm(signum: int, frame: t.Any) -> None:
+        raise _FileTimeout()
+
+    previous_handler = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _error_result(filename: str, e: BaseException) -> Result:
+    return Result(
+        success=False,
+        messages=[
+            Message(f"slyp error on '{filename}': {e}"),
+            Message(
+                f"slyp error on '{filename}': {e.__traceback__}",
+                verbosity=2,
+            ),
+        ],
+    )
+
+
+def _print_messages(result: Result, verbosity: int) -> None:
+    for message in result.messages:
+        if message.verbosity <= verbosity:
+            print(message.message)
 
 
 def process_file(
@@ -130,31 +1233,66 @@ def process_file(
     disabled_codes: set[str],
     enabled_codes: set[str],
     passing_cache: PassingFileCache | None,
+    check_plan: CheckPlan | None = None,
+    max_fix_passes: int = 1,
+    line_ranges: LineRanges | None = None,
+    known: _Known = None,
 ) -> Result:
     result = Result(success=True, messages=[])
-    file_obj = HashableFile(filename)
+    file_obj = _file_object(filename, known)
 
     if passing_cache:
         if file_obj in passing_cache:
             result.messages.append(
                 Message(message=f"cache hit: {filename}", verbosity=2)
             )
+            result.from_cache = True
             return result
 
     if only in ("fix", None):
-        result = result.join(fix_file(file_obj))
+        original_content = file_obj.binary_content
+        result = result.join(
+            fix_file(file_obj, max_passes=max_fix_passes, line_ranges=line_ranges)
+        )
+        # fixes may move lines, so the ranges to lint need to move with them
+        if line_ranges is not None and file_obj.binary_content != original_content:
+            line_ranges = remap_line_ranges(
+                line_ranges, original_content, file_obj.binary_content
+            )
     if only in ("lint", None):
         result = result.join(
             check_file(
-                file_obj, disabled_codes=disabled_codes, enabled_codes=enabled_codes
+                file_obj,
+                disabled_codes=disabled_codes,
+                enabled_codes=enabled_codes,
+                plan=check_plan,
+                line_ranges=line_ranges,
             )
         )
 
-    if passing_cache and result.success and only is None:
+    # a pass over only some lines does not show that the whole file passes
+    if passing_cache and result.success and only is None and line_ranges is None:
         passing_cache.add(file_obj)
     return result
 
 
+def _file_object(filename: str, known: _Known) -> HashableFile:
+    if known is None:
+        return HashableFile(filename)
+    elif isinstance(known, HashableFile):
+        return known
+    elif isinstance(known, str):
+        return HashableFile(filename, _blob_id=known)
+    content, sha, fingerprint = known
+    return HashableFile(
+        filename, _sha=sha, _binary_content=content, _fingerprint=fingerprint
+    )
+
+
+def _max_fix_passes(args: argparse.Namespace) -> int:
+    return args.max_fix_passes if args.fixpoint else 1
+
+
 def compute_config_id(enabled_codes: set[str], disabled_codes: set[str]) -> str:
     # now we get the codes which are defined, convert to a string
     all_codes: str = json.dumps(sorted(CODE_MAP.keys()))
@@ -174,21 +1312,146 @@ def compute_config_id(enabled_codes: set[str], disabled_codes: set[str]) -> str:
     return config_hash.hexdigest()
 
 
-def all_py_filenames(files: t.Sequence[str], use_git_ls: bool) -> t.Iterable[str]:
-    if files:
+def all_py_filenames(
+    files: t.Sequence[str],
+    use_git_ls: bool,
+    changed_ranges: dict[str, LineRanges] | None = None,
+    *,
+    exclude: PathMatcher | None = None,
+    threads: int = 1,
+    stats: DiscoveryStats | None = None,
+    blob_ids: dict[str, str] | None = None,
+) -> t.Iterable[str]:
+    """
+    Find the files to process.
+
+    Files which were named explicitly are always processed, but files which were
+    found otherwise are skipped if ``exclude`` matches them. With more than one
+    thread, directories are listed (or files found by git are checked) ahead of
+    time, in a pool of threads.
+    If ``blob_ids`` is given, files found by git are added to it with git's ids
+    for their content, if they are unchanged from git's index.
+    """
+    stats = DiscoveryStats() if stats is None else stats
+    start = time.perf_counter()
+    if changed_ranges is not None:
+        # only files with changes need to be considered
+        # if filenames were given, they narrow the selection further
+        selected = {normalize_path(f) for f in files}
+        for file in sorted(selected.difference(changed_ranges)):
+            print(
+                f"slyp: {file} has no changed lines, so it will not be checked",
+                file=sys.stderr,
+            )
+        candidates = []
+        for file in sorted(changed_ranges):
+            if selected and file not in selected:
+                continue
+            if not selected and exclude is not None and exclude.excludes(file):
+                stats.excluded += 1
+                continue
+            candidates.append(file)
+        yield from _python_files(candidates, threads, stats, start)
+    elif files:
         yield from files
     elif use_git_ls:
-        git_ls_files_proc = subprocess.run(
-            ["git", "ls-files"], check=True, capture_output=True, text=True
-        )
-        candidates = git_ls_files_proc.stdout.split("\n")
-        for file in candidates:
-            if file == "":
+        candidates = []
+        for file in git_ls_files(blob_ids):
+            if exclude is not None and exclude.excludes(file):
+                stats.excluded += 1
                 continue
-            if is_python(file):
-                yield file
+            candidates.append(file)
+        yield from _python_files(candidates, threads, stats, start)
+    else:
+        yield from walk_py_files(exclude=exclude, threads=threads, stats=stats)
+
+
+def _python_files(
+    candidates: list[str], threads: int, stats: DiscoveryStats, start: float
+) -> t.Iterator[str]:
+    """Find the python files among files found by git, counting from ``start``."""
+    if threads > 1:
+        # 'is_python' stats (and may read) each file, which is slow on network
+        # filesystems
+        checks: t.Iterable[bool] = map_ahead(
+            is_python,
+            candidates,
+            threads * _DISCOVERY_WINDOW_PER_THREAD,
+            threads=threads,
+            thread_name_prefix="slyp-discovery",
+        )
+    else:
+        checks = map(is_python, candidates)
+    for file, python in zip(candidates, checks):
+        if python:
+            stats.files += 1
+            yield file
+    stats.elapsed = time.perf_counter() - start
+
+
+def git_ls_files(blob_ids: dict[str, str] | None = None) -> list[str]:
+    """
+    List the files tracked by git, under the current directory.
+
+    If ``blob_ids`` is given, it is filled with git's ids for the content of the
+    files which are unchanged from the index, so that they can be identified
+    without being read.
+    """
+    if blob_ids is None:
+        proc = subprocess.run(
+            ["git", "ls-files", "-z"], check=True, capture_output=True
+        )
+        return [os.fsdecode(path) for path in proc.stdout.split(b"\0") if path]
+
+    # '-v' tags files whose changes git may not notice ('assume-unchanged' files in
+    # lowercase, and 'skip-worktree' files as 'S'), as well as tracked files ('H')
+    proc = subprocess.run(
+        ["git", "ls-files", "--stage", "-v", "-z"], check=True, capture_output=True
+    )
+    # files whose content differs from the index; git checks the content of any
+    # file whose stat information does not show that it is unchanged
+    dirty_proc = subprocess.run(
+        ["git", "diff", "--name-only", "--relative", "-z"],
+        check=True,
+        capture_output=True,
+    )
+    dirty = set(dirty_proc.stdout.split(b"\0"))
+
+    filenames: list[str] = []
+    for entry in proc.stdout.split(b"\0"):
+        if not entry:
+            continue
+        info, _, path = entry.partition(b"\t")
+        filename = os.fsdecode(path)
+        # conflicted files appear once per stage
+        if filenames and filenames[-1] == filename:
+            continue
+        filenames.append(filename)
+        tag, mode, blob_id, stage = info.split(b" ")
+        if (
+            tag == b"H"
+            and mode in (b"100644", b"100755")
+            and stage == b"0"
+            and path not in dirty
+        ):
+            blob_ids[filename] = blob_id.decode()
+    return filenames
+
+
+def exclude_matcher(args: argparse.Namespace) -> PathMatcher:
+    """
+    Get the patterns for paths to skip, from '--exclude' and '--extend-exclude'.
+
+    The default patterns only apply when directories are walked. Files found by git
+    are tracked source, which is only skipped if a pattern was given explicitly.
+    """
+    if args.exclude is not None:
+        patterns: t.Sequence[str] = args.exclude
+    elif args.use_git_ls or args.staged or args.diff_base is not None:
+        patterns = ()
     else:
-        yield from glob.glob("**/*.py", recursive=True)
+        patterns = DEFAULT_EXCLUDES
+    return PathMatcher([*patterns, *(args.extend_exclude or ())])
 
 
 def is_python(filename: str) -> bool:
@@ -1,16 +1,24 @@
 from __future__ import annotations
 
+import collections
+import contextlib
+import hashlib
+import json
 import os
 import shutil
+import tempfile
+import typing as t
 
-from slyp.hashable_file import HashableFile
+from slyp.hashable_file import HashableFile, InMemoryFile
+from slyp.result import Result
 
 _CACHEDIR = ".slyp_cache"
 
 
-def _ensure_cachedir(base_cache_dir: str, subdir: str) -> None:
+def _ensure_cachedir(base_cache_dir: str, subdir: str | None = None) -> None:
     os.makedirs(base_cache_dir, exist_ok=True)
-    os.makedirs(subdir, exist_ok=True)
+    if subdir is not None:
+        os.makedirs(subdir, exist_ok=True)
     gitignore_path = os.path.join(base_cache_dir, ".gitignore")
     if not os.path.exists(gitignore_path):
         with open(gitignore_path, "wb") as fp:
@@ -18,6 +26,15 @@ def _ensure_cachedir(base_cache_dir: str, subdir: str) -> None:
 
 
 class PassingFileCache:
+    """
+    A record of the content (by cache key) which passed under each config.
+
+    Passing files are also recorded by their stat fingerprint (as it was when
+    their content was read), so that a file whose stat still matches is found
+    without being read or hashed: checking an unchanged file costs a stat, and
+    opening its record.
+    """
+
     def __init__(
         self,
         *,
@@ -29,25 +46,67 @@ class PassingFileCache:
         self._cache_dir = os.path.join(
             base_cache_dir, f"{cache_dir}_{contract_version}"
         )
+        self._stat_dir = os.path.join(self._cache_dir, "stat")
         self._config_id = config_id
         _ensure_cachedir(base_cache_dir, self._cache_dir)
+        os.makedirs(self._stat_dir, exist_ok=True)
 
     def clear(self) -> None:
         shutil.rmtree(self._cache_dir, ignore_errors=True)
 
     def _find(self, item: HashableFile) -> str:
-        return os.path.join(self._cache_dir, item.sha)
+        return os.path.join(self._cache_dir, item.cache_key)
+
+    def _find_by_stat(self, filename: str, stat_key: tuple[int, ...]) -> str:
+        key = "\0".join((os.path.normpath(filename), *map(str, stat_key)))
+        return os.path.join(
+            self._stat_dir, hashlib.sha256(os.fsencode(key)).hexdigest()
+        )
 
     def __contains__(self, item: HashableFile) -> bool:
-        cache_file = self._find(item)
-        if not os.path.exists(cache_file):
+        # a file whose content is already at hand (or which isn't on disk, or has a
+        # key from git) has nothing to gain from its stat
+        if not (
+            item.is_stdio
+            or isinstance(item, InMemoryFile)
+            or item._binary_content is not None
+            or item._blob_id is not None
+        ):
+            try:
+                st = os.stat(item.filename)
+            except OSError:
+                pass
+            else:
+                stat_key = (st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
+                if self._is_recorded(self._find_by_stat(item.filename, stat_key)):
+                    return True
+
+        if not self._is_recorded(self._find(item)):
             return False
-        with open(cache_file) as fp:
-            data = fp.read()
-        return self._config_id in data
+        # the file was read, so next time its stat may be enough
+        self._record_stat(item)
+        return True
 
     def add(self, item: HashableFile) -> None:
-        cache_file = self._find(item)
+        self._record(self._find(item))
+        self._record_stat(item)
+
+    def _record_stat(self, item: HashableFile) -> None:
+        fingerprint = item._fingerprint
+        # a fingerprint taken too soon after a change may not show a later change,
+        # so the file's content will need to be checked
+        if fingerprint is not None and not fingerprint.is_racy:
+            self._record(self._find_by_stat(item.filename, fingerprint.stat_key))
+
+    def _is_recorded(self, cache_file: str) -> bool:
+        try:
+            with open(cache_file) as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            return False
+        return self._config_id in data
+
+    def _record(self, cache_file: str) -> None:
         if not os.path.exists(cache_file):
             data = self._config_id + "\n"
         else:
@@ -59,5 +118,129 @@ class PassingFileCache:
             else:
                 data += f"\n{self._config_id}\n"
 
-        with open(cache_file, "w") as fp:
-            fp.write(data)
+        # write and rename, so that an interrupted write never loses the records
+        # already made
+        # the temporary file is unique, as threads may record the same file at once
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+        try:
+            with open(fd, "w") as fp:
+                fp.write(data)
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+
+class TimingCache:
+    """
+    A record of how long each file took to process, by filename.
+
+    This is used to start the most expensive files first. Timings are loaded when
+    the cache is created, and only written by ``save``, which drops the timings of
+    files which were not seen in this run and no longer exist (e.g. because they
+    were renamed or deleted).
+    """
+
+    def __init__(
+        self,
+        *,
+        contract_version: str,
+        base_cache_dir: str = _CACHEDIR,
+        filename: str = "timings",
+    ) -> None:
+        self._base_cache_dir = base_cache_dir
+        self._path = os.path.join(base_cache_dir, f"{filename}_{contract_version}.json")
+        self._timings: dict[str, float] = {}
+        # files looked up or recorded in this run, which are known to exist
+        self._seen: set[str] = set()
+        self._dirty = False
+        try:
+            with open(self._path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            # a missing or corrupt record is the same as having no history
+            return
+        if isinstance(data, dict):
+            self._timings = {
+                k: v for k, v in data.items() if isinstance(v, (int, float))
+            }
+
+    def get(self, filename: str) -> float | None:
+        filename = os.path.normpath(filename)
+        self._seen.add(filename)
+        return self._timings.get(filename)
+
+    def record(self, filename: str, seconds: float) -> None:
+        filename = os.path.normpath(filename)
+        self._seen.add(filename)
+        self._timings[filename] = seconds
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        # files which were not part of this run (e.g. when only some files were
+        # named) are kept, unless they are gone
+        self._timings = {
+            filename: seconds
+            for filename, seconds in self._timings.items()
+            if filename in self._seen or os.path.exists(filename)
+        }
+        _ensure_cachedir(self._base_cache_dir)
+        # write and rename, so that a concurrent run never reads a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self._base_cache_dir, suffix=".tmp")
+        try:
+            with open(fd, "w") as fp:
+                json.dump(self._timings, fp, separators=(",", ":"))
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        self._dirty = False
+
+
+class ResultCache:
+    """
+    An in-memory cache of results, for use by long-lived processes.
+
+    Results are keyed on the name and content of a file, and on the options it was
+    processed with. Only results for runs which left the file unchanged are kept,
+    as a run which fixes a file has an effect beyond its result.
+    """
+
+    def __init__(self, *, max_size: int = 100_000) -> None:
+        self._max_size = max_size
+        self._results: collections.OrderedDict[t.Hashable, Result] = (
+            collections.OrderedDict()
+        )
+
+    @staticmethod
+    def make_key(file_obj: HashableFile, *options: t.Hashable) -> t.Hashable:
+        return (file_obj.filename, file_obj.cache_key, options)
+
+    def get(self, key: t.Hashable) -> Result | None:
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+        return result
+
+    def add(self, key: t.Hashable, file_obj: HashableFile, result: Result) -> None:
+        """
+        Store a result for a file, as processed under a key from ``make_key``.
+
+        :param file_obj: the file as it was before it was processed
+        """
+        try:
+            current = HashableFile(file_obj.filename, _blob_id=file_obj._blob_id)
+            # reading the file checks that it still matches git's id (if known)
+            current.binary_content
+            if current.cache_key != file_obj.cache_key:
+                return
+        except OSError:
+            return
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self._max_size:
+            self._results.popitem(last=False)
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import re
 
 import libcst
 
+from slyp.diff_ranges import LineRanges, remap_line_ranges
 from slyp.hashable_file import HashableFile
+from slyp.prescreen import may_apply, scan
 from slyp.result import Message, Result
 
 from .transformer import SlypTransformer
@@ -13,10 +16,30 @@ _DISALBE_RE = re.compile(rb"#\s*((slyp:\s*disable(\=format)?)|(fmt:\s*off))(\s|$
 _ENABLE_RE = re.compile(rb"#\s*((slyp:\s*enable(\=format)?)|(fmt:\s*on))(\s|$)")
 
 
-def fix_file(file_obj: HashableFile) -> Result:
-    """returns True if no changes were needed"""
+def fix_file(
+    file_obj: HashableFile,
+    *,
+    max_passes: int = 1,
+    line_ranges: LineRanges | None = None,
+) -> Result:
+    """
+    returns True if no changes were needed
+
+    With ``max_passes > 1``, fixing is repeated in memory until the output is stable
+    (a fixpoint), or until ``max_passes`` transformations have been done. Reaching
+    the limit is only reported as not converging if a further pass would still
+    change the output.
+    If ``line_ranges`` is given, only nodes starting on those lines are changed.
+    """
     try:
-        new_data = _fix_data(file_obj.binary_content)
+        # when no rule could possibly apply, skip parsing entirely
+        if may_apply(file_obj, SlypTransformer.PRESCREEN_HINTS):
+            new_tree: libcst.Module | None
+            new_tree, passes, converged = _fix_tree(file_obj, max_passes, line_ranges)
+            new_data = new_tree.code.encode(new_tree.encoding)
+        else:
+            new_tree, new_data = None, file_obj.binary_content
+            passes, converged = 0, True
     # ignore failures to parse and treat these as "unchanged"
     # linting will flag these independently
     except (RecursionError, libcst.ParserSyntaxError, libcst.CSTValidationError):
@@ -35,18 +58,96 @@ def fix_file(file_obj: HashableFile) -> Result:
             success=True,
         )
 
-    file_obj.write(new_data)
-    return Result(messages=[Message(f"slyp: fixed {file_obj.filename}")], success=False)
-
-
-def _fix_data(content: bytes) -> bytes:
-    disabled_line_ranges = _find_disabled_ranges(content)
-    raw_tree = libcst.parse_module(content)
-    wrapped_tree = libcst.MetadataWrapper(raw_tree)
+    file_obj.write(new_data, cst=new_tree)
+    messages = [Message(f"slyp: fixed {file_obj.filename}")]
+    if max_passes > 1:
+        passes_str = "1 pass" if passes == 1 else f"{passes} passes"
+        if converged:
+            messages.append(
+                Message(
+                    f"slyp: fixing {file_obj.filename} converged after {passes_str}",
+                    verbosity=1,
+                )
+            )
+        else:
+            messages.append(
+                Message(
+                    f"slyp: fixing {file_obj.filename} did not converge "
+                    f"within {passes_str}"
+                )
+            )
+    return Result(messages=messages, success=False)
+
+
+def _fix_tree(
+    file_obj: HashableFile, max_passes: int, line_ranges: LineRanges | None
+) -> tuple[libcst.Module, int, bool]:
+    """
+    Transform the tree for a file, repeating up to ``max_passes`` times.
+
+    Returns the final tree, the number of passes made, and whether or not the
+    output converged. Convergence is detected by hashing the output of each pass,
+    which also catches any cycle between outputs.
+    """
+    content = file_obj.binary_content
+    # the first pass uses the shared parse, which is left intact for use by the CST
+    # checkers if no changes are made
+    wrapper = file_obj.cst
+    digest = hashlib.sha256(content).digest()
+    seen_digests = {digest}
+
+    passes = 0
+    while True:
+        tree = wrapper.visit(
+            SlypTransformer(_find_disabled_ranges(content), line_ranges)
+        )
+        passes += 1
+        prev_content, content = content, tree.code.encode(tree.encoding)
+
+        prev_digest, digest = digest, hashlib.sha256(content).digest()
+        if digest == prev_digest:
+            return tree, passes, True
+        # a repeat of some earlier output is a cycle, which will never converge
+        if digest in seen_digests:
+            return tree, passes, False
+        if passes >= max_passes:
+            # the last pass allowed may itself have reached a fixpoint, which only
+            # a further pass can show (a single pass is never reported on)
+            converged = max_passes > 1 and _is_fixpoint(
+                content, prev_content, line_ranges
+            )
+            return tree, passes, converged
+        # a rewrite may produce text which no rule can apply to, which is stable
+        # without needing another parse
+        if not (scan(content) & SlypTransformer.PRESCREEN_HINTS):
+            return tree, passes, True
+        seen_digests.add(digest)
+
+        # keep the enabled lines in step with any lines moved by this pass
+        if line_ranges is not None:
+            line_ranges = remap_line_ranges(line_ranges, prev_content, content)
+
+        wrapper = libcst.MetadataWrapper(
+            libcst.parse_module(content), unsafe_skip_copy=True
+        )
 
-    tree = wrapped_tree.visit(SlypTransformer(disabled_line_ranges))
 
-    return tree.code.encode(tree.encoding)
+def _is_fixpoint(
+    content: bytes, prev_content: bytes, line_ranges: LineRanges | None
+) -> bool:
+    """
+    Check whether a further pass over the output of a pass would leave it
+    unchanged. The output of the check is discarded.
+    """
+    if not (scan(content) & SlypTransformer.PRESCREEN_HINTS):
+        return True
+    if line_ranges is not None:
+        line_ranges = remap_line_ranges(line_ranges, prev_content, content)
+    wrapper = libcst.MetadataWrapper(
+        libcst.parse_module(content), unsafe_skip_copy=True
+    )
+    tree = wrapper.visit(SlypTransformer(_find_disabled_ranges(content), line_ranges))
+    return tree.code.encode(tree.encoding) == content
 
 
 def _find_disabled_ranges(content: bytes) -> list[tuple[int, int | float]]:
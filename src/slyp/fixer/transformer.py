@@ -5,6 +5,8 @@ import typing as t
 import libcst
 import libcst.matchers
 
+from slyp import prescreen
+
 # an __init__ definition missing the return type annotation
 MISSING_RETURN_ANNOTATION_INIT_MATCHER = libcst.matchers.FunctionDef(
     name=libcst.matchers.Name(value="__init__"), returns=None
@@ -118,9 +120,27 @@ class SlypTransformer(libcst.CSTTransformer):
         libcst.metadata.PositionProvider,
         libcst.metadata.ParentNodeProvider,
     )
+    # every rule applied by the transformer needs at least one of these hints
+    PRESCREEN_HINTS = frozenset(
+        {
+            prescreen.PARENS,
+            prescreen.STRING_CONCAT,
+            prescreen.COLLECTION_CALL,
+            prescreen.KEYWORD_SPACING,
+            prescreen.NONE_CHECK,
+            prescreen.INIT_DEFINITION,
+            prescreen.DICT_COLON_SPACING,
+        }
+    )
 
-    def __init__(self, disabled_line_ranges: list[tuple[int, int | float]]) -> None:
+    def __init__(
+        self,
+        disabled_line_ranges: list[tuple[int, int | float]],
+        enabled_line_ranges: list[tuple[int, int]] | None = None,
+    ) -> None:
         self.disabled_line_ranges = disabled_line_ranges
+        # if set, only nodes starting on these lines may be changed
+        self.enabled_line_ranges = enabled_line_ranges
 
     def on_leave(
         self, original_node: libcst.CSTNodeT, updated_node: libcst.CSTNodeT
@@ -137,11 +157,15 @@ class SlypTransformer(libcst.CSTTransformer):
         return updated_node
 
     def _node_is_disabled(self, node: libcst.CSTNode) -> bool:
-        if not self.disabled_line_ranges:
+        if not self.disabled_line_ranges and self.enabled_line_ranges is None:
             return False
         start_line = self.get_metadata(
             libcst.metadata.PositionProvider, node
         ).start.line
+        if self.enabled_line_ranges is not None and not any(
+            start <= start_line < end for start, end in self.enabled_line_ranges
+        ):
+            return True
         for start, end in self.disabled_line_ranges:
             if start <= start_line < end:
                 return True
@@ -0,0 +1,330 @@
+"""
+Checking the content staged in git's index, for ``--staged``.
+
+The files to check are listed from the index, and their staged content is read
+through one long-lived ``git cat-file --batch`` process, rather than by running
+git (or opening a file) once per file. Requests for content are sent a window
+ahead of the content being read back, so that git is never left waiting.
+
+Fixes are made to the staged content, and are then either printed as a patch, or
+applied to the index and to the working tree.
+"""
+
+from __future__ import annotations
+
+import collections
+import dataclasses
+import difflib
+import itertools
+import os
+import subprocess
+import sys
+import typing as t
+
+from slyp.discovery import DiscoveryStats, PathMatcher, normalize_path
+from slyp.hashable_file import InMemoryFile, write_atomically
+from slyp.result import Message
+
+# the most requests to send to git ahead of reading back their content
+# each request is one line of at most 65 bytes, so this never fills a pipe
+MAX_READ_WINDOW: int = 512
+
+_REGULAR_MODES = ("100644", "100755")
+
+
+@dataclasses.dataclass(frozen=True)
+class IndexEntry:
+    """A file staged in git's index."""
+
+    # the path relative to the current directory
+    filename: str
+    # the path relative to the root of the repository, as git's index has it
+    path: str
+    mode: str
+    blob_id: str
+
+
+class BlobReader:
+    """
+    Read blobs from git's object store through a ``git cat-file --batch`` process,
+    which is started when it is first needed.
+    """
+
+    def __init__(self) -> None:
+        self._proc: subprocess.Popen[bytes] | None = None
+
+    def __enter__(self) -> BlobReader:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._proc is None:
+            return
+        t.cast(t.IO[bytes], self._proc.stdin).close()
+        t.cast(t.IO[bytes], self._proc.stdout).close()
+        # git would stop once its input is closed, but processes forked while it
+        # was running (e.g. workers) may still hold the input open
+        self._proc.terminate()
+        self._proc.wait()
+        self._proc = None
+
+    def read(self, blob_id: str) -> bytes:
+        return next(self.read_many([blob_id], 1))
+
+    def read_many(self, blob_ids: t.Iterable[str], window: int) -> t.Iterator[bytes]:
+        """
+        Read blobs in order, with requests for up to ``window`` of them sent to git
+        ahead of the one being read.
+
+        Reads must not be interleaved, so each must be finished before another is
+        started.
+        """
+        if self._proc is None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        stdin = t.cast(t.IO[bytes], self._proc.stdin)
+        stdout = t.cast(t.IO[bytes], self._proc.stdout)
+        window = max(1, min(window, MAX_READ_WINDOW))
+
+        blob_ids = iter(blob_ids)
+        pending: collections.deque[str] = collections.deque()
+
+        def _request(count: int) -> None:
+            requests = []
+            for blob_id in blob_ids:
+                pending.append(blob_id)
+                requests.append(f"{blob_id}\n".encode())
+                if len(requests) == count:
+                    break
+            if requests:
+                stdin.write(b"".join(requests))
+                stdin.flush()
+
+        _request(window)
+        while pending:
+            blob_id = pending.popleft()
+            # each blob comes back as '<id> <type> <size>', then its content and a
+            # newline, or as '<id> missing'
+            header = stdout.readline().split()
+            if len(header) != 3:
+                raise RuntimeError(f"git could not read blob {blob_id}")
+            size = int(header[2])
+            content = stdout.read(size + 1)[:size]
+            _request(1)
+            yield content
+
+
+class StagedFiles:
+    """
+    The python files staged in git's index (under the current directory), and
+    their content.
+    """
+
+    def __init__(self) -> None:
+        # the files which have been found, by filename
+        self.entries: dict[str, IndexEntry] = {}
+        self._blobs = BlobReader()
+
+    def close(self) -> None:
+        self._blobs.close()
+
+    def find(
+        self,
+        files: t.Sequence[str] = (),
+        *,
+        exclude: PathMatcher | None = None,
+        stats: DiscoveryStats | None = None,
+    ) -> t.Iterator[str]:
+        """
+        Find the python files in the index.
+
+        If filenames are given, only those files are found (and they are never
+        excluded), with a warning for any which are not in the index. Unmerged
+        files, symlinks, and submodules are skipped.
+        """
+        stats = DiscoveryStats() if stats is None else stats
+        selected = {normalize_path(filename) for filename in files}
+        unmatched = set(selected)
+        candidates = []
+        for entry in list_index():
+            if selected:
+                if entry.filename not in selected:
+                    continue
+                unmatched.discard(entry.filename)
+            elif exclude is not None and exclude.excludes(entry.filename):
+                stats.excluded += 1
+                continue
+            candidates.append(entry)
+        for filename in sorted(unmatched):
+            print(
+                f"slyp: {filename} is not in git's index, so it will not be checked",
+                file=sys.stderr,
+            )
+
+        # files which are not named '*.py' need their content checked for a shebang,
+        # which is done up front, so that reads of content are never interleaved
+        scripts = [
+            entry
+            for entry in candidates
+            if not entry.filename.endswith(".py") and entry.mode == "100755"
+        ]
+        python_scripts = {
+            entry.filename
+            for entry, content in zip(
+                scripts,
+                self._blobs.read_many(
+                    (entry.blob_id for entry in scripts), MAX_READ_WINDOW
+                ),
+            )
+            if _has_python_shebang(content)
+        }
+        for entry in candidates:
+            if entry.filename.endswith(".py") or entry.filename in python_scripts:
+                self.entries[entry.filename] = entry
+                stats.files += 1
+                yield entry.filename
+
+    def read(self, filenames: t.Iterable[str], window: int) -> t.Iterator[InMemoryFile]:
+        """
+        Read the staged content of files which have been found, in order.
+
+        Each is given with git's id for its content, which is used to find cached
+        results for it.
+        """
+        entries, read_entries = itertools.tee(
+            self.entries[filename] for filename in filenames
+        )
+        for entry, content in zip(
+            entries,
+            self._blobs.read_many((entry.blob_id for entry in read_entries), window),
+        ):
+            yield InMemoryFile(
+                entry.filename, _binary_content=content, _blob_id=entry.blob_id
+            )
+
+    def patch(self, fixes: dict[str, bytes]) -> bytes:
+        """Get a patch of fixes (by filename) to the staged content, for 'git apply'."""
+        patches = []
+        for filename, fixed in sorted(fixes.items()):
+            staged = self._blobs.read(self.entries[filename].blob_id)
+            patches.append(format_patch(self.entries[filename].path, staged, fixed))
+        return b"".join(patches)
+
+    def apply(self, fixes: dict[str, bytes]) -> list[Message]:
+        """
+        Apply fixes (by filename) to the index, and to the working tree.
+
+        A file in the working tree is only written if it has no unstaged changes,
+        which would otherwise be lost.
+        """
+        messages = []
+        index_info = []
+        for filename, fixed in sorted(fixes.items()):
+            entry = self.entries[filename]
+            staged = self._blobs.read(entry.blob_id)
+            blob_id = subprocess.run(
+                ["git", "hash-object", "-w", "--stdin"],
+                input=fixed,
+                check=True,
+                capture_output=True,
+            ).stdout.strip()
+            # git's index takes paths relative to the root of the repository
+            path = os.fsencode(entry.path)
+            index_info.append(b"%s %s\t%s\0" % (entry.mode.encode(), blob_id, path))
+
+            try:
+                with open(filename, "rb") as fp:
+                    unstaged_changes = fp.read() != staged
+            except OSError:
+                unstaged_changes = True
+            if unstaged_changes:
+                messages.append(
+                    Message(
+                        f"slyp: fixed {filename} in the index only, as it has "
+                        "unstaged changes"
+                    )
+                )
+            else:
+                write_atomically(filename, fixed)
+        if index_info:
+            subprocess.run(
+                ["git", "update-index", "-z", "--index-info"],
+                input=b"".join(index_info),
+                check=True,
+                capture_output=True,
+            )
+        return messages
+
+
+def list_index() -> list[IndexEntry]:
+    """
+    List the regular files in git's index, under the current directory.
+    """
+    prefix = subprocess.run(
+        ["git", "rev-parse", "--show-prefix"], check=True, capture_output=True
+    ).stdout.rstrip(b"\n")
+    proc = subprocess.run(
+        ["git", "ls-files", "--stage", "--full-name", "-z"],
+        check=True,
+        capture_output=True,
+    )
+    entries = []
+    for line in proc.stdout.split(b"\0"):
+        if not line:
+            continue
+        info, _, path = line.partition(b"\t")
+        mode, blob_id, stage = info.decode().split(" ")
+        # an unmerged file has no single staged version
+        if stage != "0" or mode not in _REGULAR_MODES:
+            continue
+        entries.append(
+            IndexEntry(
+                filename=os.fsdecode(path[len(prefix) :]),
+                path=os.fsdecode(path),
+                mode=mode,
+                blob_id=blob_id,
+            )
+        )
+    return entries
+
+
+def format_patch(path: str, old: bytes, new: bytes) -> bytes:
+    """
+    Get a unified diff of a change to a file, which 'git apply' accepts.
+
+    As in the output of 'git diff', the path is relative to the root of the
+    repository.
+    """
+    path_bytes = os.fsencode(path)
+    lines = [b"diff --git a/%s b/%s\n" % (path_bytes, path_bytes)]
+    for line in difflib.diff_bytes(
+        difflib.unified_diff,
+        _split_lines(old),
+        _split_lines(new),
+        fromfile=b"a/" + path_bytes,
+        tofile=b"b/" + path_bytes,
+        lineterm=b"\n",
+    ):
+        lines.append(line)
+        if not line.endswith(b"\n"):
+            lines.append(b"\n\\ No newline at end of file\n")
+    return b"".join(lines)
+
+
+def _split_lines(content: bytes) -> list[bytes]:
+    # only '\n' ends a line, as for git
+    lines = [line + b"\n" for line in content.split(b"\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _has_python_shebang(content: bytes) -> bool:
+    firstline = content.split(b"\n", 1)[0]
+    return firstline.startswith(b"#!") and b"python" in firstline
@@ -1,8 +1,60 @@
 from __future__ import annotations
 
+import ast
+import contextlib
 import dataclasses
 import hashlib
+import os
+import shutil
 import sys
+import tempfile
+import time
+
+import libcst
+
+from slyp.prescreen import scan
+
+# how recently a file may have changed (relative to when its stat was taken) for
+# a change in the same tick of a coarse filesystem clock to be possible, in ns
+# this allows for filesystems which store times to the nearest 2 seconds
+RACY_WINDOW_NS: int = 2_000_000_000
+
+
+@dataclasses.dataclass(frozen=True)
+class StatFingerprint:
+    """
+    Stat information for a file, taken as its content was read.
+
+    As in git's index, a file whose stat still matches is taken to have the same
+    content, unless it changed so soon before the stat was taken that a further
+    change might not have moved its times (it is "racily clean").
+    """
+
+    size: int
+    mtime_ns: int
+    inode: int
+    ctime_ns: int
+    # when the stat was taken, in ns since the epoch
+    taken_ns: int
+
+    @classmethod
+    def of(cls, stat_result: os.stat_result, taken_ns: int) -> StatFingerprint:
+        return cls(
+            size=stat_result.st_size,
+            mtime_ns=stat_result.st_mtime_ns,
+            inode=stat_result.st_ino,
+            ctime_ns=stat_result.st_ctime_ns,
+            taken_ns=taken_ns,
+        )
+
+    @property
+    def is_racy(self) -> bool:
+        return max(self.mtime_ns, self.ctime_ns) >= self.taken_ns - RACY_WINDOW_NS
+
+    @property
+    def stat_key(self) -> tuple[int, int, int, int]:
+        """The stat information which must be unchanged for the content to be."""
+        return (self.size, self.mtime_ns, self.inode, self.ctime_ns)
 
 
 @dataclasses.dataclass
@@ -10,6 +62,13 @@ class HashableFile:
     filename: str
     _sha: str | None = None
     _binary_content: bytes | None = None
+    _cst: libcst.MetadataWrapper | None = None
+    _ast_tree: ast.Module | None = None
+    _prescreen_hints: frozenset[str] | None = None
+    # git's object id for the content, if it is known without reading the file
+    _blob_id: str | None = None
+    # the stat of the file as its content was read from disk, if it was
+    _fingerprint: StatFingerprint | None = None
 
     @property
     def binary_content(self) -> bytes:
@@ -18,7 +77,15 @@ class HashableFile:
                 self._binary_content = sys.stdin.buffer.read()
         elif self._binary_content is None:
             with open(self.filename, "rb") as fp:
+                # the stat is taken first, so that any change while reading shows
+                taken_ns = time.time_ns()
+                self._fingerprint = StatFingerprint.of(os.fstat(fp.fileno()), taken_ns)
                 self._binary_content = fp.read()
+            # the file may have changed since git saw it
+            if self._blob_id is not None and self._blob_id != git_blob_id(
+                self._binary_content, object_format_of=self._blob_id
+            ):
+                self._blob_id = None
         return self._binary_content
 
     @property
@@ -27,17 +94,127 @@ class HashableFile:
             self._sha = hashlib.sha256(self.binary_content).hexdigest()
         return self._sha
 
-    def write(self, content: bytes) -> None:
+    @property
+    def cache_key(self) -> str:
+        """
+        A key for the content of the file: git's id for it, if that is known, and
+        otherwise its sha. With git's id, the file does not need to be read.
+        """
+        if self._blob_id is not None:
+            return f"git-{self._blob_id}"
+        return self.sha
+
+    @property
+    def cst(self) -> libcst.MetadataWrapper:
+        """
+        The libcst parse of the current content, wrapped for metadata resolution.
+
+        The parse is done at most once per version of the content, so that the fixer
+        and the CST checkers share a tree (and any metadata already resolved on it).
+        """
+        if self._cst is None:
+            # the module is freshly parsed and owned by this object, so the (costly)
+            # defensive deepcopy done by MetadataWrapper can be skipped
+            self._cst = libcst.MetadataWrapper(
+                libcst.parse_module(self.binary_content), unsafe_skip_copy=True
+            )
+        return self._cst
+
+    @property
+    def ast_tree(self) -> ast.Module:
+        if self._ast_tree is None:
+            self._ast_tree = ast.parse(self.binary_content, filename=self.filename)
+        return self._ast_tree
+
+    @property
+    def prescreen_hints(self) -> frozenset[str]:
+        if self._prescreen_hints is None:
+            self._prescreen_hints = scan(self.binary_content)
+        return self._prescreen_hints
+
+    def write(self, content: bytes, *, cst: libcst.Module | None = None) -> None:
+        """
+        Write new content for the file.
+
+        If the caller already holds a module which renders to ``content``, it may be
+        passed as ``cst`` to be reused instead of parsing the new content again.
+        """
         if self.is_stdio:
             sys.stdout.buffer.write(content)
             return
 
-        with open(self.filename, "wb") as fp:
-            fp.write(content)
+        write_atomically(self.filename, content)
+        self._set_content(content, cst)
 
+    def _set_content(self, content: bytes, cst: libcst.Module | None) -> None:
         self._sha = None
+        self._blob_id = None
+        self._fingerprint = None
         self._binary_content = content
+        self._ast_tree = None
+        self._prescreen_hints = None
+        self._cst = (
+            None if cst is None else libcst.MetadataWrapper(cst, unsafe_skip_copy=True)
+        )
 
     @property
     def is_stdio(self) -> bool:
         return self.filename == "-"
+
+
+@dataclasses.dataclass
+class InMemoryFile(HashableFile):
+    """
+    A file whose content is held in memory, e.g. a document open in an editor.
+
+    Writes replace the content in memory, and never touch the filesystem.
+    """
+
+    @classmethod
+    def from_content(cls, filename: str, content: bytes) -> InMemoryFile:
+        return cls(filename, _binary_content=content)
+
+    def write(self, content: bytes, *, cst: libcst.Module | None = None) -> None:
+        self._set_content(content, cst)
+
+
+def git_blob_id(content: bytes, *, object_format_of: str | None = None) -> str:
+    """
+    Get git's object id for a blob with the given content.
+
+    The id is a sha1, unless ``object_format_of`` is another id which is a sha256
+    (as in repositories which use sha256 object names).
+    """
+    hasher = (
+        hashlib.sha256()
+        if object_format_of is not None and len(object_format_of) == 64
+        else hashlib.sha1()
+    )
+    hasher.update(b"blob %d\0" % len(content))
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+def write_atomically(filename: str, content: bytes) -> None:
+    """
+    Replace the content of a file, keeping its mode.
+
+    The content is written to a temporary file which is renamed over the original,
+    so that the file is never left partly written, even if processing is
+    interrupted (e.g. by a timeout) during the write.
+    """
+    path = os.path.realpath(filename)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path),
+        prefix=f"{os.path.basename(path)}.",
+        suffix=".slyp-tmp",
+    )
+    try:
+        with open(fd, "wb") as fp:
+            fp.write(content)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,357 @@
+"""
+A language server for slyp, speaking the Language Server Protocol over stdio.
+
+Diagnostics are published from the linter, and the fixer is offered as document
+formatting. Each open document keeps its ``InMemoryFile``, so parses are shared
+between linting and formatting, and unchanged content is never checked twice.
+Checks after edits are debounced, so that a burst of keystrokes is checked once.
+
+Only full-document sync is supported.
+"""
+
+from __future__ import annotations
+
+import copy
+import dataclasses
+import json
+import queue
+import sys
+import threading
+import time
+import traceback
+import typing as t
+import urllib.parse
+
+from slyp.checkers import find_errors, make_check_plan
+from slyp.codes import CODE_MAP
+from slyp.fixer import fix_file
+from slyp.hashable_file import InMemoryFile
+
+# seconds to wait after an edit for further edits, before checking a document
+DEFAULT_DEBOUNCE_DELAY: float = 0.3
+# the number of recent versions of each document to keep diagnostics for, so that
+# undoing an edit does not need another check
+_DIAGNOSTICS_CACHE_SIZE = 16
+
+# constants defined by the LSP specification
+_TEXT_DOCUMENT_SYNC_FULL = 1
+_SEVERITY_ERROR = 1
+_SEVERITY_WARNING = 2
+_METHOD_NOT_FOUND = -32601
+_INTERNAL_ERROR = -32603
+
+
+@dataclasses.dataclass
+class _Document:
+    uri: str
+    file_obj: InMemoryFile
+    # diagnostics for recent content, by sha
+    diagnostics: dict[str, list[dict[str, t.Any]]] = dataclasses.field(
+        default_factory=dict
+    )
+    # the most recent formatting output, which is often the next content, and the
+    # sha of the content which was formatted
+    formatted: InMemoryFile | None = None
+    formatted_sha: str | None = None
+    # when to check the document next, as a 'time.monotonic' value
+    check_at: float | None = None
+
+
+class LanguageServer:
+    """
+    An LSP server, reading messages from ``reader`` and writing to ``writer``.
+
+    :param reader: a binary stream of messages from the client
+    :param writer: a binary stream for messages to the client
+    """
+
+    def __init__(
+        self,
+        reader: t.BinaryIO,
+        writer: t.BinaryIO,
+        *,
+        disabled_codes: set[str],
+        enabled_codes: set[str],
+        debounce_delay: float = DEFAULT_DEBOUNCE_DELAY,
+    ) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._disabled_codes = disabled_codes
+        self._enabled_codes = enabled_codes
+        self._check_plan = make_check_plan(disabled_codes, enabled_codes)
+        self._debounce_delay = debounce_delay
+
+        self._documents: dict[str, _Document] = {}
+        self._shutdown_requested = False
+
+    def serve(self) -> int:
+        """Handle messages until the client exits, and return the exit code."""
+        incoming: queue.Queue[dict[str, t.Any] | None] = queue.Queue()
+        threading.Thread(
+            target=self._read_messages, args=(incoming,), daemon=True
+        ).start()
+
+        while True:
+            try:
+                message = incoming.get(timeout=self._time_to_next_check())
+            except queue.Empty:
+                self._run_due_checks()
+                continue
+            # the client went away without 'exit'
+            if message is None:
+                return 1
+            if message.get("method") == "exit":
+                return 0 if self._shutdown_requested else 1
+            try:
+                self._dispatch(message)
+            except Exception as e:
+                self._report_failure(message, e)
+            self._run_due_checks()
+
+    def _report_failure(self, message: dict[str, t.Any], exc: Exception) -> None:
+        # stdout carries the protocol, so failures are logged to stderr, and the
+        # server carries on with the next message
+        method = message.get("method")
+        print(f"slyp: failed to handle {method}", file=sys.stderr)
+        traceback.print_exc()
+        if "id" in message:
+            self._send(
+                {
+                    "id": message["id"],
+                    "error": {
+                        "code": _INTERNAL_ERROR,
+                        "message": f"slyp failed to handle {method}: {exc!r}",
+                    },
+                }
+            )
+
+    def _dispatch(self, message: dict[str, t.Any]) -> None:
+        method = message.get("method")
+        params = message.get("params") or {}
+        is_request = "id" in message
+
+        if method is None:
+            # a response to a request from the server, which are never sent
+            return
+        elif method == "initialize":
+            result: t.Any = {
+                "capabilities": {
+                    "textDocumentSync": {
+                        "openClose": True,
+                        "change": _TEXT_DOCUMENT_SYNC_FULL,
+                        "save": True,
+                    },
+                    "documentFormattingProvider": True,
+                },
+                "serverInfo": {"name": "slyp"},
+            }
+        elif method == "shutdown":
+            self._shutdown_requested = True
+            result = None
+        elif method == "textDocument/formatting":
+            result = self._format(params["textDocument"]["uri"])
+        elif method == "textDocument/didOpen":
+            doc = params["textDocument"]
+            self._documents[doc["uri"]] = _Document(
+                uri=doc["uri"],
+                file_obj=InMemoryFile.from_content(
+                    _uri_to_filename(doc["uri"]), doc["text"].encode()
+                ),
+            )
+            self._schedule_check(doc["uri"], delay=0)
+            return
+        elif method == "textDocument/didChange":
+            # with full sync, the last change holds the whole document
+            self._update(
+                params["textDocument"]["uri"], params["contentChanges"][-1]["text"]
+            )
+            return
+        elif method == "textDocument/didSave":
+            self._schedule_check(params["textDocument"]["uri"], delay=0)
+            return
+        elif method == "textDocument/didClose":
+            uri = params["textDocument"]["uri"]
+            self._documents.pop(uri, None)
+            self._publish(uri, [])
+            return
+        elif not is_request:
+            # other notifications, e.g. 'initialized', need no handling
+            return
+        else:
+            self._send(
+                {
+                    "id": message["id"],
+                    "error": {
+                        "code": _METHOD_NOT_FOUND,
+                        "message": f"unsupported method: {method}",
+                    },
+                }
+            )
+            return
+
+        if is_request:
+            self._send({"id": message["id"], "result": result})
+
+    def _update(self, uri: str, text: str) -> None:
+        document = self._documents.get(uri)
+        if document is None:
+            return
+        content = text.encode()
+        if content == document.file_obj.binary_content:
+            return
+        # applying formatting edits is the most common change which is known in
+        # advance, and that content has already been parsed
+        if (
+            document.formatted is not None
+            and document.formatted.binary_content == content
+        ):
+            document.file_obj = document.formatted
+        else:
+            document.file_obj = InMemoryFile.from_content(
+                document.file_obj.filename, content
+            )
+        document.formatted = document.formatted_sha = None
+        self._schedule_check(uri, delay=self._debounce_delay)
+
+    def _format(self, uri: str) -> list[dict[str, t.Any]]:
+        document = self._documents.get(uri)
+        if document is None:
+            return []
+
+        if (
+            document.formatted is None
+            or document.formatted_sha != document.file_obj.sha
+        ):
+            # fixing rewrites the file it is given, so give it a copy which
+            # shares the parse of the current content
+            formatted = copy.copy(document.file_obj)
+            fix_file(formatted)
+            document.formatted = formatted
+            document.formatted_sha = document.file_obj.sha
+
+        old_content = document.file_obj.binary_content
+        new_content = document.formatted.binary_content
+        if new_content == old_content:
+            return []
+        return [
+            {
+                "range": {
+                    "start": {"line": 0, "character": 0},
+                    "end": {"line": len(old_content.splitlines()) + 1, "character": 0},
+                },
+                "newText": new_content.decode(),
+            }
+        ]
+
+    def _schedule_check(self, uri: str, *, delay: float) -> None:
+        document = self._documents.get(uri)
+        if document is not None:
+            document.check_at = time.monotonic() + delay
+
+    def _time_to_next_check(self) -> float | None:
+        deadlines = [
+            doc.check_at for doc in self._documents.values() if doc.check_at is not None
+        ]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _run_due_checks(self) -> None:
+        now = time.monotonic()
+        for document in list(self._documents.values()):
+            if document.check_at is not None and document.check_at <= now:
+                document.check_at = None
+                try:
+                    self._check(document)
+                except Exception:
+                    print(f"slyp: failed to check {document.uri}", file=sys.stderr)
+                    traceback.print_exc()
+
+    def _check(self, document: _Document) -> None:
+        file_obj = document.file_obj
+        diagnostics = document.diagnostics.get(file_obj.sha)
+        if diagnostics is None:
+            errors = find_errors(
+                file_obj,
+                disabled_codes=self._disabled_codes,
+                enabled_codes=self._enabled_codes,
+                plan=self._check_plan,
+            )
+            diagnostics = [_diagnostic(lineno, code) for lineno, code in errors]
+            document.diagnostics[file_obj.sha] = diagnostics
+            if len(document.diagnostics) > _DIAGNOSTICS_CACHE_SIZE:
+                del document.diagnostics[next(iter(document.diagnostics))]
+        self._publish(document.uri, diagnostics)
+
+    def _publish(self, uri: str, diagnostics: list[dict[str, t.Any]]) -> None:
+        self._send(
+            {
+                "method": "textDocument/publishDiagnostics",
+                "params": {"uri": uri, "diagnostics": diagnostics},
+            }
+        )
+
+    def _read_messages(self, incoming: queue.Queue[dict[str, t.Any] | None]) -> None:
+        try:
+            while True:
+                message = read_message(self._reader)
+                if message is None:
+                    break
+                incoming.put(message)
+        finally:
+            incoming.put(None)
+
+    def _send(self, message: dict[str, t.Any]) -> None:
+        write_message(self._writer, message)
+
+
+def read_message(reader: t.BinaryIO) -> dict[str, t.Any] | None:
+    """
+    Read one message from a stream, in the LSP's base protocol.
+
+    Returns None at the end of the stream.
+    """
+    content_length = None
+    while True:
+        line = reader.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            content_length = int(value)
+    if content_length is None:
+        return None
+    message: dict[str, t.Any] = json.loads(reader.read(content_length))
+    return message
+
+
+def write_message(writer: t.BinaryIO, message: dict[str, t.Any]) -> None:
+    """Write one message to a stream, in the LSP's base protocol."""
+    body = json.dumps({"jsonrpc": "2.0", **message}).encode()
+    writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    writer.flush()
+
+
+def _diagnostic(lineno: int, code: str) -> dict[str, t.Any]:
+    # errors with no position (line 0) are shown on the first line
+    line = max(lineno - 1, 0)
+    return {
+        "range": {
+            "start": {"line": line, "character": 0},
+            "end": {"line": line + 1, "character": 0},
+        },
+        "severity": _SEVERITY_WARNING if code.startswith("W") else _SEVERITY_ERROR,
+        "code": code,
+        "source": "slyp",
+        "message": CODE_MAP[code].message,
+    }
+
+
+def _uri_to_filename(uri: str) -> str:
+    parsed = urllib.parse.urlparse(uri)
+    if parsed.scheme == "file":
+        return urllib.parse.unquote(parsed.path)
+    return uri
@@ -0,0 +1,85 @@
+"""
+Writing results to stdout.
+
+Messages are written in batches, rather than with a write per message. Results
+which complete out of order can be put back in order before they are written.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import typing as t
+
+from slyp.result import Result
+
+T = t.TypeVar("T")
+
+# the most output to hold before writing it, in characters
+MAX_BUFFERED_OUTPUT: int = 64 * 1024
+# the longest to hold output before writing it, in seconds
+MAX_OUTPUT_DELAY: float = 0.1
+
+
+class ReorderBuffer(t.Generic[T]):
+    """
+    Put items which arrive out of order back in order, by their index (from 0).
+
+    Each item is released as soon as every item before it has arrived, so only
+    items which arrived early are held.
+    """
+
+    def __init__(self) -> None:
+        self._next_index = 0
+        self._held: dict[int, T] = {}
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def add(self, index: int, item: T) -> list[T]:
+        """Add the item at ``index``, and get the items it releases, in order."""
+        self._held[index] = item
+        released = []
+        while self._next_index in self._held:
+            released.append(self._held.pop(self._next_index))
+            self._next_index += 1
+        return released
+
+
+class OutputWriter:
+    """
+    Write the messages of results to a stream (stdout by default), in batches.
+
+    Output is held until there is enough of it, or until it has been held for long
+    enough. Callers should ``flush`` before waiting on more results, so that output
+    is not held while nothing else is happening.
+    """
+
+    def __init__(self, verbosity: int, stream: t.TextIO | None = None) -> None:
+        self._verbosity = verbosity
+        self._stream = sys.stdout if stream is None else stream
+        self._pending: list[str] = []
+        self._pending_size = 0
+        self._held_since = 0.0
+
+    def write(self, result: Result) -> None:
+        for message in result.messages:
+            if message.verbosity <= self._verbosity:
+                if not self._pending:
+                    self._held_since = time.monotonic()
+                line = message.message + "\n"
+                self._pending.append(line)
+                self._pending_size += len(line)
+        if self._pending and (
+            self._pending_size >= MAX_BUFFERED_OUTPUT
+            or time.monotonic() - self._held_since >= MAX_OUTPUT_DELAY
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        self._stream.write("".join(self._pending))
+        self._stream.flush()
+        self._pending.clear()
+        self._pending_size = 0
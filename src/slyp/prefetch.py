@@ -0,0 +1,88 @@
+"""
+Reading files ahead of processing, for ``--read-ahead``.
+
+Files are read and hashed by a small pool of threads, so that waiting on the
+filesystem (which is slow on network filesystems) overlaps with processing of
+other files. Reading happens in order, at most a fixed window ahead of the
+consumer, so the content held in memory is bounded.
+
+The same approach (with ``map_ahead``) is used to check files found by git, when
+discovery uses several threads.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import os
+import time
+import typing as t
+
+from slyp.hashable_file import StatFingerprint
+
+# the most threads to read with, however large the window
+MAX_READER_THREADS: int = 8
+
+# the content of a file, its sha256 hexdigest, and its stat as it was read
+Prefetched = tuple[bytes, str, StatFingerprint]
+
+T = t.TypeVar("T")
+R = t.TypeVar("R")
+
+
+def prefetch(filenames: t.Iterable[str], window: int) -> t.Iterator[Prefetched | None]:
+    """
+    Read and hash files in background threads, yielding the content, sha, and stat
+    of each file in order, or None for a file which could not be read.
+
+    No more than ``window`` files are read ahead of the one last yielded.
+    """
+    return map_ahead(read_file, filenames, window, thread_name_prefix="slyp-prefetch")
+
+
+def map_ahead(
+    func: t.Callable[[T], R],
+    items: t.Iterable[T],
+    window: int,
+    *,
+    threads: int | None = None,
+    thread_name_prefix: str = "",
+) -> t.Iterator[R]:
+    """
+    Call ``func`` on each item in background threads, yielding the results in
+    order. No more than ``window`` items are started ahead of the result last
+    yielded.
+
+    :param threads: the number of threads to use (by default, one per item in the
+        window, up to ``MAX_READER_THREADS``)
+    """
+    items = iter(items)
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=threads or min(window, MAX_READER_THREADS),
+        thread_name_prefix=thread_name_prefix,
+    ) as executor:
+        pending = collections.deque(
+            executor.submit(func, item) for item in itertools.islice(items, window)
+        )
+        while pending:
+            result = pending.popleft().result()
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(func, item))
+            yield result
+
+
+def read_file(filename: str) -> Prefetched | None:
+    try:
+        with open(filename, "rb") as fp:
+            # as for HashableFile, the stat is taken first, so that any change while
+            # reading shows
+            taken_ns = time.time_ns()
+            fingerprint = StatFingerprint.of(os.fstat(fp.fileno()), taken_ns)
+            content = fp.read()
+    except OSError:
+        # processing reports on the file as usual, when it tries to read it
+        return None
+    # hashlib releases the GIL for large inputs, so this overlaps with other work
+    return content, hashlib.sha256(content).hexdigest(), fingerprint
@@ -0,0 +1,331 @@
+"""
+A fast textual prescreen for files, run before any parsing with libcst.
+
+Each fixer and CST checker rule has a necessary textual precondition (e.g. two
+adjacent string literals, or a paren group which opens and closes on one line).
+Scanning the token stream finds which of these "hints" are present, and rules
+declare which hints they need via ``PRESCREEN_HINTS``. When a file has none of the
+hints needed by the active rules, libcst never has to parse it.
+
+Hints are necessary, not sufficient: a hint being present means that a rule *might*
+apply, and parsing proceeds as normal.
+"""
+
+from __future__ import annotations
+
+import io
+import keyword
+import re
+import tokenize
+import typing as t
+
+if t.TYPE_CHECKING:
+    from slyp.hashable_file import HashableFile
+
+# a paren group which may be removable: it opens and closes on one line and wraps a
+# single atom, or it wraps a 'with' or 'from ... import' clause
+PARENS = "parens"
+# two string literals adjacent to one another (implicit concatenation)
+STRING_CONCAT = "string-concat"
+# two string literals joined with '+'
+STRING_PLUS = "string-plus"
+# a call to 'dict', 'list', 'tuple', 'set', or 'frozenset'
+COLLECTION_CALL = "collection-call"
+# a keyword like 'if' or 'yield' immediately followed by a token, with no whitespace
+KEYWORD_SPACING = "keyword-spacing"
+# 'is None' as seen in 'if x is None: return x'
+NONE_CHECK = "none-check"
+# 'def __init__', which may be missing a return annotation
+INIT_DEFINITION = "init-definition"
+# a ':' in a brace-delimited collection which is immediately followed by a token
+DICT_COLON_SPACING = "dict-colon-spacing"
+
+ALL_HINTS: frozenset[str] = frozenset(
+    {
+        PARENS,
+        STRING_CONCAT,
+        STRING_PLUS,
+        COLLECTION_CALL,
+        KEYWORD_SPACING,
+        NONE_CHECK,
+        INIT_DEFINITION,
+        DICT_COLON_SPACING,
+    }
+)
+
+_COLLECTION_BUILTINS = frozenset({"dict", "list", "tuple", "set", "frozenset"})
+_SPACED_KEYWORDS = frozenset({"if", "elif", "with", "yield", "import"})
+_CLAUSE_KEYWORDS = frozenset({"with", "import"})
+# these keywords parse as names, and are therefore atoms
+_HARD_KEYWORDS = frozenset(keyword.kwlist) - {"True", "False", "None"}
+# soft keywords which start a statement (or clause) whose next expression may be
+# in parens
+_SOFT_KEYWORDS = frozenset({"match", "case"})
+# tokens which may follow a keyword or colon without needing a space
+_NO_SPACE_FOLLOWERS = frozenset({")", "]", "}", ",", ";", ":"})
+_ATOM_OPERATORS = frozenset({".", "..."})
+
+# f-strings are tokenized as a sequence of tokens on py3.12+, but as a single
+# string token on older versions
+_FSTRING_START = getattr(tokenize, "FSTRING_START", None)
+_FSTRING_END = getattr(tokenize, "FSTRING_END", None)
+_FSTRING_RE = re.compile(
+    r"^[a-zA-Z]*[fF][a-zA-Z]*(?P<quote>'''|\"\"\"|'|\")(?P<body>.*)(?P=quote)$",
+    re.DOTALL,
+)
+_NESTED_BRACE_RE = re.compile(r"\{[^}]*\{")
+
+_IGNORED_TOKEN_TYPES = frozenset({tokenize.NL, tokenize.COMMENT, tokenize.ENCODING})
+_STATEMENT_BOUNDARY_TOKEN_TYPES = frozenset(
+    {tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT}
+)
+
+
+class _Group:
+    """A bracketed group, as tracked by the scanner."""
+
+    __slots__ = (
+        "bracket",
+        "row",
+        "is_grouping",
+        "after_clause_keyword",
+        "is_plus_operand",
+        "is_atom",
+        "only_number",
+        "only_strings",
+    )
+
+    def __init__(
+        self,
+        bracket: str,
+        row: int,
+        *,
+        is_grouping: bool = False,
+        after_clause_keyword: bool = False,
+        is_plus_operand: bool = False,
+    ) -> None:
+        self.bracket = bracket
+        self.row = row
+        self.is_grouping = is_grouping
+        self.after_clause_keyword = after_clause_keyword
+        self.is_plus_operand = is_plus_operand
+        self.is_atom = True
+        # 'None' until the group has some content
+        self.only_number: bool | None = None
+        self.only_strings: bool | None = None
+
+    def add(
+        self, *, is_atom: bool, is_number: bool = False, is_string: bool = False
+    ) -> None:
+        self.is_atom = self.is_atom and is_atom
+        self.only_number = self.only_number is None and is_number
+        self.only_strings = self.only_strings is not False and is_string
+
+    @property
+    def may_strip(self) -> bool:
+        return self.after_clause_keyword or (
+            self.is_grouping and self.is_atom and not self.only_number
+        )
+
+
+def scan(content: bytes) -> frozenset[str]:
+    """
+    Find the prescreen hints present in some python source.
+
+    If the source cannot be tokenized, all hints are returned.
+    """
+    try:
+        return _scan_tokens(tokenize.tokenize(io.BytesIO(content).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return ALL_HINTS
+
+
+def may_apply(file_obj: HashableFile, hints: frozenset[str]) -> bool:
+    """
+    Check if rules needing any of the given hints may apply to a file.
+
+    Files which are not valid python are never excluded, so that parsing (and
+    failing to parse) happens exactly as it would without a prescreen.
+    """
+    if file_obj.prescreen_hints & hints:
+        return True
+    try:
+        file_obj.ast_tree
+    except (SyntaxError, ValueError):
+        return True
+    return False
+
+
+def _scan_tokens(tokens: t.Iterable[tokenize.TokenInfo]) -> frozenset[str]:
+    found: set[str] = set()
+    stack: list[_Group] = []
+
+    prev: tokenize.TokenInfo | None = None
+    # whether the previous token was the end of a string (or of a paren group which
+    # only contains strings)
+    prev_is_string = False
+    prev_starts_statement = False
+    at_statement_start = True
+    # a '+' following a string, awaiting its right-hand operand
+    pending_plus = False
+    # a token after which no whitespace indicates a fixable spacing issue, recorded
+    # as its end position and the relevant hint
+    pending_spacing: tuple[tuple[int, int], str] | None = None
+
+    for tok in tokens:
+        toktype, string = tok.type, tok.string
+        if toktype in _IGNORED_TOKEN_TYPES:
+            continue
+
+        if pending_spacing is not None:
+            end, hint = pending_spacing
+            if (
+                tok.start == end
+                and toktype not in (tokenize.NEWLINE, tokenize.ENDMARKER)
+                and string not in _NO_SPACE_FOLLOWERS
+            ):
+                found.add(hint)
+            pending_spacing = None
+
+        top = stack[-1] if stack else None
+        is_string_start = toktype == tokenize.STRING or toktype == _FSTRING_START
+        if is_string_start:
+            if prev_is_string:
+                found.add(STRING_CONCAT)
+            if pending_plus:
+                found.add(STRING_PLUS)
+        if not (toktype == tokenize.OP and string == "("):
+            pending_plus = False
+
+        # for the enclosing group, a whole f-string is a single string
+        # the tokens in its replacement fields get their own group
+        if toktype == _FSTRING_START:
+            if top is not None:
+                top.add(is_atom=True, is_string=True)
+            stack.append(_Group("f", tok.start[0]))
+            prev, prev_is_string = tok, False
+            at_statement_start = False
+            continue
+        elif toktype == _FSTRING_END:
+            if top is not None and top.bracket == "f":
+                stack.pop()
+            prev, prev_is_string = tok, True
+            at_statement_start = False
+            continue
+        elif toktype == tokenize.STRING:
+            if top is not None:
+                top.add(is_atom=True, is_string=True)
+            if match := _FSTRING_RE.match(string):
+                found.update(_fstring_body_hints(match.group("body")))
+            prev, prev_is_string = tok, True
+            at_statement_start = False
+            continue
+
+        is_string = False
+        if toktype == tokenize.NAME:
+            if top is not None:
+                top.add(is_atom=string not in _HARD_KEYWORDS)
+            if prev is not None and prev.type == tokenize.NAME:
+                if prev.string == "def" and string == "__init__":
+                    found.add(INIT_DEFINITION)
+                elif prev.string == "is" and string == "None":
+                    found.add(NONE_CHECK)
+            if string in _SPACED_KEYWORDS or (string == "match" and at_statement_start):
+                pending_spacing = (tok.end, KEYWORD_SPACING)
+        elif toktype == tokenize.NUMBER:
+            if top is not None:
+                top.add(is_atom=True, is_number=True)
+        elif toktype == tokenize.OP:
+            if string in ("(", "[", "{"):
+                is_paren = string == "("
+                if (
+                    is_paren
+                    and prev is not None
+                    and prev.type == tokenize.NAME
+                    and prev.string in _COLLECTION_BUILTINS
+                ):
+                    found.add(COLLECTION_CALL)
+                # braces directly inside of an f-string delimit replacement fields
+                if string == "{" and top is not None and top.bracket == "f":
+                    string = "f{"
+                stack.append(
+                    _Group(
+                        string,
+                        tok.start[0],
+                        is_grouping=is_paren
+                        and _opens_grouping_paren(prev, prev_starts_statement),
+                        after_clause_keyword=is_paren
+                        and prev is not None
+                        and prev.type == tokenize.NAME
+                        and prev.string in _CLAUSE_KEYWORDS,
+                        is_plus_operand=is_paren and pending_plus,
+                    )
+                )
+                pending_plus = False
+            elif string in (")", "]", "}"):
+                closed = stack.pop() if stack else None
+                if closed is not None and closed.bracket == "(":
+                    if closed.row == tok.start[0] and closed.may_strip:
+                        found.add(PARENS)
+                    is_string = bool(closed.is_grouping and closed.only_strings)
+                    if closed.is_plus_operand and is_string:
+                        found.add(STRING_PLUS)
+                if stack:
+                    stack[-1].add(is_atom=True, is_string=is_string)
+            else:
+                if top is not None:
+                    top.add(is_atom=string in _ATOM_OPERATORS)
+                if string == "+" and prev_is_string:
+                    pending_plus = True
+                elif string == ":" and top is not None and top.bracket == "{":
+                    pending_spacing = (tok.end, DICT_COLON_SPACING)
+
+        prev, prev_is_string = tok, is_string
+        prev_starts_statement = at_statement_start
+        at_statement_start = toktype in _STATEMENT_BOUNDARY_TOKEN_TYPES
+
+        if len(found) == len(ALL_HINTS):
+            break
+
+    return frozenset(found)
+
+
+def _opens_grouping_paren(
+    prev: tokenize.TokenInfo | None, prev_starts_statement: bool
+) -> bool:
+    """
+    Check if a '(' is a grouping paren, based on the token which precedes it.
+
+    The alternatives are the parens of a call, a function definition, or a class
+    definition.
+    """
+    if prev is None:
+        return True
+    if prev.type == tokenize.NAME:
+        # 'match (x):' and 'case (x):' start a match statement and a case
+        # pattern, but 'match(x)' and 'case(x)' elsewhere are calls
+        if prev.string in _SOFT_KEYWORDS:
+            return prev_starts_statement
+        return prev.string in _HARD_KEYWORDS
+    if prev.type == tokenize.OP:
+        return prev.string not in (")", "]", "}")
+    return prev.type not in (tokenize.STRING, tokenize.NUMBER, _FSTRING_END)
+
+
+def _fstring_body_hints(body: str) -> set[str]:
+    # a single-token f-string hides the tokens of its replacement fields, so
+    # conservatively guess at what they may contain
+    body = body.replace("{{", "").replace("}}", "")
+    if "{" not in body:
+        return set()
+
+    hints = set()
+    if "(" in body:
+        hints |= {PARENS, COLLECTION_CALL}
+    if "'" in body or '"' in body:
+        hints |= {STRING_CONCAT, STRING_PLUS}
+    if "yield" in body:
+        hints.add(KEYWORD_SPACING)
+    if _NESTED_BRACE_RE.search(body):
+        hints.add(DICT_COLON_SPACING)
+    return hints
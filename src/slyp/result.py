@@ -7,6 +7,8 @@ import dataclasses
 class Result:
     messages: list[Message]
     success: bool
+    # whether the result was found in a cache, without checking the file
+    from_cache: bool = False
 
     @property
     def message_strings(self) -> list[str]:
@@ -0,0 +1,114 @@
+"""
+Change detection for ``--watch``.
+
+Files are polled with ``stat`` (which is cheap), and only files whose stat results
+change are read and hashed. A file is reported as changed only if its content hash
+differs from the content which was last processed.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import typing as t
+
+from slyp.hashable_file import HashableFile
+
+# how often to look for new (or removed) files, in seconds
+# this is much less frequent than polling, as discovery may walk a whole tree
+DISCOVERY_INTERVAL: float = 1.0
+
+_StatKey = tuple[int, int, int]
+
+
+class FileWatcher:
+    """
+    Tracks a set of files, finding those which are new or have new content.
+
+    :param discover: a callable which finds the current set of files to watch
+    """
+
+    def __init__(self, discover: t.Callable[[], t.Iterable[str]]) -> None:
+        self._discover = discover
+        self._last_discovery: float | None = None
+        self._files: set[str] = set()
+        self._stats: dict[str, _StatKey] = {}
+        self._shas: dict[str, str] = {}
+
+    @property
+    def files(self) -> frozenset[str]:
+        return frozenset(self._files)
+
+    def poll(self, skip: t.Container[str] = ()) -> list[str]:
+        """
+        Find files which are new, or whose content differs from when they were last
+        marked as seen.
+
+        :param skip: files not to check, e.g. because they are being processed
+        """
+        now = time.monotonic()
+        if (
+            self._last_discovery is None
+            or now - self._last_discovery >= DISCOVERY_INTERVAL
+        ):
+            self._files = set(self._discover())
+            self._last_discovery = now
+
+        changed = []
+        for filename in sorted(self._files):
+            if filename in skip:
+                continue
+            stat_key = _stat_key(filename)
+            if stat_key is None:
+                self._forget(filename)
+                continue
+            if self._stats.get(filename) == stat_key:
+                continue
+            self._stats[filename] = stat_key
+            sha = _sha(filename)
+            if sha is None:
+                self._forget(filename)
+            elif self._shas.get(filename) != sha:
+                changed.append(filename)
+        return changed
+
+    def mark(self, filename: str, sha: str | None = None) -> None:
+        """
+        Record the content of a file as seen.
+
+        :param sha: the sha of the content which was seen, if known; otherwise, the
+            current content of the file is taken to have been seen
+        """
+        if sha is not None:
+            # the file may have changed again since that content was read, so its
+            # stat is dropped, to be taken (and the file hashed) on the next poll
+            self._stats.pop(filename, None)
+            self._shas[filename] = sha
+            return
+        stat_key = _stat_key(filename)
+        sha = _sha(filename)
+        if stat_key is None or sha is None:
+            self._forget(filename)
+            return
+        self._stats[filename] = stat_key
+        self._shas[filename] = sha
+
+    def _forget(self, filename: str) -> None:
+        self._files.discard(filename)
+        self._stats.pop(filename, None)
+        self._shas.pop(filename, None)
+
+
+def _stat_key(filename: str) -> _StatKey | None:
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _sha(filename: str) -> str | None:
+    try:
+        return HashableFile(filename).sha
+    except OSError:
+        return None
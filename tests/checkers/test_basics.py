@@ -65,3 +65,14 @@ def test_can_disable_code_via_category_disable(check_text):
         disabled_codes={"W"},
     )
     assert res.success
+
+
+def test_checks_do_not_carry_errors_between_runs(check_text):
+    # the same filename is checked again with new content, as in a long-lived
+    # process, and only errors in the new content are reported
+    res = check_text('x = "a " "b"\n', filename="foo.py")
+    assert res.message_strings == ["foo.py:1: unnecessary string concat (E100)"]
+    res = check_text('x = "a b"\ny = "a " "b"\n', filename="foo.py")
+    assert res.message_strings == ["foo.py:2: unnecessary string concat (E100)"]
+    res = check_text('x = "a b"\n', filename="foo.py")
+    assert res.success
@@ -0,0 +1,68 @@
+import ast
+from unittest import mock
+
+import libcst
+import pytest
+
+from slyp.checkers import make_check_plan
+from slyp.checkers.abstract.matching_branches import FindEquivalentBranchesVisitor
+from slyp.checkers.concrete.str_concat import StrConcatErrorCollector
+from slyp.driver import DEFAULT_DISABLED_CODES
+
+
+def test_default_plan_runs_all_visitors():
+    plan = make_check_plan(set(DEFAULT_DISABLED_CODES), set())
+    assert plan.cst_visitors == (StrConcatErrorCollector,)
+    assert plan.ast_visitors == (FindEquivalentBranchesVisitor,)
+    assert not plan.check_syntax
+
+
+@pytest.mark.parametrize(
+    "disabled_codes, enabled_codes, expect_cst, expect_ast",
+    (
+        ({"E"}, set(), False, True),
+        ({"W"}, set(), True, False),
+        ({"E100", "E101"}, set(), False, True),
+        ({"W200"} | DEFAULT_DISABLED_CODES, set(), True, False),
+        ({"all"}, {"E101"}, True, False),
+        ({"all"}, {"W202"}, False, True),
+    ),
+)
+def test_plan_skips_visitors_with_no_enabled_codes(
+    disabled_codes, enabled_codes, expect_cst, expect_ast
+):
+    plan = make_check_plan(disabled_codes, enabled_codes)
+    assert bool(plan.cst_visitors) is expect_cst
+    assert bool(plan.ast_visitors) is expect_ast
+
+
+def test_plan_keeps_syntax_check_when_no_visitors_run():
+    plan = make_check_plan({"E", "W"}, set())
+    assert plan.cst_visitors == ()
+    assert plan.ast_visitors == ()
+    assert plan.check_syntax
+
+    plan = make_check_plan({"all"}, set())
+    assert not plan.check_syntax
+
+
+def test_disabled_engines_do_not_parse(check_text):
+    with (
+        mock.patch("libcst.parse_module", wraps=libcst.parse_module) as mock_cst,
+        mock.patch("ast.parse", wraps=ast.parse) as mock_ast,
+    ):
+        res = check_text('x = "foo " "bar"\n', disabled_codes={"E"})
+        assert res.success
+        assert mock_cst.call_count == 0
+        assert mock_ast.call_count == 1
+
+        res = check_text('x = "foo " "bar"\n', disabled_codes={"W"})
+        assert not res.success
+        assert mock_cst.call_count == 1
+        assert mock_ast.call_count == 1
+
+
+def test_unparsable_file_reported_with_all_visitors_disabled(check_text):
+    res = check_text("foo(\n", disabled_codes={"E", "W"})
+    assert not res.success
+    assert res.message_strings == ["X.py:0: unparsable file (X001)"]
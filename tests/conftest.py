@@ -1,16 +1,18 @@
+import os
+import subprocess
 import textwrap
+from unittest import mock
 
 import pytest
 
-from slyp.checkers import _clear_errors, check_file
+from slyp.checkers import check_file
+from slyp.cli import main as cli_main
 from slyp.fixer import fix_file
 from slyp.hashable_file import HashableFile
 
 
 @pytest.fixture
 def check_text(tmpdir):
-    _clear_errors()
-
     def _check_text(
         text,
         *,
@@ -35,13 +37,15 @@ def check_text(tmpdir):
 
 @pytest.fixture
 def fix_text(tmpdir):
-    def _fix_text(text, *, expect_changes=True, dedent=True, filename="X.py"):
+    def _fix_text(
+        text, *, expect_changes=True, dedent=True, filename="X.py", max_passes=1
+    ):
         handle = tmpdir.join(filename)
         text = textwrap.dedent(text) if dedent else text
         handle.write(text)
 
         with tmpdir.as_cwd():
-            res = fix_file(HashableFile(filename))
+            res = fix_file(HashableFile(filename), max_passes=max_passes)
             new_text = handle.read()
 
             if expect_changes:
@@ -53,3 +57,83 @@ def fix_text(tmpdir):
             return new_text, res
 
     return _fix_text
+
+
+@pytest.fixture
+def mock_parallel_processing():
+    # run tasks synchronously, delivering results through the callbacks
+    def fake_apply_async(func, args, callback=None, error_callback=None):
+        mock_future = mock.Mock()
+        try:
+            result = func(*args)
+        except Exception as e:
+            mock_future.get.side_effect = e
+            if error_callback is not None:
+                error_callback(e)
+        else:
+            mock_future.get.return_value = result
+            if callback is not None:
+                callback(result)
+        return mock_future
+
+    mock_pool = mock.Mock()
+    mock_pool.apply_async = fake_apply_async
+
+    # workers are initialized in this process, as that is where tasks run
+    # but they must not change the signal handling of the testsuite
+    def fake_pool(processes=None, initializer=None, initargs=(), maxtasksperchild=None):
+        if initializer is not None:
+            with mock.patch("signal.signal"):
+                initializer(*initargs)
+        return mock_pool
+
+    with mock.patch("multiprocessing.pool.Pool", side_effect=fake_pool):
+        yield
+
+
+@pytest.fixture
+def run_cli(capsys):
+    def _run_cli(args, assert_exit_code=0):
+        with mock.patch("sys.argv", ["slyp"] + args):
+            retcode = 0
+            try:
+                cli_main()
+            except SystemExit as e:
+                retcode = e.code
+            if assert_exit_code is not None:
+                assert retcode == assert_exit_code
+            return retcode
+
+    return _run_cli
+
+
+def _git(*args, **kwargs):
+    return subprocess.run(
+        ["git", *args], check=True, capture_output=True, text=True, **kwargs
+    ).stdout.strip()
+
+
+@pytest.fixture
+def git():
+    """Run git in the current directory, returning its (stripped) output."""
+    return _git
+
+
+@pytest.fixture
+def git_repo_files():
+    # the files committed by 'git_repo', by name; override this to change them
+    return {"a.py": "a = 1\n"}
+
+
+@pytest.fixture
+def git_repo(tmpdir, git_repo_files):
+    """A git repository in the current directory, with one commit."""
+    os.chdir(tmpdir)
+    _git("init", "-q")
+    _git("config", "user.email", "test@example.com")
+    _git("config", "user.name", "test")
+    for name, content in git_repo_files.items():
+        tmpdir.join(name).write(content, ensure=True)
+    _git("add", ".")
+    _git("commit", "-q", "-m", "init")
+    return tmpdir
@@ -0,0 +1,75 @@
+import textwrap
+from unittest import mock
+
+import libcst
+import pytest
+
+from slyp.fixer.transformer import SlypTransformer
+
+
+class _GrowingTransformer(SlypTransformer):
+    # adds a line on every pass, so that the output never settles
+    def leave_Module(self, original_node, updated_node):
+        footer = [*updated_node.footer, libcst.EmptyLine(comment=libcst.Comment("#"))]
+        return updated_node.with_changes(footer=footer)
+
+
+def test_fixpoint_reaches_stable_output_in_one_run(fix_text):
+    new_text, res = fix_text(
+        """\
+        if(x()):
+            pass
+        """,
+        max_passes=10,
+    )
+    assert new_text == textwrap.dedent(
+        """\
+        if x():
+            pass
+        """
+    )
+    assert "slyp: fixing X.py converged after 2 passes" in res.message_strings
+
+    # a further run makes no changes
+    fix_text(new_text, expect_changes=False, dedent=False, max_passes=10)
+
+
+def test_fixpoint_stops_early_when_no_rule_can_apply(fix_text):
+    _, res = fix_text('x = "foo " "bar"\n', max_passes=10)
+    assert "slyp: fixing X.py converged after 1 pass" in res.message_strings
+
+
+def test_fixpoint_reached_by_the_last_pass_is_converged(fix_text):
+    new_text, res = fix_text(
+        """\
+        if(x()):
+            pass
+        """,
+        max_passes=2,
+    )
+    assert new_text == "if x():\n    pass\n"
+    assert "slyp: fixing X.py converged after 2 passes" in res.message_strings
+
+
+def test_fixpoint_reports_reaching_the_pass_limit(fix_text):
+    with mock.patch("slyp.fixer.SlypTransformer", _GrowingTransformer):
+        new_text, res = fix_text("if x is None:\n    pass\n", max_passes=3)
+    assert new_text == "if x is None:\n    pass\n#\n#\n#\n"
+    assert "slyp: fixing X.py did not converge within 3 passes" in res.message_strings
+
+
+@pytest.mark.parametrize("max_passes", (1, 10))
+def test_fixpoint_does_not_report_passes_when_unchanged(fix_text, max_passes):
+    _, res = fix_text("x = (1, 2)\n", expect_changes=False, max_passes=max_passes)
+    assert not any("passes" in m for m in res.message_strings)
+
+
+def test_single_pass_does_not_report_passes(fix_text):
+    new_text, res = fix_text(
+        """\
+        if(x()):
+            pass
+        """,
+    )
+    assert new_text == "if (x()):\n    pass\n"
+    assert res.message_strings == ["slyp: fixed X.py"]
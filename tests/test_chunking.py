@@ -0,0 +1,85 @@
+import os
+from unittest import mock
+
+import pytest
+
+from slyp.driver import _RunConfig, make_chunks, process_chunk, process_file
+
+
+def _write_files(tmpdir, sizes):
+    os.chdir(tmpdir)
+    tasks = []
+    for i, size in enumerate(sizes):
+        tmpdir.join(f"f{i}.py").write("#" * (size - 1) + "\n")
+        tasks.append((f"f{i}.py", None))
+    return tasks
+
+
+def test_fixed_chunk_size(tmpdir):
+    tasks = _write_files(tmpdir, [10] * 7)
+    chunks = make_chunks(tasks, workers=2, chunk_size=3)
+    assert [len(c) for c in chunks] == [3, 3, 1]
+    assert [task for chunk in chunks for task in chunk] == tasks
+
+
+def test_small_batches_are_not_chunked(tmpdir):
+    tasks = _write_files(tmpdir, [10] * 5)
+    assert [len(c) for c in make_chunks(tasks, workers=4)] == [1] * 5
+
+
+def test_chunks_are_limited_by_file_count(tmpdir):
+    tasks = _write_files(tmpdir, [10] * 1000)
+    chunks = make_chunks(tasks, workers=2)
+    # two workers get several chunks each, up to a maximum chunk size
+    assert [len(c) for c in chunks] == [64] * 15 + [40]
+    assert [task for chunk in chunks for task in chunk] == tasks
+
+    chunks = make_chunks(tasks[:200], workers=2)
+    assert [len(c) for c in chunks] == [25] * 8
+
+
+def test_chunks_are_limited_by_size(tmpdir):
+    # a large file ends its chunk early, and the small files are grouped
+    tasks = _write_files(tmpdir, [10] * 50 + [10_000] + [10] * 50)
+    chunks = make_chunks(tasks, workers=2)
+    assert [len(c) for c in chunks] == [12, 12, 12, 12, 3, 12, 12, 12, 12, 2]
+    assert chunks[4][-1] == ("f50.py", None)
+    assert [task for chunk in chunks for task in chunk] == tasks
+
+
+def test_process_chunk_isolates_errors(tmpdir):
+    tasks = _write_files(tmpdir, [10] * 3)
+    config = _RunConfig(
+        only="lint",
+        disabled_codes=set(),
+        enabled_codes=set(),
+        passing_cache=None,
+        check_plan=None,
+        max_fix_passes=1,
+    )
+
+    def flaky_process_file(filename, *args):
+        if filename == "f1.py":
+            raise ValueError("oh no")
+        return process_file(filename, *args)
+
+    with mock.patch("slyp.driver.process_file", side_effect=flaky_process_file):
+        results = process_chunk(tasks, config)
+
+    assert [r.filename for r in results] == ["f0.py", "f1.py", "f2.py"]
+    assert [r.errored for r in results] == [False, True, False]
+    assert results[1].result.message_strings[0] == "slyp error on 'f1.py': oh no"
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_cli_with_chunk_size(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    for i in range(5):
+        tmpdir.join(f"f{i}.py").write(f'x = "foo " "bar{i}"\n')
+    run_cli(
+        ["--no-cache", "--only", "lint", "--jobs", "2", "--chunk-size", "2"],
+        assert_exit_code=1,
+    )
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        f"f{i}.py:1: unnecessary string concat (E100)" for i in range(5)
+    ]
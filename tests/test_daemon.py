@@ -0,0 +1,269 @@
+import io
+import os
+import stat
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from slyp import daemon
+from slyp.cli import _run_argv
+from slyp.driver import process_file
+from slyp.file_cache import ResultCache
+from slyp.hashable_file import HashableFile
+
+pytestmark = pytest.mark.usefixtures("mock_parallel_processing")
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    tmp_path.chmod(0o700)
+    return str(tmp_path / "slyp.sock")
+
+
+@pytest.fixture
+def start_daemon(socket_path):
+    threads = []
+
+    def _start_daemon():
+        thread = threading.Thread(
+            target=daemon.serve, args=(socket_path, _run_argv), daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+        # wait for the daemon to be listening
+        for _ in range(500):
+            conn = daemon._connect(socket_path)
+            if conn is not None:
+                conn.close()
+                return
+            time.sleep(0.01)
+        raise RuntimeError("daemon did not start")
+
+    yield _start_daemon
+
+    daemon.stop(socket_path)
+    for thread in threads:
+        thread.join(timeout=5)
+
+
+@pytest.fixture
+def run_both(run_cli, capsys, tmpdir, socket_path):
+    """
+    Run the CLI in-process and then through the daemon, starting from the same
+    files each time, and return both outputs.
+    """
+
+    def _run_both(files, args, stdin=None):
+        outputs = []
+        for use_daemon in (False, True):
+            for name, content in files.items():
+                tmpdir.join(name).write(content)
+            with mock.patch("sys.stdin", io.TextIOWrapper(io.BytesIO(stdin or b""))):
+                exit_code = run_cli(
+                    ["--daemon", *args] if use_daemon else args,
+                    assert_exit_code=None,
+                )
+            out, err = capsys.readouterr()
+            file_contents = {name: tmpdir.join(name).read() for name in files}
+            outputs.append((exit_code, out, err, file_contents))
+        return outputs
+
+    with (
+        tmpdir.as_cwd(),
+        mock.patch("slyp.daemon.socket_path_for", return_value=socket_path),
+    ):
+        yield _run_both
+
+
+@pytest.mark.parametrize(
+    "files, args, stdin",
+    (
+        ({"foo.py": 'x = "foo bar"\n'}, ["--no-cache", "-v", "foo.py"], None),
+        ({"foo.py": 'x = "foo " "bar"\n'}, ["--no-cache", "foo.py"], None),
+        (
+            {"foo.py": 'x = "foo " "bar"\n', "bar.py": "y = (1)\n"},
+            ["--no-cache", "--only", "lint", "foo.py", "bar.py"],
+            None,
+        ),
+        ({}, ["--only", "lint", "-"], b'x = "foo " "bar"\n'),
+        ({}, ["--only", "fix", "-"], b'x = ("foo")\n'),
+    ),
+)
+def test_daemon_output_matches_in_process(run_both, start_daemon, files, args, stdin):
+    start_daemon()
+    in_process, via_daemon = run_both(files, args, stdin)
+    assert in_process == via_daemon
+
+
+def test_client_spawns_daemon_on_demand(run_both, start_daemon):
+    with mock.patch("slyp.daemon._spawn", side_effect=start_daemon) as mock_spawn:
+        in_process, via_daemon = run_both(
+            {"foo.py": "x = (1)\n"}, ["--no-cache", "foo.py"]
+        )
+    assert mock_spawn.call_count == 1
+    assert in_process == via_daemon
+
+
+@pytest.mark.parametrize(
+    "files, args, stdin",
+    (
+        ({"foo.py": 'x = "foo " "bar"\n'}, ["--no-cache", "--only", "lint"], None),
+        # stdin is read before the daemon is tried, and must not be lost
+        ({}, ["--only", "fix", "-"], b'x = "foo " "bar"\n'),
+    ),
+)
+def test_client_falls_back_to_in_process_without_daemon(run_both, files, args, stdin):
+    with mock.patch("slyp.daemon._spawn"), mock.patch("slyp.daemon.SPAWN_TIMEOUT", 0):
+        in_process, via_daemon = run_both(files, args, stdin)
+    assert in_process[0] == 1
+    assert in_process == via_daemon
+
+
+def test_daemon_reuses_results_for_unchanged_files(
+    run_cli, tmpdir, socket_path, start_daemon, capsys
+):
+    os.chdir(tmpdir)
+    start_daemon()
+    tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+    argv = ["--only", "lint", "foo.py"]
+    with mock.patch("slyp.driver.process_file", wraps=process_file) as mock_process:
+        first = daemon.request(socket_path, argv)
+        second = daemon.request(socket_path, argv)
+        assert mock_process.call_count == 1
+
+        tmpdir.join("foo.py").write('x = "foo bar"\n')
+        third = daemon.request(socket_path, argv)
+        assert mock_process.call_count == 2
+
+    assert first == second
+    assert first.exit_code == 1
+    assert third.exit_code == 0
+
+
+def test_daemon_reuses_no_results_with_no_cache(tmpdir, socket_path, start_daemon):
+    os.chdir(tmpdir)
+    start_daemon()
+    tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+    argv = ["--no-cache", "--only", "lint", "foo.py"]
+    with mock.patch("slyp.driver.process_file", wraps=process_file) as mock_process:
+        first = daemon.request(socket_path, argv)
+        second = daemon.request(socket_path, argv)
+        assert mock_process.call_count == 2
+    assert first == second
+
+
+def test_result_cache_skips_results_for_changed_files(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = (1)\n")
+    cache = ResultCache()
+    file_obj = HashableFile("foo.py")
+    key = cache.make_key(file_obj, "config")
+    result = mock.Mock()
+
+    # the file was changed (e.g. fixed) by processing
+    tmpdir.join("foo.py").write("x = 1\n")
+    cache.add(key, file_obj, result)
+    assert cache.get(key) is None
+
+    file_obj = HashableFile("foo.py")
+    key = cache.make_key(file_obj, "config")
+    cache.add(key, file_obj, result)
+    assert cache.get(key) is result
+    assert cache.get(cache.make_key(file_obj, "other config")) is None
+
+
+def test_result_cache_evicts_least_recently_used(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    file_obj = HashableFile("foo.py")
+    cache = ResultCache(max_size=2)
+
+    cache.add("a", file_obj, "A")
+    cache.add("b", file_obj, "B")
+    assert cache.get("a") == "A"
+    cache.add("c", file_obj, "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_client_sends_its_git_environment(
+    socket_path, start_daemon, monkeypatch, tmpdir
+):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    start_daemon()
+    for name in list(os.environ):
+        if name.startswith("GIT_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("GIT_INDEX_FILE", "hook-index")
+    with mock.patch("slyp.daemon._exchange", wraps=daemon._exchange) as mock_exchange:
+        assert daemon.request(socket_path, ["--no-cache", "foo.py"]).exit_code == 0
+    assert mock_exchange.call_args.args[1]["git_env"] == {
+        "GIT_INDEX_FILE": "hook-index"
+    }
+
+
+def test_daemon_runs_git_with_the_clients_environment(git, git_repo, monkeypatch):
+    alt_index = str(git_repo.join(".git", "alt-index"))
+    alt_env = {**os.environ, "GIT_INDEX_FILE": alt_index}
+    git("read-tree", "HEAD", env=alt_env)
+    git_repo.join("b.py").write('x = "foo " "bar"\n')
+    git("add", "b.py", env=alt_env)
+    # a variable from whichever client started the daemon, which must not leak
+    monkeypatch.setenv("GIT_DIR", str(git_repo.join("elsewhere")))
+
+    req = {
+        "argv": ["--no-cache", "--use-git-ls", "--only", "lint"],
+        "stdin": None,
+        "stdout": ["utf-8", "strict"],
+        "stderr": ["utf-8", "strict"],
+        "git_env": {"GIT_INDEX_FILE": alt_index},
+    }
+    response = daemon._run(req, _run_argv, mock.Mock(), ResultCache())
+    assert daemon._decode(response["stdout"]) == (
+        b"b.py:1: unnecessary string concat (E100)\n"
+    )
+    assert response["exit_code"] == 1
+    assert os.environ["GIT_DIR"] == str(git_repo.join("elsewhere"))
+    assert "GIT_INDEX_FILE" not in os.environ
+
+
+def test_socket_is_in_a_private_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    socket_path = daemon.socket_path_for(str(tmp_path))
+    assert os.path.dirname(socket_path) == str(tmp_path / f"slyp-{os.getuid()}")
+    assert daemon._make_private_directory(os.path.dirname(socket_path))
+    assert stat.S_IMODE(os.stat(os.path.dirname(socket_path)).st_mode) == 0o700
+
+
+def test_client_refuses_a_socket_which_others_could_replace(
+    socket_path, start_daemon, tmp_path, capsys
+):
+    start_daemon()
+    tmp_path.chmod(0o777)
+    try:
+        assert daemon.request(socket_path, ["--version"]) is None
+        assert not daemon.stop(socket_path)
+
+        # and a daemon will not serve there
+        daemon.serve(socket_path + "2", _run_argv)
+        assert "is not private to the current user" in capsys.readouterr().err
+    finally:
+        tmp_path.chmod(0o700)
+
+
+def test_client_refuses_a_socket_owned_by_another_user(socket_path, start_daemon):
+    start_daemon()
+    real_lstat = os.lstat
+
+    def _lstat(path):
+        st = real_lstat(path)
+        if path != socket_path:
+            return st
+        return os.stat_result((st.st_mode, *st[1:4], st.st_uid + 1, *st[5:]))
+
+    with mock.patch("os.lstat", _lstat):
+        assert daemon.request(socket_path, ["--version"]) is None
@@ -0,0 +1,186 @@
+import textwrap
+
+import pytest
+
+from slyp.diff_ranges import _parse_diff, remap_line_ranges
+
+pytestmark = pytest.mark.usefixtures("mock_parallel_processing")
+
+ORIGINAL_TEXT = textwrap.dedent(
+    """\
+    a = (1)
+    b = "foo " "bar"
+    c = dict()
+    """
+)
+
+
+@pytest.fixture
+def git_repo_files():
+    return {"foo.py": ORIGINAL_TEXT, "bar.py": ORIGINAL_TEXT}
+
+
+def test_parse_diff():
+    diff = textwrap.dedent(
+        """\
+        diff --git a/foo.py b/foo.py
+        index 0000000..1111111 100644
+        --- a/foo.py
+        +++ b/foo.py
+        @@ -1 +1 @@
+        -x = 1
+        +x = 2
+        @@ -10,0 +11,3 @@ def f():
+        +y = 1
+        +y = 2
+        +y = 3
+        diff --git a/bar.py b/bar.py
+        --- a/bar.py
+        +++ b/bar.py
+        @@ -3,2 +2,0 @@
+        -z = 1
+        -z = 2
+        diff --git "a/sp\\303\\251cial.py" "b/sp\\303\\251cial.py"
+        --- "a/sp\\303\\251cial.py"
+        +++ "b/sp\\303\\251cial.py"
+        @@ -1,2 +1,2 @@
+        diff --git a/a b.py b/a b.py
+        --- a/a b.py\t
+        +++ b/a b.py\t
+        @@ -1 +1 @@
+        """
+    ).encode()
+    assert _parse_diff(diff) == {
+        "foo.py": [(1, 2), (11, 14)],
+        "spécial.py": [(1, 3)],
+        "a b.py": [(1, 2)],
+    }
+
+
+def test_parse_diff_reads_content_which_looks_like_a_header():
+    diff = textwrap.dedent(
+        """\
+        diff --git a/foo.py b/foo.py
+        --- a/foo.py
+        +++ b/foo.py
+        @@ -1,0 +2,2 @@
+        +++ not_a_file.py
+        +x = 1
+        @@ -4 +6 @@
+        --- y = 1
+        +++ y = 2
+        """
+    ).encode()
+    assert _parse_diff(diff) == {"foo.py": [(2, 4), (6, 7)]}
+
+
+def test_remap_line_ranges_follows_moved_lines():
+    old = b"a\nb\nc\nd\n"
+    new = b"a\nb1\nb2\nc\nd\n"
+    # line 2 ('b') is split into two lines, and 'd' moves from line 4 to 5
+    assert remap_line_ranges([(2, 3), (4, 5)], old, new) == [(2, 4), (5, 6)]
+
+
+def test_diff_base_only_fixes_and_lints_changed_lines(git_repo, run_cli, capsys):
+    git_repo.join("foo.py").write(ORIGINAL_TEXT + 'd = (x)\ne = "x" + "y"\n')
+
+    run_cli(["--diff-base", "HEAD", "--no-cache"], assert_exit_code=1)
+
+    # only the changed lines were fixed
+    assert git_repo.join("foo.py").read() == ORIGINAL_TEXT + 'd = x\ne = "x" + "y"\n'
+    # the unchanged file was not touched at all
+    assert git_repo.join("bar.py").read() == ORIGINAL_TEXT
+
+    stdout = capsys.readouterr().out
+    assert "slyp: fixed foo.py" in stdout
+    assert "foo.py:5: unnecessary string concat with plus (E101)" in stdout
+    assert "E100" not in stdout
+    assert "bar.py" not in stdout
+
+
+def test_diff_base_lints_lines_moved_by_fixing(git_repo, run_cli, capsys):
+    git_repo.join("foo.py").write(
+        ORIGINAL_TEXT
+        + textwrap.dedent(
+            """\
+            foo(
+                x="alpha "
+                "beta",
+            )
+            e = "x" + "y"
+            """
+        )
+    )
+
+    run_cli(["--diff-base", "HEAD", "--no-cache", "foo.py"], assert_exit_code=1)
+
+    # fixing added two lines, so the E101 moves from line 8 to 10
+    stdout = capsys.readouterr().out
+    assert "foo.py:10: unnecessary string concat with plus (E101)" in stdout
+    assert "E100" not in stdout
+
+
+def test_diff_base_checks_all_of_untracked_files(git_repo, run_cli, capsys):
+    # the last line has no newline
+    git_repo.join("new.py").write(ORIGINAL_TEXT + 'e = "x" + "y"')
+    git_repo.join("ignored.py").write(ORIGINAL_TEXT)
+    git_repo.join(".gitignore").write("ignored.py\n")
+
+    run_cli(["--diff-base", "HEAD", "--no-cache"], assert_exit_code=1)
+
+    # the whole of the new file was fixed, up to its last line
+    assert git_repo.join("new.py").read() == (
+        'a = (1)\nb = "foo bar"\nc = {}\ne = "x" + "y"'
+    )
+    assert git_repo.join("ignored.py").read() == ORIGINAL_TEXT
+    stdout = capsys.readouterr().out
+    assert "slyp: fixed new.py" in stdout
+    assert "new.py:4: unnecessary string concat with plus (E101)" in stdout
+    assert "ignored.py" not in stdout
+
+
+def test_diff_base_with_no_changes_passes(git_repo, run_cli, capsys):
+    run_cli(["--diff-base", "HEAD"])
+    assert capsys.readouterr().out == ""
+    assert git_repo.join("foo.py").read() == ORIGINAL_TEXT
+
+
+@pytest.mark.parametrize("form", ("./foo.py", "absolute"))
+def test_diff_base_accepts_any_form_of_named_paths(git_repo, run_cli, capsys, form):
+    git_repo.join("foo.py").write(ORIGINAL_TEXT + 'e = "x" + "y"\n')
+    filename = str(git_repo.join("foo.py")) if form == "absolute" else form
+
+    run_cli(["--diff-base", "HEAD", "--no-cache", filename], assert_exit_code=1)
+    assert "unnecessary string concat with plus (E101)" in capsys.readouterr().out
+
+
+def test_diff_base_warns_of_named_files_with_no_changes(git_repo, run_cli, capsys):
+    run_cli(["--diff-base", "HEAD", "bar.py"])
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert "slyp: bar.py has no changed lines, so it will not be checked" in err
+
+
+def test_diff_base_handles_spaces_in_filenames(git, git_repo, run_cli, capsys):
+    git_repo.join("a b.py").write(ORIGINAL_TEXT)
+    git("add", "a b.py")
+    git("commit", "-q", "-m", "add a b.py")
+    git_repo.join("a b.py").write(ORIGINAL_TEXT + 'e = "x" + "y"\n')
+
+    run_cli(["--diff-base", "HEAD", "--no-cache"], assert_exit_code=1)
+    assert "a b.py:4: unnecessary string concat with plus (E101)" in (
+        capsys.readouterr().out
+    )
+
+
+@pytest.mark.parametrize(
+    "config", (("diff.noprefix", "true"), ("diff.mnemonicPrefix", "true"))
+)
+def test_diff_base_ignores_configured_prefixes(git, git_repo, run_cli, capsys, config):
+    git("config", *config)
+    git_repo.join("foo.py").write(ORIGINAL_TEXT + 'e = "x" + "y"\n')
+
+    run_cli(["--diff-base", "HEAD", "--no-cache"], assert_exit_code=1)
+    assert "foo.py:4: unnecessary string concat with plus (E101)" in (
+        capsys.readouterr().out
+    )
@@ -0,0 +1,230 @@
+import os
+import time
+from unittest import mock
+
+import pytest
+
+import slyp.discovery
+from slyp.discovery import DiscoveryStats, PathMatcher, walk_py_files
+from slyp.driver import all_py_filenames
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expect",
+    (
+        ("build/", "build/", True),
+        ("build/", "pkg/build/", True),
+        ("build/", "build", False),
+        ("build", "pkg/build", True),
+        ("*.py", "pkg/mod.py", True),
+        ("*_pb2.py", "pkg/foo_pb2.py", True),
+        ("a*c", "ab/xc", False),
+        ("/top.py", "top.py", True),
+        ("/top.py", "pkg/top.py", False),
+        ("pkg/gen/", "pkg/gen/", True),
+        ("pkg/gen/", "other/pkg/gen/", False),
+        ("**/gen/", "a/b/gen/", True),
+        ("docs/**/conf.py", "docs/conf.py", True),
+        ("docs/**/conf.py", "docs/a/b/conf.py", True),
+        ("vendor/**", "vendor/x.py", True),
+        ("vendor/**", "vendor/", False),
+        ("gen/*", "gen/", False),
+        ("mod[0-9].py", "mod1.py", True),
+        ("mod[!0-9].py", "mod1.py", False),
+        ("mod?.py", "mod12.py", False),
+    ),
+)
+def test_path_matcher_patterns(pattern, path, expect):
+    assert bool(PathMatcher([pattern]).match(path)) is expect
+
+
+def test_path_matcher_later_patterns_take_precedence():
+    matcher = PathMatcher(["# a comment", "", "*.py", "!keep.py", "gen/"])
+    assert matcher.match("drop.py") is True
+    assert matcher.match("keep.py") is False
+    assert matcher.match("README") is None
+    assert matcher.excludes("gen/keep.py")
+    assert not matcher.excludes("src/other")
+
+
+def _make_tree(tmpdir, paths):
+    for path in paths:
+        tmpdir.join(path).ensure()
+
+
+def test_walk_prunes_excluded_and_ignored_directories(tmpdir):
+    _make_tree(
+        tmpdir,
+        [
+            "a.py",
+            "notes.txt",
+            ".hidden/x.py",
+            "build/lib/a.py",
+            "node_modules/pkg/x.py",
+            "pkg/mod.py",
+            "pkg/gen/out.py",
+            "pkg/gen/keep.py",
+            "pkg/sub/b.py",
+            "generated/x.py",
+        ],
+    )
+    tmpdir.join(".gitignore").write("generated/\n")
+    tmpdir.join("pkg", ".gitignore").write("gen/*\n!gen/keep.py\n")
+    os.chdir(tmpdir)
+
+    scanned = []
+    real_scandir = os.scandir
+
+    def _scandir(path):
+        scanned.append(os.path.normpath(path))
+        return real_scandir(path)
+
+    with mock.patch("os.scandir", _scandir):
+        found = list(walk_py_files(exclude=PathMatcher(["build/", "node_modules/"])))
+    assert found == ["a.py", "pkg/mod.py", "pkg/gen/keep.py", "pkg/sub/b.py"]
+    # excluded and hidden directories are never entered
+    assert sorted(scanned) == [".", "pkg", "pkg/gen", "pkg/sub"]
+
+    assert "generated/x.py" in walk_py_files(use_gitignore=False)
+
+
+def test_walk_does_not_follow_symlink_loops(tmpdir):
+    _make_tree(tmpdir, ["pkg/a.py", "other/b.py"])
+    tmpdir.join("pkg", "loop").mksymlinkto(tmpdir.join("pkg"))
+    tmpdir.join("pkg", "up").mksymlinkto(tmpdir)
+    tmpdir.join("pkg", "other").mksymlinkto(tmpdir.join("other"))
+    os.chdir(tmpdir)
+    assert list(walk_py_files()) == ["other/b.py", "pkg/a.py", "pkg/other/b.py"]
+
+
+@pytest.mark.parametrize("threads", (1, 3))
+def test_walk_does_not_follow_loops_through_several_symlinks(tmpdir, threads):
+    _make_tree(tmpdir, ["a/x.py", "b/y.py"])
+    tmpdir.join("a", "tob").mksymlinkto(tmpdir.join("b"))
+    tmpdir.join("b", "toa").mksymlinkto(tmpdir.join("a"))
+    os.chdir(tmpdir)
+    assert list(walk_py_files(threads=threads)) == [
+        "a/x.py",
+        "a/tob/y.py",
+        "b/y.py",
+        "b/toa/x.py",
+    ]
+
+
+@pytest.mark.parametrize("threads", (1, 3))
+def test_exclude_filters_git_ls_files(tmpdir, threads):
+    _make_tree(tmpdir, ["a.py", "vendor/b.py", "README", "z.py"])
+    os.chdir(tmpdir)
+    stats = DiscoveryStats()
+    with mock.patch("subprocess.run") as mock_run:
+        mock_run.return_value.stdout = b"a.py\0vendor/b.py\0README\0z.py\0"
+        found = list(
+            all_py_filenames(
+                [],
+                True,
+                exclude=PathMatcher(["vendor/"]),
+                threads=threads,
+                stats=stats,
+            )
+        )
+    assert found == ["a.py", "z.py"]
+    assert (stats.files, stats.excluded) == (2, 1)
+
+
+def test_walk_in_threads_matches_serial_walk(tmpdir):
+    paths = [f"p{i}/s{j}/m{k}.py" for i in range(5) for j in range(4) for k in range(3)]
+    _make_tree(tmpdir, [*paths, "top.py", "p1/skip/x.py", "p2/s0/gen_x.py"])
+    tmpdir.join("p2", ".gitignore").write("gen_*.py\n")
+    tmpdir.join("p3", "link").mksymlinkto(tmpdir.join("p3"))
+    os.chdir(tmpdir)
+
+    walks = {}
+    for threads in (1, 4):
+        stats = DiscoveryStats()
+        walks[threads] = list(
+            walk_py_files(exclude=PathMatcher(["skip/"]), threads=threads, stats=stats)
+        )
+        assert (stats.files, stats.directories, stats.excluded) == (61, 26, 2)
+        assert stats.elapsed > 0
+    assert walks[1] == walks[4]
+    assert walks[1][0] == "top.py"
+
+
+def test_threaded_walk_scans_a_bounded_distance_ahead(tmpdir, monkeypatch):
+    _make_tree(tmpdir, [f"p{i}/m.py" for i in range(50)])
+    os.chdir(tmpdir)
+    monkeypatch.setattr("slyp.discovery._SCAN_AHEAD_PER_THREAD", 2)
+    scanned = []
+    real_scan = slyp.discovery._scan_directory
+
+    def _scan(dirpath, *args, **kwargs):
+        scanned.append(dirpath)
+        return real_scan(dirpath, *args, **kwargs)
+
+    monkeypatch.setattr("slyp.discovery._scan_directory", _scan)
+    walk = walk_py_files(threads=2)
+    assert next(walk) == "p0/m.py"
+    time.sleep(0.2)
+    # the root and 'p0' have been walked, and at most 4 more were scanned ahead
+    assert len(scanned) <= 6
+    assert list(walk) == [f"p{i}/m.py" for i in sorted(range(1, 50), key=str)]
+
+
+def test_abandoned_threaded_walk_stops(tmpdir):
+    _make_tree(tmpdir, [f"p{i}/m.py" for i in range(20)])
+    os.chdir(tmpdir)
+    walk = walk_py_files(threads=4)
+    assert next(walk) == "p0/m.py"
+    walk.close()
+
+
+@pytest.mark.parametrize(
+    "options, expect",
+    (
+        ([], ["a.py", "vendor/c.py"]),
+        (["--extend-exclude", "vendor/"], ["a.py"]),
+        (["--exclude", "a.py"], ["build/b.py", "vendor/c.py"]),
+    ),
+)
+def test_cli_exclude_options(run_cli, tmpdir, capsys, options, expect):
+    os.chdir(tmpdir)
+    for path in ("a.py", "build/b.py", "vendor/c.py"):
+        tmpdir.join(path).write('x = "foo " "bar"\n', ensure=True)
+    run_cli(["--no-cache", "--only", "lint", *options], assert_exit_code=1)
+    out = capsys.readouterr().out
+    assert sorted(line.split(":")[0] for line in out.splitlines()) == expect
+
+
+@pytest.mark.parametrize(
+    "options, expect",
+    (
+        ([], ["a.py", "pkg/build/core.py"]),
+        (["--extend-exclude", "vendor/"], ["a.py", "pkg/build/core.py"]),
+        (["--exclude", "build/"], ["a.py"]),
+    ),
+)
+def test_cli_default_excludes_do_not_skip_git_files(
+    git, git_repo, run_cli, capsys, options, expect
+):
+    for path in ("a.py", "pkg/build/core.py"):
+        git_repo.join(path).write('x = "foo " "bar"\n', ensure=True)
+    git("add", ".")
+    run_cli(["--no-cache", "--only", "lint", "--use-git-ls", *options], 1)
+    out = capsys.readouterr().out
+    assert sorted(line.split(":")[0] for line in out.splitlines()) == expect
+
+
+def test_cli_reports_discovery_when_verbose(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    for path in ("a.py", "pkg/b.py", "build/c.py"):
+        tmpdir.join(path).write("x = 1\n", ensure=True)
+    run_cli(["--no-cache", "-v", "--discovery-threads", "2"])
+    err = capsys.readouterr().err
+    assert "slyp: found 2 files in " in err
+    assert "walking 2 directories" in err
+    assert "1 excluded" in err
+
+
+def test_discovery_threads_must_be_positive(run_cli, capsys):
+    run_cli(["--discovery-threads", "0"], assert_exit_code=2)
+    assert "--discovery-threads must be at least 1" in capsys.readouterr().err
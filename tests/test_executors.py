@@ -0,0 +1,159 @@
+import argparse
+import concurrent.futures
+import os
+from unittest import mock
+
+import pytest
+
+from slyp.driver import _ExecutorPool, choose_executor, make_pool
+
+_FILES = {
+    "concat.py": 'x = "foo " "bar"\n',
+    "parens.py": "x = (1)\n",
+    "branches.py": "if x:\n    y = 1\nelse:\n    y = 1\n",
+    "clean.py": "x = 1\n",
+    "broken.py": "def f(:\n",
+}
+
+
+def _args(**kwargs):
+    options = {
+        "executor": None,
+        "file_timeout": None,
+        "max_tasks_per_worker": None,
+        "max_worker_memory": None,
+    }
+    options.update(kwargs)
+    return argparse.Namespace(**options)
+
+
+@pytest.mark.parametrize(
+    "args, gil_enabled, expect",
+    (
+        (_args(), True, "process"),
+        (_args(), False, "thread"),
+        (_args(executor="process"), False, "process"),
+        (_args(executor="thread"), True, "thread"),
+        # options which only processes support
+        (_args(file_timeout=1.0), False, "process"),
+        (_args(max_worker_memory=100), False, "process"),
+    ),
+)
+def test_choose_executor(args, gil_enabled, expect):
+    with mock.patch("slyp.driver.is_gil_enabled", return_value=gil_enabled):
+        assert choose_executor(args) == expect
+
+
+@pytest.mark.parametrize("only", (None, "lint", "fix"))
+def test_executors_give_the_same_output(run_cli, tmpdir, capsys, only):
+    os.chdir(tmpdir)
+    outputs = []
+    for argv in (
+        ["--jobs", "1"],
+        ["--jobs", "2", "--executor", "process"],
+        ["--jobs", "2", "--executor", "thread"],
+    ):
+        for name, content in _FILES.items():
+            tmpdir.join(name).write(content)
+        if only is not None:
+            argv = [*argv, "--only", only]
+        exit_code = run_cli(["--no-cache", *argv], assert_exit_code=None)
+        out = sorted(capsys.readouterr().out.splitlines())
+        contents = {name: tmpdir.join(name).read() for name in _FILES}
+        outputs.append((exit_code, out, contents))
+
+    assert outputs[0][1], "expected some output"
+    assert outputs[1] == outputs[0]
+    assert outputs[2] == outputs[0]
+
+
+class _FailingExecutor(concurrent.futures.ThreadPoolExecutor):
+    # like a subinterpreter which cannot import an extension module
+    def __init__(self, max_workers=None, initializer=None, initargs=()) -> None:
+        super().__init__(max_workers, initializer=_fail_import)
+
+
+def _fail_import():
+    raise ImportError("module does not support loading in subinterpreters")
+
+
+@pytest.fixture
+def fake_interpreter_pool():
+    # 'InterpreterPoolExecutor' has the same interface as 'ThreadPoolExecutor', and
+    # is only available on python 3.14+
+    with mock.patch(
+        "concurrent.futures.InterpreterPoolExecutor",
+        concurrent.futures.ThreadPoolExecutor,
+        create=True,
+    ):
+        yield
+
+
+@pytest.mark.usefixtures("fake_interpreter_pool")
+def test_interpreter_executor_gives_the_same_output(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    outputs = []
+    for argv in (["--jobs", "1"], ["--jobs", "2", "--executor", "interpreter"]):
+        for name, content in _FILES.items():
+            tmpdir.join(name).write(content)
+        exit_code = run_cli(["--no-cache", *argv], assert_exit_code=None)
+        out = sorted(capsys.readouterr().out.splitlines())
+        contents = {name: tmpdir.join(name).read() for name in _FILES}
+        outputs.append((exit_code, out, contents))
+    assert outputs[1] == outputs[0]
+
+
+@pytest.mark.usefixtures("fake_interpreter_pool")
+def test_make_pool_uses_interpreters_when_they_work():
+    pool = make_pool(2, None, executor="interpreter")
+    try:
+        assert isinstance(pool, _ExecutorPool)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# either subinterpreters fail to start, or they are not available at all
+@pytest.mark.parametrize("executor_class", (_FailingExecutor, None))
+def test_interpreter_executor_falls_back_to_processes(
+    run_cli, tmpdir, capsys, executor_class
+):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+    with mock.patch.object(
+        concurrent.futures, "InterpreterPoolExecutor", executor_class, create=True
+    ):
+        run_cli(
+            ["--no-cache", "-v", "--only", "lint", "-j", "2"]
+            + ["--executor", "interpreter"],
+            assert_exit_code=1,
+        )
+    out, err = capsys.readouterr()
+    assert "using processes instead" in err
+    assert out == "foo.py:1: unnecessary string concat (E100)\n"
+
+
+@pytest.mark.parametrize(
+    "argv, message",
+    (
+        (
+            ["--executor", "thread", "--file-timeout", "1"],
+            "--file-timeout cannot be used with '--executor thread'",
+        ),
+        (
+            ["--executor", "thread", "--max-worker-memory", "100"],
+            "--max-worker-memory cannot be used with '--executor thread'",
+        ),
+        (
+            ["--executor", "interpreter", "--max-tasks-per-worker", "1"],
+            "--max-tasks-per-worker cannot be used with '--executor interpreter'",
+        ),
+        (
+            ["--daemon", "--executor", "process"],
+            "--executor cannot be used with --daemon",
+        ),
+    ),
+)
+def test_executor_options_are_validated(run_cli, capsys, argv, message):
+    run_cli(argv, assert_exit_code=2)
+    assert message in capsys.readouterr().err
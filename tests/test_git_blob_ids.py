@@ -0,0 +1,83 @@
+import builtins
+import os
+from unittest import mock
+
+import pytest
+
+from slyp.driver import git_ls_files
+from slyp.hashable_file import HashableFile, git_blob_id
+
+PASSING_TEXT = "x = 1\n"
+
+
+@pytest.fixture
+def git_repo_files():
+    return {
+        name: PASSING_TEXT.replace("1", name[-4])
+        for name in ("a.py", "b.py", "pkg/c.py", "pkg/d.py")
+    }
+
+
+def test_git_blob_id_matches_git(git, git_repo):
+    assert git_blob_id(b"x = a\n") == git("rev-parse", "HEAD:a.py")
+
+
+def test_git_ls_files_only_gives_ids_for_unchanged_files(git, git_repo):
+    git_repo.join("b.py").write("changed = True\n")
+    git_repo.join("untracked.py").write(PASSING_TEXT)
+    git("update-index", "--skip-worktree", "pkg/d.py")
+
+    blob_ids = {}
+    assert git_ls_files(blob_ids) == ["a.py", "b.py", "pkg/c.py", "pkg/d.py"]
+    assert blob_ids == {
+        "a.py": git("rev-parse", "HEAD:a.py"),
+        "pkg/c.py": git("rev-parse", "HEAD:pkg/c.py"),
+    }
+
+    # from a subdirectory, paths are relative to it
+    os.chdir(git_repo.join("pkg"))
+    blob_ids = {}
+    assert git_ls_files(blob_ids) == ["c.py", "d.py"]
+    assert list(blob_ids) == ["c.py"]
+
+
+def test_blob_id_is_dropped_if_the_file_changed(git, git_repo):
+    blob_id = git("rev-parse", "HEAD:a.py")
+    file_obj = HashableFile("a.py", _blob_id=blob_id)
+    assert file_obj.cache_key == f"git-{blob_id}"
+    file_obj.binary_content
+    assert file_obj.cache_key == f"git-{blob_id}"
+
+    git_repo.join("a.py").write("changed = True\n")
+    file_obj = HashableFile("a.py", _blob_id=blob_id)
+    file_obj.binary_content
+    assert file_obj.cache_key == file_obj.sha
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_warm_run_reads_no_unchanged_files(git_repo, run_cli):
+    run_cli(["--use-git-ls"])
+
+    opened = []
+    real_open = builtins.open
+
+    def _open(file, *args, **kwargs):
+        opened.append(os.fspath(file))
+        return real_open(file, *args, **kwargs)
+
+    git_repo.join("b.py").write('x = "foo " "bar"\n')
+    with mock.patch("builtins.open", _open):
+        run_cli(["--use-git-ls", "-vv"], assert_exit_code=1)
+    # only the changed file is read
+    assert {name for name in opened if name.endswith(".py")} == {"b.py"}
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_changed_files_are_not_cache_hits(git_repo, run_cli, capsys):
+    run_cli(["--use-git-ls"])
+    capsys.readouterr()
+
+    # the new content fails, and it must not be found under the committed id
+    git_repo.join("a.py").write('x = "foo " "bar"\n')
+    run_cli(["--use-git-ls", "--only", "lint"], assert_exit_code=1)
+    assert capsys.readouterr().out == "a.py:1: unnecessary string concat (E100)\n"
@@ -0,0 +1,55 @@
+import multiprocessing.pool
+import os
+from unittest import mock
+
+import pytest
+
+from slyp.driver import choose_jobs
+
+
+@pytest.mark.parametrize(
+    "jobs, sizes, cpus, expect",
+    (
+        # explicit values are always used
+        (1, [10**6] * 100, 8, 1),
+        (3, [10], 8, 3),
+        # a few small files are processed serially, even with many cpus
+        (None, [1000, 2000, 3000], 64, 1),
+        (None, [], 64, 1),
+        # more work gets more workers, up to the number of cpus or files
+        (None, [64 * 1024] * 4, 64, 4),
+        (None, [10**6] * 2, 64, 2),
+        (None, [10**6] * 100, 8, 8),
+    ),
+)
+def test_choose_jobs(jobs, sizes, cpus, expect):
+    with mock.patch("os.cpu_count", return_value=cpus):
+        assert choose_jobs(jobs, sizes) == expect
+
+
+def test_serial_run_starts_no_workers(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+    tmpdir.join("bar.py").write("x = 1\n")
+    with mock.patch("multiprocessing.pool.Pool") as mock_pool:
+        run_cli(["--no-cache", "foo.py", "bar.py"], assert_exit_code=1)
+        run_cli(["--no-cache", "--jobs", "1", "foo.py", "bar.py"])
+    assert mock_pool.call_count == 0
+    assert capsys.readouterr().out == "slyp: fixed foo.py\n"
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_jobs_sets_pool_size(run_cli, tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    # wrap the fake pool, to see how it was created
+    with mock.patch(
+        "multiprocessing.pool.Pool", wraps=multiprocessing.pool.Pool
+    ) as mock_pool:
+        run_cli(["--no-cache", "--jobs", "3", "foo.py"])
+    assert mock_pool.call_args.kwargs["processes"] == 3
+
+
+def test_jobs_must_be_positive(run_cli, capsys):
+    run_cli(["--jobs", "0"], assert_exit_code=2)
+    assert "--jobs must be at least 1" in capsys.readouterr().err
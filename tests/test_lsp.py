@@ -0,0 +1,254 @@
+import os
+import queue
+import threading
+from unittest import mock
+
+import pytest
+
+from slyp.lsp import LanguageServer, find_errors, read_message, write_message
+
+URI = "file:///project/foo.py"
+
+
+class LSPClient:
+    """A client for a LanguageServer running in a thread, connected by pipes."""
+
+    def __init__(self, **server_kwargs) -> None:
+        to_server_r, self._to_server = _pipe()
+        self._from_server, from_server_w = _pipe()
+        self._server = LanguageServer(to_server_r, from_server_w, **server_kwargs)
+        self._next_id = 0
+        self.exit_code = None
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+        self._messages = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _serve(self):
+        self.exit_code = self._server.serve()
+
+    def _read(self):
+        while (message := read_message(self._from_server)) is not None:
+            self._messages.put(message)
+
+    def notify(self, method, params):
+        write_message(self._to_server, {"method": method, "params": params})
+
+    def request(self, method, params):
+        self._next_id += 1
+        write_message(
+            self._to_server, {"id": self._next_id, "method": method, "params": params}
+        )
+        response = self.receive()
+        assert response["id"] == self._next_id
+        return response
+
+    def receive(self, timeout=5):
+        return self._messages.get(timeout=timeout)
+
+    def receive_diagnostics(self):
+        message = self.receive()
+        assert message["method"] == "textDocument/publishDiagnostics"
+        return message["params"]
+
+    def assert_no_messages(self, timeout=0.2):
+        with pytest.raises(queue.Empty):
+            self._messages.get(timeout=timeout)
+
+    def open(self, text, uri=URI):
+        self.notify(
+            "textDocument/didOpen",
+            {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": text,
+                }
+            },
+        )
+
+    def change(self, text, uri=URI):
+        self.notify(
+            "textDocument/didChange",
+            {"textDocument": {"uri": uri}, "contentChanges": [{"text": text}]},
+        )
+
+    def shutdown(self):
+        assert self.request("shutdown", None)["result"] is None
+        self.notify("exit", None)
+        self._thread.join(timeout=5)
+        return self.exit_code
+
+
+def _pipe():
+    r, w = os.pipe()
+    return open(r, "rb"), open(w, "wb")
+
+
+@pytest.fixture
+def client():
+    client = LSPClient(
+        disabled_codes={"W201", "W202", "W203"}, enabled_codes=set(), debounce_delay=0.1
+    )
+    client.request("initialize", {"capabilities": {}})
+    client.notify("initialized", {})
+    yield client
+    if client.exit_code is None:
+        client.shutdown()
+
+
+def test_initialize_advertises_capabilities():
+    client = LSPClient(disabled_codes=set(), enabled_codes=set())
+    response = client.request("initialize", {"capabilities": {}})
+    capabilities = response["result"]["capabilities"]
+    assert capabilities["documentFormattingProvider"] is True
+    assert capabilities["textDocumentSync"]["change"] == 1
+    assert client.shutdown() == 0
+
+
+def test_exit_without_shutdown_is_an_error():
+    client = LSPClient(disabled_codes=set(), enabled_codes=set())
+    client.notify("exit", None)
+    client._thread.join(timeout=5)
+    assert client.exit_code == 1
+
+
+def test_open_publishes_diagnostics(client):
+    client.open('x = 1\ny = "foo " "bar"\n')
+    params = client.receive_diagnostics()
+    assert params["uri"] == URI
+    (diagnostic,) = params["diagnostics"]
+    assert diagnostic["code"] == "E100"
+    assert diagnostic["source"] == "slyp"
+    assert diagnostic["message"] == "unnecessary string concat"
+    assert diagnostic["range"]["start"] == {"line": 1, "character": 0}
+
+
+def test_unparsable_document_is_reported(client):
+    client.open("foo(\n")
+    (diagnostic,) = client.receive_diagnostics()["diagnostics"]
+    assert diagnostic["code"] == "X001"
+    assert diagnostic["range"]["start"] == {"line": 0, "character": 0}
+
+
+def test_changes_are_debounced(client):
+    client.open('x = "foo bar"\n')
+    assert client.receive_diagnostics()["diagnostics"] == []
+
+    with mock.patch("slyp.lsp.find_errors", wraps=find_errors) as mock_find_errors:
+        client.change('x = "foo" "')
+        client.change('x = "foo" "bar')
+        client.change('x = "foo" "bar"\n')
+        (diagnostic,) = client.receive_diagnostics()["diagnostics"]
+        client.assert_no_messages()
+
+    assert diagnostic["code"] == "E100"
+    assert mock_find_errors.call_count == 1
+
+
+def test_unchanged_documents_reuse_diagnostics(client):
+    client.open('x = "foo " "bar"\n')
+    first = client.receive_diagnostics()
+
+    with mock.patch("slyp.lsp.find_errors", wraps=find_errors) as mock_find_errors:
+        client.notify("textDocument/didSave", {"textDocument": {"uri": URI}})
+        assert client.receive_diagnostics() == first
+
+        # a change which reverts to the same content is not checked again
+        client.change('x = "foo " "bar"  \n')
+        client.receive_diagnostics()
+        client.change('x = "foo " "bar"\n')
+        assert client.receive_diagnostics() == first
+
+    assert mock_find_errors.call_count == 1
+
+
+def test_formatting_returns_fixed_text(client):
+    client.open('x = ("foo")\ny = 1\n')
+    client.receive_diagnostics()
+
+    response = client.request(
+        "textDocument/formatting",
+        {"textDocument": {"uri": URI}, "options": {"tabSize": 4, "insertSpaces": True}},
+    )
+    (edit,) = response["result"]
+    assert edit["newText"] == 'x = "foo"\ny = 1\n'
+    assert edit["range"]["start"] == {"line": 0, "character": 0}
+    assert edit["range"]["end"]["line"] >= 2
+
+
+def test_formatting_clean_document_returns_no_edits(client):
+    client.open("x = 1\n")
+    client.receive_diagnostics()
+    response = client.request(
+        "textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}}
+    )
+    assert response["result"] == []
+
+
+def test_formatting_does_not_write_files(client, tmpdir):
+    tmpdir.join("foo.py").write('x = ("foo")\n')
+    uri = f"file://{tmpdir.join('foo.py')}"
+    client.open('x = ("foo")\n', uri=uri)
+    client.receive_diagnostics()
+    response = client.request(
+        "textDocument/formatting", {"textDocument": {"uri": uri}, "options": {}}
+    )
+    assert response["result"][0]["newText"] == 'x = "foo"\n'
+    assert tmpdir.join("foo.py").read() == 'x = ("foo")\n'
+
+
+def test_close_clears_diagnostics(client):
+    client.open('x = "foo " "bar"\n')
+    assert client.receive_diagnostics()["diagnostics"]
+    client.notify("textDocument/didClose", {"textDocument": {"uri": URI}})
+    assert client.receive_diagnostics() == {"uri": URI, "diagnostics": []}
+
+
+def test_unknown_request_is_an_error(client):
+    response = client.request("textDocument/hover", {})
+    assert response["error"]["code"] == -32601
+
+
+def test_failing_request_is_an_error(client, capsys):
+    client.open("x = 1\n")
+    client.receive_diagnostics()
+    with mock.patch("slyp.lsp.fix_file", side_effect=RuntimeError("oops")):
+        response = client.request(
+            "textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}}
+        )
+    assert response["error"]["code"] == -32603
+    assert "oops" in response["error"]["message"]
+    assert "RuntimeError: oops" in capsys.readouterr().err
+
+    # the server carries on
+    response = client.request(
+        "textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}}
+    )
+    assert response["result"] == []
+
+
+def test_failing_notification_is_logged(client, capsys):
+    client.notify("textDocument/didChange", {"textDocument": {"uri": URI}})
+    client.open('x = "foo " "bar"\n')
+    assert client.receive_diagnostics()["diagnostics"]
+    assert "failed to handle textDocument/didChange" in capsys.readouterr().err
+
+
+def test_failing_check_is_logged(client, capsys):
+    with mock.patch("slyp.lsp.find_errors", side_effect=RuntimeError("oops")):
+        client.open("x = 1\n")
+        client.assert_no_messages()
+    assert "RuntimeError: oops" in capsys.readouterr().err
+
+    client.change('x = "foo " "bar"\n')
+    assert client.receive_diagnostics()["diagnostics"]
+
+
+def test_fixed_errors_are_no_longer_reported(client):
+    client.open('x = "foo " "bar"\n')
+    assert client.receive_diagnostics()["diagnostics"]
+    client.change('x = "foo bar"\n')
+    assert client.receive_diagnostics()["diagnostics"] == []
@@ -0,0 +1,110 @@
+import io
+import os
+from unittest import mock
+
+import pytest
+
+from slyp.cli import parse_args, run
+from slyp.file_cache import ResultCache
+from slyp.output import OutputWriter, ReorderBuffer
+from slyp.result import Message, Result
+
+
+def test_reorder_buffer_releases_items_in_order():
+    buffer = ReorderBuffer()
+    assert buffer.add(2, "c") == []
+    assert buffer.add(1, "b") == []
+    assert len(buffer) == 2
+    assert buffer.add(0, "a") == ["a", "b", "c"]
+    assert buffer.add(3, "d") == ["d"]
+    assert len(buffer) == 0
+
+
+class _CountingStream(io.StringIO):
+    writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def test_output_writer_writes_in_batches():
+    stream = _CountingStream()
+    writer = OutputWriter(verbosity=0, stream=stream)
+    with mock.patch("slyp.output.MAX_OUTPUT_DELAY", 60):
+        for i in range(10):
+            writer.write(
+                Result(
+                    messages=[Message(f"a{i}"), Message(f"b{i}", verbosity=1)],
+                    success=False,
+                )
+            )
+        assert stream.writes == 0
+        writer.flush()
+    assert stream.writes == 1
+    assert stream.getvalue().splitlines() == [f"a{i}" for i in range(10)]
+
+
+def test_output_writer_writes_once_enough_is_held():
+    stream = _CountingStream()
+    writer = OutputWriter(verbosity=0, stream=stream)
+    with (
+        mock.patch("slyp.output.MAX_OUTPUT_DELAY", 60),
+        mock.patch("slyp.output.MAX_BUFFERED_OUTPUT", 10),
+    ):
+        writer.write(Result(messages=[Message("12345")], success=False))
+        assert stream.writes == 0
+        writer.write(Result(messages=[Message("67890")], success=False))
+    assert stream.writes == 1
+
+
+@pytest.mark.parametrize("batch_files", (2, 4096))
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_ordered_output_follows_discovery(run_cli, tmpdir, capsys, batch_files):
+    os.chdir(tmpdir)
+    # later files are larger, so they are started (and completed) first
+    names = [f"f{i}.py" for i in range(8)]
+    for i, name in enumerate(names):
+        tmpdir.join(name).write('x = "foo " "bar"\n' + "y = 1\n" * (i * 20))
+    argv = ["--no-cache", "--only", "lint", "--jobs", "2", "--chunk-size", "1"]
+
+    with (
+        mock.patch("slyp.driver._SCHEDULING_BATCH_FILES", batch_files),
+        mock.patch("slyp.driver._IN_FLIGHT_FILES_PER_WORKER", 1),
+    ):
+        run_cli([*argv, *names], assert_exit_code=1)
+        unordered = _filenames(capsys.readouterr().out)
+        run_cli([*argv, "--ordered", *names], assert_exit_code=1)
+        ordered = _filenames(capsys.readouterr().out)
+
+    assert unordered != names
+    assert ordered == names
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_ordered_output_includes_cached_results_in_order(tmpdir, capsys):
+    os.chdir(tmpdir)
+    names = [f"f{i}.py" for i in range(8)]
+    for i, name in enumerate(names):
+        tmpdir.join(name).write('x = "foo " "bar"\n' + "y = 1\n" * (i * 20))
+    args = parse_args(
+        ["--no-cache", "--only", "lint", "--jobs", "2", "--ordered", *names]
+    )
+    result_cache = ResultCache()
+    assert run(args, result_cache=result_cache) == 1
+    capsys.readouterr()
+
+    # some results are cached, and others are processed again
+    for name in names[1::3]:
+        tmpdir.join(name).write('x = "foo " "baz"\n' + "y = 1\n" * 200)
+    assert run(args, result_cache=result_cache) == 1
+    assert _filenames(capsys.readouterr().out) == names
+
+
+def _filenames(out):
+    return [line.split(":")[0] for line in out.splitlines()]
+
+
+def test_ordered_cannot_be_used_with_watch(run_cli, capsys):
+    run_cli(["--watch", "--ordered"], assert_exit_code=2)
+    assert "--watch cannot be used with --ordered" in capsys.readouterr().err
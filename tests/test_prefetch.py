@@ -0,0 +1,75 @@
+import hashlib
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from slyp.driver import process_file
+from slyp.prefetch import prefetch, read_file
+
+
+def test_prefetch_yields_content_and_sha_in_order(tmpdir):
+    names = []
+    for i in range(20):
+        tmpdir.join(f"f{i}.py").write(f"x = {i}\n")
+        names.append(str(tmpdir.join(f"f{i}.py")))
+    names.insert(5, str(tmpdir.join("missing.py")))
+
+    results = list(prefetch(names, 4))
+    assert len(results) == 21
+    assert results[5] is None
+    results.pop(5)
+    for i, (content, sha, _) in enumerate(results):
+        assert content == f"x = {i}\n".encode()
+        assert sha == hashlib.sha256(content).hexdigest()
+
+
+def test_prefetch_reads_no_further_than_the_window(tmpdir):
+    names = []
+    for i in range(10):
+        tmpdir.join(f"f{i}.py").write("x = 1\n")
+        names.append(str(tmpdir.join(f"f{i}.py")))
+
+    read = []
+    lock = threading.Lock()
+
+    def _record_read(filename):
+        with lock:
+            read.append(filename)
+        return read_file(filename)
+
+    with mock.patch("slyp.prefetch.read_file", side_effect=_record_read):
+        results = prefetch(names, 3)
+        next(results)
+        # reads are in flight for the window following the consumed file
+        with lock:
+            assert len(read) <= 4
+        assert len(list(results)) == 9
+    assert sorted(read) == sorted(names)
+
+
+def test_process_file_uses_prefetched_content(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+    prefetched = read_file("foo.py")
+    with mock.patch("builtins.open", side_effect=AssertionError("file was read")):
+        result = process_file(
+            "foo.py", "lint", set(), set(), None, None, 1, None, prefetched
+        )
+    assert result.message_strings == ["foo.py:1: unnecessary string concat (E100)"]
+
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_cli_read_ahead(run_cli, tmpdir, capsys, jobs):
+    os.chdir(tmpdir)
+    for i in range(6):
+        tmpdir.join(f"f{i}.py").write(f'x = "foo " "bar{i}"\n')
+    argv = ["--no-cache", "--only", "lint", "--jobs", jobs, "--read-ahead", "2"]
+    with mock.patch("slyp.driver.prefetch", wraps=prefetch) as mock_prefetch:
+        run_cli(argv, assert_exit_code=1)
+    assert mock_prefetch.call_count == 1
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        f"f{i}.py:1: unnecessary string concat (E100)" for i in range(6)
+    ]
@@ -0,0 +1,125 @@
+import textwrap
+from unittest import mock
+
+import libcst
+import pytest
+
+from slyp import prescreen
+from slyp.checkers import check_file
+from slyp.fixer import fix_file
+from slyp.hashable_file import HashableFile, InMemoryFile
+
+
+@pytest.mark.parametrize(
+    "source, hint",
+    (
+        ("x = (y)", prescreen.PARENS),
+        ("x = ((a + b))", prescreen.PARENS),
+        ("x = (foo.bar[0](1))", prescreen.PARENS),
+        ("print((x))", prescreen.PARENS),
+        ("with (open(f) as fp): pass", prescreen.PARENS),
+        ("from foo import (bar, baz)", prescreen.PARENS),
+        ("match (x):\n    case _: pass", prescreen.PARENS),
+        ("match x:\n    case (Foo.bar): pass", prescreen.PARENS),
+        ('x = "foo " "bar"', prescreen.STRING_CONCAT),
+        ('x = (\n    "foo "\n    "bar"\n)', prescreen.STRING_CONCAT),
+        ('x = "foo " f"{bar}"', prescreen.STRING_CONCAT),
+        ('x = "foo " + "bar"', prescreen.STRING_PLUS),
+        ('x = ("foo") + ("bar")', prescreen.STRING_PLUS),
+        ("x = dict(a=1)", prescreen.COLLECTION_CALL),
+        ("x = frozenset(list(y))", prescreen.COLLECTION_CALL),
+        ("if(x): pass", prescreen.KEYWORD_SPACING),
+        ("if x: pass\nelif(y): pass", prescreen.KEYWORD_SPACING),
+        ("def f():\n    yield(1)", prescreen.KEYWORD_SPACING),
+        ("match(x):\n    case _: pass", prescreen.KEYWORD_SPACING),
+        ("if x is None: return x", prescreen.NONE_CHECK),
+        ("class A:\n    def __init__(self): pass", prescreen.INIT_DEFINITION),
+        ('x = {"a":1}', prescreen.DICT_COLON_SPACING),
+        ('x = f"{(y)}"', prescreen.PARENS),
+        ('x = f"{dict(a=1)}"', prescreen.COLLECTION_CALL),
+    ),
+)
+def test_scan_finds_hint(source, hint):
+    assert hint in prescreen.scan(source.encode())
+
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        'x = "foo bar"',
+        "x = (1, 2)",
+        "x = (a + b)",
+        "x = (1).bit_length()",
+        "foo(bar, baz)\nfoo.bar(x)[0](y)",
+        "def f(x) -> int:\n    return x",
+        "class A(B):\n    pass",
+        "re.match(x)",
+        'x = {"a": 1, "b": y[1:2]}',
+        'x = f"{a:>3} {b!r}"',
+        "def f():\n    yield",
+        "x = (\n    y\n)",
+    ),
+)
+def test_scan_finds_no_hints(source):
+    assert prescreen.scan(source.encode()) == frozenset()
+
+
+def test_scan_returns_all_hints_on_tokenize_error():
+    assert prescreen.scan(b"foo(\n") == prescreen.ALL_HINTS
+
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        "match x:\n    case (Foo.bar):\n        pass\n",
+        "match (x):\n    case (y) | (Foo.bar):\n        pass\n",
+        "match x:\n    case [(a), Point(x=(1))] if (b):\n        pass\n",
+        "case = 1\ncase(x)\n",
+    ),
+)
+def test_prescreen_matches_the_full_fixer_on_match_statements(source):
+    # a fix missed by the prescreen would depend on the rest of the file
+    screened = InMemoryFile.from_content("foo.py", source.encode())
+    fix_file(screened)
+    with mock.patch("slyp.fixer.may_apply", return_value=True):
+        unscreened = InMemoryFile.from_content("foo.py", source.encode())
+        fix_file(unscreened)
+    assert screened.binary_content == unscreened.binary_content
+
+
+def test_clean_file_is_never_parsed_with_libcst(tmpdir):
+    tmpdir.join("foo.py").write(
+        textwrap.dedent(
+            """\
+            def foo(x: int) -> int:
+                if x > 1:
+                    return foo(x - 1) * x
+                return 1
+            """
+        )
+    )
+    with (
+        tmpdir.as_cwd(),
+        mock.patch("libcst.parse_module", wraps=libcst.parse_module) as mock_parse,
+    ):
+        file_obj = HashableFile("foo.py")
+        assert fix_file(file_obj).success
+        assert check_file(file_obj, disabled_codes=set(), enabled_codes=set()).success
+
+    assert mock_parse.call_count == 0
+
+
+def test_invalid_file_is_still_parsed_with_libcst(tmpdir):
+    # this tokenizes without issue, but is not valid python
+    tmpdir.join("foo.py").write("x = = 1\n")
+    with (
+        tmpdir.as_cwd(),
+        mock.patch("libcst.parse_module", wraps=libcst.parse_module) as mock_parse,
+    ):
+        file_obj = HashableFile("foo.py")
+        assert not fix_file(file_obj).success
+        result = check_file(file_obj, disabled_codes=set(), enabled_codes=set())
+
+    assert not result.success
+    assert result.message_strings == ["foo.py:0: unparsable file (X001)"]
+    assert mock_parse.call_count >= 1
@@ -3,43 +3,9 @@ from unittest import mock
 
 import pytest
 
-from slyp.checkers import _clear_errors as _clear_checker_errors
-from slyp.cli import main as cli_main
 from slyp.driver import check_file, fix_file
 
-
-@pytest.fixture(autouse=True)
-def _auto_clear_checker_errors():
-    _clear_checker_errors()
-
-
-@pytest.fixture(autouse=True)
-def _mock_parallel_processing():
-    def fake_apply_async(func, args):
-        mock_future = mock.Mock()
-        mock_future.get.return_value = func(*args)
-        return mock_future
-
-    mock_pool = mock.Mock()
-    mock_pool.apply_async = fake_apply_async
-    with mock.patch("multiprocessing.pool.Pool", return_value=mock_pool):
-        yield
-
-
-@pytest.fixture
-def run_cli(capsys):
-    def _run_cli(args, assert_exit_code=0):
-        with mock.patch("sys.argv", ["slyp"] + args):
-            retcode = 0
-            try:
-                cli_main()
-            except SystemExit as e:
-                retcode = e.code
-            if assert_exit_code is not None:
-                assert retcode == assert_exit_code
-            return retcode
-
-    return _run_cli
+pytestmark = pytest.mark.usefixtures("mock_parallel_processing")
 
 
 def test_cli_invocation_simple(run_cli, tmpdir, capsys):
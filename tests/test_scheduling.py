@@ -0,0 +1,197 @@
+import multiprocessing.pool
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from slyp.cli import parse_args, run
+from slyp.driver import CONTRACT_VERSION, expected_costs, process_file
+from slyp.file_cache import TimingCache
+
+
+def test_timing_cache_round_trip(tmpdir):
+    base = str(tmpdir.join(".slyp_cache"))
+    cache = TimingCache(contract_version="1", base_cache_dir=base)
+    assert cache.get("foo.py") is None
+    cache.record("./foo.py", 0.5)
+    cache.save()
+
+    cache = TimingCache(contract_version="1", base_cache_dir=base)
+    assert cache.get("foo.py") == 0.5
+    # history is specific to a contract version
+    assert TimingCache(contract_version="2", base_cache_dir=base).get("foo.py") is None
+
+
+def test_timing_cache_drops_timings_of_removed_files(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("kept.py").write("x = 1\n")
+    cache = TimingCache(contract_version="1")
+    for filename in ("kept.py", "removed.py", "seen.py"):
+        cache.record(filename, 0.5)
+    cache.save()
+
+    cache = TimingCache(contract_version="1")
+    assert cache.get("seen.py") == 0.5
+    cache.record("new.py", 0.5)
+    cache.save()
+
+    cache = TimingCache(contract_version="1")
+    assert cache.get("kept.py") == 0.5
+    assert cache.get("seen.py") == 0.5
+    assert cache.get("new.py") == 0.5
+    assert cache.get("removed.py") is None
+
+
+def test_timing_cache_ignores_corrupt_history(tmpdir):
+    base = tmpdir.mkdir(".slyp_cache")
+    base.join("timings_1.json").write("{not json")
+    cache = TimingCache(contract_version="1", base_cache_dir=str(base))
+    assert cache.get("foo.py") is None
+
+
+def test_expected_costs_without_history_are_sizes():
+    assert expected_costs(["a.py", "b.py"], [100, 300], None) == [100, 300]
+
+
+def test_expected_costs_scale_sizes_by_observed_rate(tmpdir):
+    cache = TimingCache(contract_version="1", base_cache_dir=str(tmpdir))
+    cache.record("a.py", 2.0)
+    cache.record("b.py", 0.1)
+    costs = expected_costs(["a.py", "b.py", "c.py"], [100, 100, 400], cache)
+    # the timed files took 2.1s for 200 bytes, so 400 bytes is expected to take 4.2s
+    assert costs == pytest.approx([2.0, 0.1, 4.2])
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_files_are_dispatched_longest_first(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    for name, copies in (("small.py", 1), ("medium.py", 50), ("large.py", 200)):
+        tmpdir.join(name).write('x = "foo " "bar"\n' + "y = 1\n" * copies)
+    argv = ["--no-cache", "--only", "lint", "--jobs", "2", "--chunk-size", "1"]
+
+    # with no history, size is the estimate
+    run_cli([*argv, "small.py", "medium.py", "large.py"], assert_exit_code=1)
+    out = capsys.readouterr().out
+    assert [line.split(":")[0] for line in out.splitlines()] == [
+        "large.py",
+        "medium.py",
+        "small.py",
+    ]
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_timings_are_recorded_and_used(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    tmpdir.join("a.py").write('x = "foo " "bar"\n')
+    tmpdir.join("b.py").write('x = "foo " "bar"\n' + "y = 1\n" * 100)
+    argv = ["--only", "lint", "--jobs", "2", "--chunk-size", "1", "a.py", "b.py"]
+    run_cli(argv, assert_exit_code=1)
+    capsys.readouterr()
+
+    cache = TimingCache(contract_version=CONTRACT_VERSION)
+    assert cache.get("a.py") is not None
+    assert cache.get("b.py") is not None
+
+    # history says that the smaller file is the slower one
+    cache.record("a.py", 10.0)
+    cache.save()
+    run_cli(argv, assert_exit_code=1)
+    out = capsys.readouterr().out
+    assert [line.split(":")[0] for line in out.splitlines()] == ["a.py", "b.py"]
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_cache_hits_do_not_replace_timings(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    tmpdir.join("a.py").write("x = 1\n")
+    run_cli(["a.py"])
+    cache = TimingCache(contract_version=CONTRACT_VERSION)
+    cache.record("a.py", 10.0)
+    cache.save()
+
+    run_cli(["-vv", "a.py"])
+    assert "cache hit: a.py" in capsys.readouterr().out
+    assert TimingCache(contract_version=CONTRACT_VERSION).get("a.py") == 10.0
+
+
+class _CountingPool:
+    """A thread pool which records how many files were ever in flight at once."""
+
+    def __init__(self) -> None:
+        self._pool = multiprocessing.pool.ThreadPool(2)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        with self._lock:
+            self.in_flight += len(args[0])
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        def _callback(results):
+            with self._lock:
+                self.in_flight -= len(results)
+            callback(results)
+
+        return self._pool.apply_async(
+            func, args, callback=_callback, error_callback=error_callback
+        )
+
+    def close(self):
+        self._pool.close()
+
+    def join(self):
+        self._pool.join()
+
+
+def test_files_in_flight_are_bounded(tmpdir, capsys):
+    os.chdir(tmpdir)
+    for i in range(40):
+        tmpdir.join(f"f{i}.py").write(f'x = "foo " "bar{i}"\n')
+    args = parse_args(["--no-cache", "--only", "lint", "--jobs", "2"])
+    pool = _CountingPool()
+    with (
+        mock.patch("slyp.driver._IN_FLIGHT_FILES_PER_WORKER", 3),
+        mock.patch("slyp.driver._SCHEDULING_BATCH_FILES", 7),
+    ):
+        assert run(args, process_pool=pool) == 1
+    pool.close()
+    pool.join()
+
+    assert pool.max_in_flight <= 2 * 3
+    assert sorted(capsys.readouterr().out.splitlines()) == sorted(
+        f"f{i}.py:1: unnecessary string concat (E100)" for i in range(40)
+    )
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_files_are_discovered_lazily(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    names = [f"f{i}.py" for i in range(10)]
+    for name in names:
+        tmpdir.join(name).write('x = "foo " "bar"\n')
+
+    discovered = []
+    processed_before = []
+
+    def _discover(files, use_git_ls, changed_ranges=None, **kwargs):
+        for name in names:
+            discovered.append(name)
+            yield name
+
+    def _process_file(filename, *args):
+        processed_before.append(len(discovered))
+        return process_file(filename, *args)
+
+    argv = ["--no-cache", "--only", "lint", "--jobs", "2", "--chunk-size", "1"]
+    with (
+        mock.patch("slyp.driver.all_py_filenames", _discover),
+        mock.patch("slyp.driver.process_file", _process_file),
+        mock.patch("slyp.driver._SCHEDULING_BATCH_FILES", 4),
+    ):
+        run_cli(argv, assert_exit_code=1)
+
+    # the first files are processed before the last ones are found
+    assert processed_before[0] < len(names)
+    assert len(capsys.readouterr().out.splitlines()) == 10
@@ -0,0 +1,57 @@
+import textwrap
+from unittest import mock
+
+import libcst
+import pytest
+
+from slyp.checkers import check_file
+from slyp.fixer import fix_file
+from slyp.hashable_file import HashableFile
+
+
+@pytest.mark.parametrize(
+    "text, expect_fix",
+    (
+        ('x = (\n    "foo "\n    "bar"\n)\n', False),
+        ('x = ((1)) + 2\ny = "foo " + "bar"\n', True),
+    ),
+)
+def test_fix_and_check_share_one_parse(tmpdir, text, expect_fix):
+    tmpdir.join("foo.py").write(text)
+    with (
+        tmpdir.as_cwd(),
+        mock.patch("libcst.parse_module", wraps=libcst.parse_module) as mock_parse,
+    ):
+        file_obj = HashableFile("foo.py")
+        fix_result = fix_file(file_obj)
+        check_file(file_obj, disabled_codes=set(), enabled_codes=set())
+
+    assert fix_result.success is not expect_fix
+    assert mock_parse.call_count == 1
+
+
+def test_check_on_fixed_tree_matches_fresh_parse(tmpdir):
+    tmpdir.join("foo.py").write(
+        textwrap.dedent(
+            """\
+            foo(
+                bar="alpha "
+                "beta",
+            )
+            x = ((1)) + 2
+            y = "foo " f"{x}" + "bar"
+            """
+        )
+    )
+    with tmpdir.as_cwd():
+        file_obj = HashableFile("foo.py")
+        assert not fix_file(file_obj).success
+        shared_result = check_file(file_obj, disabled_codes=set(), enabled_codes=set())
+        fresh_result = check_file(
+            HashableFile("foo.py"), disabled_codes=set(), enabled_codes=set()
+        )
+
+    assert shared_result.message_strings == fresh_result.message_strings
+    assert shared_result.message_strings == [
+        "foo.py:8: unnecessary string concat with plus (E101)"
+    ]
@@ -0,0 +1,216 @@
+import os
+import subprocess
+from unittest import mock
+
+import pytest
+
+from slyp.git_index import BlobReader, StagedFiles, format_patch
+
+FAILING_TEXT = 'x = "foo " "bar"\n'
+FIXED_TEXT = 'x = "foo bar"\n'
+
+
+@pytest.fixture
+def git_repo_files():
+    return {"a.py": "a = 1\n", "pkg/b.py": "b = 1\n", "README": "not python\n"}
+
+
+def test_blob_reader_reads_blobs_in_order(git, git_repo):
+    contents = [f"content {i}\n".encode() * i for i in range(50)]
+    blob_ids = [
+        git("hash-object", "-w", "--stdin", input=content.decode())
+        for content in contents
+    ]
+    with BlobReader() as reader:
+        assert list(reader.read_many(blob_ids, 4)) == contents
+        # the same process serves later reads
+        assert reader.read(blob_ids[3]) == contents[3]
+
+
+def test_blob_reader_raises_for_missing_blobs(git_repo):
+    with BlobReader() as reader:
+        with pytest.raises(RuntimeError):
+            reader.read("0" * 40)
+
+
+def test_staged_files_finds_python_files_in_the_index(git, git_repo):
+    git_repo.join("script").write("#!/usr/bin/env python\nx = 1\n")
+    git_repo.join("shell").write("#!/bin/sh\n")
+    os.chmod(git_repo.join("script"), 0o755)
+    os.chmod(git_repo.join("shell"), 0o755)
+    git_repo.join("untracked.py").write("x = 1\n")
+    os.symlink("a.py", git_repo.join("link.py"))
+    git("add", "script", "shell", "link.py")
+
+    staged = StagedFiles()
+    try:
+        assert list(staged.find()) == ["a.py", "pkg/b.py", "script"]
+        assert list(staged.find(["./pkg/b.py"])) == ["pkg/b.py"]
+    finally:
+        staged.close()
+
+
+def test_staged_files_finds_named_files_by_any_path(git_repo):
+    staged = StagedFiles()
+    try:
+        assert list(staged.find([str(git_repo.join("pkg", "b.py"))])) == ["pkg/b.py"]
+        os.chdir(git_repo.join("pkg"))
+        assert list(staged.find(["../pkg/b.py"])) == ["b.py"]
+    finally:
+        staged.close()
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_warns_of_named_files_not_in_the_index(git_repo, run_cli, capsys):
+    git_repo.join("untracked.py").write(FAILING_TEXT)
+
+    run_cli(["--staged", "untracked.py", str(git_repo.join("a.py"))])
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert err == (
+        "slyp: untracked.py is not in git's index, so it will not be checked\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    (
+        (b"a\nb\nc\n", b"a\nB\nc\n"),
+        (b"a\nb", b"a\nB"),
+        (b"a\nb\n", b"a\nb"),
+        (b"a\r\nb\r\n", b"a\r\nB\r\n"),
+    ),
+)
+def test_format_patch_applies_with_git(git_repo, old, new):
+    git_repo.join("f.py").write_binary(old)
+    subprocess.run(
+        ["git", "apply", "-"], input=format_patch("f.py", old, new), check=True
+    )
+    assert git_repo.join("f.py").read_binary() == new
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_lints_the_index_rather_than_the_working_tree(
+    git, git_repo, run_cli, capsys
+):
+    git_repo.join("a.py").write(FAILING_TEXT)
+    git("add", "a.py")
+    git_repo.join("a.py").write("a = 1\n")
+    git_repo.join("pkg/b.py").write(FAILING_TEXT)
+
+    run_cli(["--staged", "--only", "lint"], assert_exit_code=1)
+    assert capsys.readouterr().out == "a.py:1: unnecessary string concat (E100)\n"
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_fixes_the_index_and_the_working_tree(git, git_repo, run_cli, capsys):
+    git_repo.join("a.py").write(FAILING_TEXT)
+    git_repo.join("pkg/b.py").write(FAILING_TEXT)
+    git("add", ".")
+    # unstaged changes are never overwritten
+    git_repo.join("pkg/b.py").write(FAILING_TEXT + "y = 2\n")
+
+    run_cli(["--staged", "--only", "fix"], assert_exit_code=1)
+    assert capsys.readouterr().out == (
+        "slyp: fixed a.py\n"
+        "slyp: fixed pkg/b.py\n"
+        "slyp: fixed pkg/b.py in the index only, as it has unstaged changes\n"
+    )
+    assert git("show", ":a.py") + "\n" == FIXED_TEXT
+    assert git("show", ":pkg/b.py") + "\n" == FIXED_TEXT
+    assert git_repo.join("a.py").read() == FIXED_TEXT
+    assert git_repo.join("pkg/b.py").read() == FAILING_TEXT + "y = 2\n"
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_fixes_write_the_working_tree_atomically(git, git_repo, run_cli):
+    git_repo.join("a.py").write(FAILING_TEXT)
+    os.chmod("a.py", 0o755)
+    git("add", "a.py")
+    real_open = open
+
+    def _open(file, mode="r", *args, **kwargs):
+        fp = real_open(file, mode, *args, **kwargs)
+        if mode == "wb":
+            # interrupted once the file is opened (and truncated)
+            fp.close()
+            raise KeyboardInterrupt
+        return fp
+
+    with mock.patch("builtins.open", _open):
+        with pytest.raises(KeyboardInterrupt):
+            run_cli(["--staged", "--no-cache", "--only", "fix", "-q"])
+    assert git_repo.join("a.py").read() == FAILING_TEXT
+    assert not list(git_repo.visit("*.slyp-tmp"))
+
+    run_cli(["--staged", "--no-cache", "--only", "fix", "-q"], assert_exit_code=1)
+    assert git_repo.join("a.py").read() == FIXED_TEXT
+    assert os.stat("a.py").st_mode & 0o777 == 0o755
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_fixes_from_a_subdirectory(git, git_repo, run_cli, capsys):
+    git_repo.join("pkg/b.py").write(FAILING_TEXT)
+    git("add", ".")
+    os.chdir(git_repo.join("pkg"))
+
+    run_cli(["--staged", "--only", "fix"], assert_exit_code=1)
+    assert capsys.readouterr().out == "slyp: fixed b.py\n"
+    # only the file in the subdirectory is touched, in the index and the tree
+    assert git("status", "--porcelain", "--untracked-files=no") == "M  pkg/b.py"
+    assert git("show", ":pkg/b.py") + "\n" == FIXED_TEXT
+    assert git_repo.join("pkg/b.py").read() == FIXED_TEXT
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_patch_applies_from_a_subdirectory(git, git_repo, run_cli, capsys):
+    git_repo.join("pkg/b.py").write(FAILING_TEXT)
+    git("add", ".")
+    os.chdir(git_repo.join("pkg"))
+
+    run_cli(["--staged", "--patch", "--only", "fix", "-q"], assert_exit_code=1)
+    patch = capsys.readouterr().out
+    assert "+++ b/pkg/b.py" in patch
+    subprocess.run(["git", "apply", "--cached", "-"], input=patch.encode(), check=True)
+    assert git("show", ":pkg/b.py") + "\n" == FIXED_TEXT
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_patch_leaves_the_index_alone(git, git_repo, run_cli, capsys):
+    git_repo.join("a.py").write(FAILING_TEXT)
+    git("add", "a.py")
+
+    run_cli(["--staged", "--patch", "--only", "fix", "-q"], assert_exit_code=1)
+    patch = capsys.readouterr().out
+    assert git("show", ":a.py") + "\n" == FAILING_TEXT
+    assert git_repo.join("a.py").read() == FAILING_TEXT
+
+    subprocess.run(["git", "apply", "--cached", "-"], input=patch.encode(), check=True)
+    assert git("show", ":a.py") + "\n" == FIXED_TEXT
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_staged_results_are_cached_by_blob_id(git_repo, run_cli, capsys):
+    run_cli(["--staged"])
+    capsys.readouterr()
+
+    # the working tree plays no part in finding cached results
+    git_repo.join("a.py").remove()
+    run_cli(["--staged", "-vv"])
+    assert "cache hit: a.py" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "args",
+    (
+        ["--staged", "--use-git-ls"],
+        ["--staged", "--diff-base", "HEAD"],
+        ["--staged", "--watch"],
+        ["--staged", "--daemon"],
+        ["--staged", "--only", "lint", "-"],
+        ["--patch"],
+    ),
+)
+def test_staged_option_validation(run_cli, capsys, args):
+    run_cli(args, assert_exit_code=2)
+    assert "--staged" in capsys.readouterr().err
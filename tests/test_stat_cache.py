@@ -0,0 +1,169 @@
+import builtins
+import concurrent.futures
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from slyp.file_cache import PassingFileCache
+from slyp.hashable_file import HashableFile
+
+PASSING_TEXT = "x = 1\n"
+
+
+@pytest.fixture
+def cache(tmpdir):
+    os.chdir(tmpdir)
+    return PassingFileCache(contract_version="test", config_id="config")
+
+
+@pytest.fixture
+def trust_recent_stats(monkeypatch):
+    # files written by a test are only moments old, and would otherwise be racy
+    monkeypatch.setattr("slyp.hashable_file.RACY_WINDOW_NS", 0)
+
+
+@pytest.fixture
+def opened():
+    opened = []
+    real_open = builtins.open
+
+    def _open(file, *args, **kwargs):
+        # file descriptors are for temporary files, which were already created
+        if not isinstance(file, int):
+            opened.append(os.fspath(file))
+        return real_open(file, *args, **kwargs)
+
+    with mock.patch("builtins.open", _open):
+        yield opened
+
+
+def _add(cache, filename):
+    file_obj = HashableFile(filename)
+    file_obj.binary_content
+    cache.add(file_obj)
+
+
+@pytest.mark.usefixtures("trust_recent_stats")
+def test_unchanged_file_is_found_without_reading_it(cache, tmpdir, opened):
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    _add(cache, "a.py")
+    opened.clear()
+
+    assert HashableFile("a.py") in cache
+    assert "a.py" not in opened
+
+
+@pytest.mark.usefixtures("trust_recent_stats")
+def test_changed_file_is_read_and_hashed(cache, tmpdir, opened):
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    _add(cache, "a.py")
+    # the same size, but the change shows in the file's ctime
+    tmpdir.join("a.py").write(PASSING_TEXT.replace("1", "2"))
+    opened.clear()
+
+    assert HashableFile("a.py") not in cache
+    assert "a.py" in opened
+
+
+@pytest.mark.usefixtures("trust_recent_stats")
+def test_touched_file_is_read_once(cache, tmpdir, opened):
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    _add(cache, "a.py")
+    os.utime(tmpdir.join("a.py"), ns=(0, 0))
+    opened.clear()
+
+    # the content still passes, and its new stat is recorded
+    assert HashableFile("a.py") in cache
+    assert opened.count("a.py") == 1
+    assert HashableFile("a.py") in cache
+    assert opened.count("a.py") == 1
+
+
+def test_racily_clean_file_is_always_read(cache, tmpdir, opened):
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    _add(cache, "a.py")
+    opened.clear()
+
+    # the file changed too recently for its stat to show a further change
+    assert HashableFile("a.py") in cache
+    assert "a.py" in opened
+
+
+@pytest.mark.usefixtures("trust_recent_stats")
+def test_files_with_known_content_skip_the_stat(cache, tmpdir):
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    _add(cache, "a.py")
+
+    with mock.patch("os.stat") as mock_stat:
+        # content read ahead of time may be newer than the recorded stat
+        assert HashableFile("a.py", _binary_content=b"x = 2\n") not in cache
+        assert mock_stat.call_count == 0
+
+
+def test_interrupted_write_keeps_earlier_records(cache, tmpdir):
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    _add(cache, "a.py")
+    other = PassingFileCache(contract_version="test", config_id="other")
+    real_open = builtins.open
+
+    def _open(file, mode="r", *args, **kwargs):
+        fp = real_open(file, mode, *args, **kwargs)
+        if mode == "w":
+            fp.close()
+            raise KeyboardInterrupt
+        return fp
+
+    with mock.patch("builtins.open", _open):
+        with pytest.raises(KeyboardInterrupt):
+            _add(other, "a.py")
+
+    assert HashableFile("a.py") in cache
+    assert not list(tmpdir.join(".slyp_cache").visit("*.tmp"))
+
+
+def test_concurrent_adds_of_one_file_all_succeed(cache, tmpdir):
+    # identical files (e.g. empty '__init__.py' files) share a record
+    for i in range(8):
+        tmpdir.join(f"m{i}.py").write(PASSING_TEXT)
+    # every thread writes its record before any of them renames it into place
+    barrier = threading.Barrier(8, timeout=5)
+    real_replace = os.replace
+
+    def _replace(*args):
+        barrier.wait()
+        real_replace(*args)
+
+    with mock.patch("os.replace", _replace):
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda i: _add(cache, f"m{i}.py"), range(8)))
+    assert HashableFile("m0.py") in cache
+    assert not list(tmpdir.join(".slyp_cache").visit("*.tmp"))
+
+
+@pytest.mark.usefixtures("trust_recent_stats", "mock_parallel_processing")
+def test_warm_run_reads_no_unchanged_files(tmpdir, run_cli, opened):
+    os.chdir(tmpdir)
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    tmpdir.join("b.py").write(PASSING_TEXT)
+    run_cli([])
+
+    tmpdir.join("b.py").write('x = "foo " "bar"\n')
+    opened.clear()
+    run_cli(["-vv"], assert_exit_code=1)
+    assert {name for name in opened if name.endswith(".py")} == {"b.py"}
+
+
+@pytest.mark.usefixtures("trust_recent_stats", "mock_parallel_processing")
+def test_read_ahead_records_stats_on_cache_hits(tmpdir, run_cli, opened):
+    os.chdir(tmpdir)
+    tmpdir.join("a.py").write(PASSING_TEXT)
+    run_cli([])
+    os.utime(tmpdir.join("a.py"), ns=(0, 0))
+
+    # the content read ahead is found by its sha, and its new stat is recorded
+    run_cli(["--read-ahead", "2"])
+    opened.clear()
+    run_cli([])
+    assert "a.py" not in opened
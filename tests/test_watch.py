@@ -0,0 +1,116 @@
+import os
+from unittest import mock
+
+import pytest
+
+from slyp.driver import check_file
+from slyp.watch import FileWatcher
+
+
+def test_watcher_reports_new_and_changed_files(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    tmpdir.join("bar.py").write("y = 1\n")
+    watcher = FileWatcher(lambda: ["foo.py", "bar.py"])
+
+    assert watcher.poll() == ["bar.py", "foo.py"]
+    watcher.mark("foo.py")
+    watcher.mark("bar.py")
+    assert watcher.poll() == []
+
+    tmpdir.join("foo.py").write("x = 22\n")
+    assert watcher.poll() == ["foo.py"]
+
+
+def test_watcher_ignores_stat_changes_without_content_changes(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    watcher = FileWatcher(lambda: ["foo.py"])
+    watcher.poll()
+    watcher.mark("foo.py")
+
+    st = os.stat("foo.py")
+    os.utime("foo.py", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert watcher.poll() == []
+
+
+def test_watcher_skips_files_and_drops_removed_files(tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    tmpdir.join("bar.py").write("y = 1\n")
+    watcher = FileWatcher(lambda: ["foo.py", "bar.py"])
+
+    assert watcher.poll(skip={"foo.py"}) == ["bar.py"]
+    os.remove("bar.py")
+    assert watcher.poll() == ["foo.py"]
+    assert watcher.files == {"foo.py"}
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_watch_mode_reprocesses_changed_files(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    tmpdir.join("bar.py").write("y = 1\n")
+
+    poll_calls = 0
+    real_poll = FileWatcher.poll
+
+    def fake_poll(self, *args, **kwargs):
+        nonlocal poll_calls
+        poll_calls += 1
+        if poll_calls == 2:
+            tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+        elif poll_calls == 3:
+            raise KeyboardInterrupt
+        return real_poll(self, *args, **kwargs)
+
+    with (
+        mock.patch.object(FileWatcher, "poll", fake_poll),
+        mock.patch("slyp.driver.check_file", wraps=check_file) as mock_check_file,
+    ):
+        run_cli(["--watch", "--no-cache", "foo.py", "bar.py"], assert_exit_code=1)
+
+    # one check per file initially, and one more for the change
+    # the write done by fixing is not seen as another change
+    assert mock_check_file.call_count == 3
+    assert capsys.readouterr().out == "slyp: fixed foo.py\n"
+    assert tmpdir.join("foo.py").read() == 'x = "foo bar"\n'
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_watch_mode_rechecks_files_edited_while_in_flight(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+
+    def check_and_edit(*args, **kwargs):
+        result = check_file(*args, **kwargs)
+        if mock_check_file.call_count == 1:
+            tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+        return result
+
+    poll_calls = 0
+    real_poll = FileWatcher.poll
+
+    def fake_poll(self, *args, **kwargs):
+        nonlocal poll_calls
+        poll_calls += 1
+        if poll_calls == 3:
+            raise KeyboardInterrupt
+        return real_poll(self, *args, **kwargs)
+
+    with (
+        mock.patch.object(FileWatcher, "poll", fake_poll),
+        mock.patch(
+            "slyp.driver.check_file", side_effect=check_and_edit
+        ) as mock_check_file,
+    ):
+        run_cli(["--watch", "--no-cache", "--only", "lint", "foo.py"], 1)
+
+    # the edit made during the first check is checked too
+    assert mock_check_file.call_count == 2
+    assert capsys.readouterr().out == "foo.py:1: unnecessary string concat (E100)\n"
+
+
+def test_watch_mode_rejects_diff_base(run_cli, capsys):
+    run_cli(["--watch", "--diff-base", "HEAD"], assert_exit_code=2)
+    assert "--watch cannot be used with --diff-base" in capsys.readouterr().err
@@ -0,0 +1,138 @@
+import multiprocessing.pool
+import os
+import queue
+import time
+from unittest import mock
+
+import pytest
+
+import slyp.driver
+from slyp.driver import _RunConfig, process_chunk, process_file
+
+
+def _hang_on_slow_file(filename, *args):
+    if filename == "slow.py":
+        time.sleep(30)
+    return process_file(filename, *args)
+
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_file_timeout_reports_only_the_slow_file(run_cli, tmpdir, capsys, jobs):
+    os.chdir(tmpdir)
+    tmpdir.join("slow.py").write("x = 1\n")
+    tmpdir.join("other.py").write('x = "foo " "bar"\n')
+    argv = ["--no-cache", "--only", "lint", "--jobs", jobs, "--file-timeout", "0.2"]
+    with mock.patch("slyp.driver.process_file", side_effect=_hang_on_slow_file):
+        start = time.monotonic()
+        run_cli([*argv, "slow.py", "other.py"], assert_exit_code=1)
+    assert time.monotonic() - start < 10
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        "other.py:1: unnecessary string concat (E100)",
+        "slow.py:0: timed out while processing file (X003)",
+    ]
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_timeout_during_a_write_leaves_the_file_intact(run_cli, tmpdir, capsys):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write('x = "foo " "bar"\n')
+    real_open = open
+
+    def _open(file, mode="r", *args, **kwargs):
+        fp = real_open(file, mode, *args, **kwargs)
+        if mode == "wb":
+            # the timer fires once the file is opened (and truncated)
+            fp.close()
+            raise slyp.driver._FileTimeout()
+        return fp
+
+    with mock.patch("builtins.open", _open):
+        run_cli(["--no-cache", "--only", "fix", "foo.py"], assert_exit_code=1)
+
+    assert capsys.readouterr().out == (
+        "foo.py:0: timed out while processing file (X003)\n"
+    )
+    assert tmpdir.join("foo.py").read() == 'x = "foo " "bar"\n'
+    assert tmpdir.listdir() == [tmpdir.join("foo.py")]
+
+
+@pytest.mark.usefixtures("mock_parallel_processing")
+def test_max_tasks_per_worker_sets_pool_option(run_cli, tmpdir):
+    os.chdir(tmpdir)
+    tmpdir.join("foo.py").write("x = 1\n")
+    with mock.patch(
+        "multiprocessing.pool.Pool", wraps=multiprocessing.pool.Pool
+    ) as mock_pool:
+        run_cli(["--no-cache", "--jobs", "2", "--max-tasks-per-worker", "3"])
+    assert mock_pool.call_args.kwargs["maxtasksperchild"] == 3
+
+
+def test_worker_over_memory_limit_hands_back_its_next_chunk(tmpdir, monkeypatch):
+    os.chdir(tmpdir)
+    tmpdir.join("a.py").write("x = 1\n")
+    tmpdir.join("b.py").write("x = 1\n")
+    retired = queue.Queue()
+    monkeypatch.setattr(slyp.driver, "_worker_retired_chunks", retired)
+    monkeypatch.setattr(slyp.driver, "_worker_chunks_done", 0)
+    config = _RunConfig(
+        only="lint",
+        disabled_codes=set(),
+        enabled_codes=set(),
+        passing_cache=None,
+        check_plan=None,
+        max_fix_passes=1,
+        max_worker_memory=1,
+    )
+
+    with mock.patch("os._exit", side_effect=SystemExit) as mock_exit:
+        # a worker always processes its first chunk, whatever its memory use
+        results = process_chunk([("a.py", None)], config)
+        assert [r.filename for r in results] == ["a.py"]
+        assert retired.empty()
+
+        with pytest.raises(SystemExit):
+            process_chunk([("b.py", None)], config)
+    mock_exit.assert_called_once_with(0)
+    assert retired.get_nowait() == ([("b.py", None)], None)
+
+
+def test_memory_limit_with_real_workers(run_cli, tmpdir, capsys):
+    # every worker is over a 1 MiB limit, and so is replaced after each chunk
+    os.chdir(tmpdir)
+    for i in range(6):
+        tmpdir.join(f"f{i}.py").write(f'x = "foo " "bar{i}"\n')
+    run_cli(
+        [
+            "--no-cache",
+            "--only",
+            "lint",
+            "--jobs",
+            "2",
+            "--chunk-size",
+            "1",
+            "--max-worker-memory",
+            "1",
+        ],
+        assert_exit_code=1,
+    )
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        f"f{i}.py:1: unnecessary string concat (E100)" for i in range(6)
+    ]
+
+
+@pytest.mark.parametrize(
+    "argv, message",
+    (
+        (["--file-timeout", "0"], "--file-timeout must be positive"),
+        (["--max-tasks-per-worker", "0"], "--max-tasks-per-worker must be at least 1"),
+        (["--max-worker-memory", "0"], "--max-worker-memory must be at least 1"),
+        (
+            ["--daemon", "--max-worker-memory", "100"],
+            "--max-worker-memory cannot be used with --daemon",
+        ),
+    ),
+)
+def test_worker_limit_options_are_validated(run_cli, capsys, argv, message):
+    run_cli(argv, assert_exit_code=2)
+    assert message in capsys.readouterr().err
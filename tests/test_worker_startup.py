@@ -0,0 +1,74 @@
+from unittest import mock
+
+import pytest
+
+import slyp.driver
+from slyp.checkers import find_errors, make_check_plan
+from slyp.driver import WORKER_PRELOAD_MODULES, prepare_worker_start, warm_up
+from slyp.hashable_file import InMemoryFile
+
+
+@pytest.fixture
+def cold(monkeypatch):
+    # pretend that this process has not warmed up yet
+    monkeypatch.setattr(slyp.driver, "_warmed_up", False)
+
+
+@pytest.mark.usefixtures("cold")
+def test_warm_up_runs_fixer_and_checkers_once():
+    fix = mock.Mock(wraps=slyp.driver.fix_file)
+    check = mock.Mock(wraps=slyp.driver.find_errors)
+    with (
+        mock.patch("slyp.driver.fix_file", fix),
+        mock.patch("slyp.driver.find_errors", check),
+    ):
+        warm_up()
+        warm_up()
+    assert fix.call_count == 1
+    assert check.call_count == 1
+
+
+def test_warm_up_sample_exercises_all_checkers():
+    file_obj = InMemoryFile.from_content("sample.py", slyp.driver._WARM_UP_SOURCE)
+    errors = find_errors(file_obj, disabled_codes=set(), enabled_codes={"all"})
+    codes = {code for _, code in errors}
+    plan = make_check_plan(set(), {"all"})
+    for visitor_type in (*plan.cst_visitors, *plan.ast_visitors):
+        assert codes & visitor_type.CODES
+
+
+@pytest.mark.usefixtures("cold")
+def test_warm_up_does_not_touch_the_filesystem(tmpdir):
+    with tmpdir.as_cwd():
+        warm_up()
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.usefixtures("cold")
+@pytest.mark.parametrize("start_method", ("fork", "forkserver", "spawn"))
+def test_prepare_worker_start(start_method):
+    with (
+        mock.patch("multiprocessing.get_start_method", return_value=start_method),
+        mock.patch("multiprocessing.set_forkserver_preload") as set_preload,
+    ):
+        prepare_worker_start()
+
+    # forked workers inherit the parent's warm-up
+    assert slyp.driver._warmed_up is (start_method == "fork")
+    if start_method == "forkserver":
+        set_preload.assert_called_once_with(list(WORKER_PRELOAD_MODULES))
+    else:
+        set_preload.assert_not_called()
+
+
+@pytest.mark.usefixtures("cold")
+@pytest.mark.parametrize("verbosity", (0, 1))
+def test_worker_reports_startup_when_verbose(verbosity, capsys):
+    slyp.driver._init_worker(None, False, verbosity, 0.0)
+    assert slyp.driver._warmed_up
+    err = capsys.readouterr().err
+    if verbosity:
+        assert err.startswith("slyp: worker ")
+        assert "(warm-up " in err
+    else:
+        assert err == ""